@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""progress unique keys for bulk upsert
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def _dedupe(table: str, key_columns: str) -> None:
+    # 建唯一索引前清理重复行，保留每组最新一条
+    op.execute(
+        f"DELETE FROM {table} WHERE id NOT IN ("
+        f"SELECT keep_id FROM (SELECT MAX(id) AS keep_id FROM {table} GROUP BY {key_columns}) AS keep_rows)"
+    )
+
+
+def upgrade() -> None:
+    _dedupe('wrong_questions', 'user_id, question_id')
+    op.create_index('uq_wrong_questions_user_question', 'wrong_questions', ['user_id', 'question_id'], unique=True)
+
+    _dedupe('user_knowledge_state', 'user_id, knowledge_id')
+    op.create_index('uq_user_knowledge_state_user_knowledge', 'user_knowledge_state', ['user_id', 'knowledge_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_user_knowledge_state_user_knowledge', table_name='user_knowledge_state')
+    op.drop_index('uq_wrong_questions_user_question', table_name='wrong_questions')
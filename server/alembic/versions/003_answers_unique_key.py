@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""answers unique key for autosave upsert
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 建唯一索引前清理重复答案，保留每题最新一条
+    op.execute(
+        "DELETE FROM answers WHERE id NOT IN ("
+        "SELECT keep_id FROM (SELECT MAX(id) AS keep_id FROM answers GROUP BY attempt_id, question_id) AS keep_rows)"
+    )
+    op.create_index('uq_answers_attempt_question', 'answers', ['attempt_id', 'question_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_answers_attempt_question', table_name='answers')
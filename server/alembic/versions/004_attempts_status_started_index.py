@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""attempts (status, started_at) index for deadline sweeper
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_attempts_status_started_at', 'attempts', ['status', 'started_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_attempts_status_started_at', table_name='attempts')
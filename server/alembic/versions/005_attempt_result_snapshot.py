@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""attempt result snapshot column
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'attempts',
+        sa.Column('result_snapshot', sa.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('attempts', 'result_snapshot')
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""attempts (user_id, status, submitted_at) index for keyset history
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_attempts_user_status_submitted', 'attempts', ['user_id', 'status', 'submitted_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_attempts_user_status_submitted', table_name='attempts')
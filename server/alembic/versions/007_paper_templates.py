@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""paper templates for constraint-based assembly
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'paper_templates',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('category', sa.Enum('DIAGNOSTIC', 'PRACTICE', 'MOCK', name='exam_category'), nullable=False),
+        sa.Column('spec_json', sa.JSON(), nullable=False),
+        sa.Column('duration_minutes', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_paper_templates_id'), 'paper_templates', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_paper_templates_id'), table_name='paper_templates')
+    op.drop_table('paper_templates')
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""paper content hash for auto paper reuse
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('papers', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_papers_content_hash'), 'papers', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_papers_content_hash'), table_name='papers')
+    op.drop_column('papers', 'content_hash')
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""cohort diagnostic batches and assigned exams
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('exams', sa.Column('assigned_user_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_exams_assigned_user_id'), 'exams', ['assigned_user_id'], unique=False)
+    op.create_foreign_key('fk_exams_assigned_user_id', 'exams', 'users', ['assigned_user_id'], ['id'])
+
+    op.create_table(
+        'diagnostic_batches',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('status', sa.Enum('RUNNING', 'PAUSED', 'DONE', 'FAILED', name='diagnostic_batch_status'), nullable=False),
+        sa.Column('params_json', sa.JSON(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('generated', sa.Integer(), nullable=False),
+        sa.Column('cursor_user_id', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_diagnostic_batches_id'), 'diagnostic_batches', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_diagnostic_batches_id'), table_name='diagnostic_batches')
+    op.drop_table('diagnostic_batches')
+    op.drop_constraint('fk_exams_assigned_user_id', 'exams', type_='foreignkey')
+    op.drop_index(op.f('ix_exams_assigned_user_id'), table_name='exams')
+    op.drop_column('exams', 'assigned_user_id')
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""learning plan version and native JSON plan item reasons
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+_BATCH_SIZE = 1000
+
+plan_items = sa.table(
+    'plan_items',
+    sa.column('id', sa.Integer),
+    sa.column('reason_json', sa.JSON),
+)
+
+
+def _convert_reasons(convert) -> None:
+    """按ID分批改写 plan_items.reason_json，convert 返回 None 表示该行不需要改动"""
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(plan_items.c.id, plan_items.c.reason_json)
+            .where(plan_items.c.id > last_id, plan_items.c.reason_json.isnot(None))
+            .order_by(plan_items.c.id)
+            .limit(_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        changed = []
+        for row in rows:
+            value = convert(row.reason_json)
+            if value is not None:
+                changed.append({"item_id": row.id, "reason": value})
+        if changed:
+            bind.execute(
+                plan_items.update()
+                .where(plan_items.c.id == sa.bindparam("item_id"))
+                .values(reason_json=sa.bindparam("reason")),
+                changed
+            )
+
+
+def _decode(value):
+    # 旧版本写入的是 json.dumps 后的字符串，解码为对象；无法解析的按旧接口的兜底处理
+    if not isinstance(value, str):
+        return None
+    try:
+        decoded = json.loads(value)
+    except ValueError:
+        return {"explanation": "系统生成"}
+    return decoded if isinstance(decoded, dict) else {"explanation": "系统生成"}
+
+
+def _encode(value):
+    return json.dumps(value) if isinstance(value, dict) else None
+
+
+def upgrade() -> None:
+    op.add_column('learning_plans', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    _convert_reasons(_decode)
+
+
+def downgrade() -> None:
+    _convert_reasons(_encode)
+    op.drop_column('learning_plans', 'version')
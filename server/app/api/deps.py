@@ -1,19 +1,20 @@
-from typing import Generator
+from typing import Generator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..core.database import get_db
+from ..core.database import get_async_db
 from ..core.security import get_token_payload
 from ..models.user import User
 
 # JWT Bearer 认证
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取当前用户"""
     token = credentials.credentials
@@ -27,7 +28,7 @@ def get_current_user(
         )
 
     # 从数据库查询用户信息
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = await db.get(User, int(user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,6 +49,16 @@ def get_current_user(
     }
 
 
+async def get_current_user_optional(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取当前用户；未携带令牌时返回 None（公开接口按登录状态调整结果）"""
+    if credentials is None:
+        return None
+    return await get_current_user(credentials, db)
+
+
 def get_current_student(current_user: dict = Depends(get_current_user)):
     """获取当前学员用户（需要STUDENT角色）"""
     if current_user["role"] != "STUDENT":
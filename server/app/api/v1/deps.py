@@ -1,3 +1,3 @@
-from ..deps import get_current_user, get_current_student, get_current_admin
+from ..deps import get_current_user, get_current_user_optional, get_current_student, get_current_admin
 
-__all__ = ["get_current_user", "get_current_student", "get_current_admin"]
+__all__ = ["get_current_user", "get_current_user_optional", "get_current_student", "get_current_admin"]
@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy import select, func
 from sqlalchemy.orm import Session
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 from ....core.database import get_db
-from ....models.paper import Exam, Paper, PaperQuestion
+from ....models.paper import DiagnosticBatch, Exam, Paper, PaperQuestion
 from ....models.question import Question
 from ....models.knowledge import QuestionKnowledgeMap
+from ....services.cohort_diagnostics import (
+    batch_progress, create_diagnostic_batch, is_batch_running, start_diagnostic_batch
+)
 from ....services.diagnostic_generator import generate_diagnostic_exam
+from ....services.mock_pool import get_mock_pool
+from ....services.paper_cache import warm_paper_snapshot
 from ..deps import get_current_admin
 
 router = APIRouter()
@@ -22,6 +27,16 @@ class AdminExamCreate(BaseModel):
     paper_id: Optional[int] = None
 
 
+class CohortDiagnosticCreate(BaseModel):
+    user_ids: Optional[List[int]] = Field(None, description="学员ID列表；为空表示全部启用的学员")
+    subject: str = Field("XINGCE", pattern="^(XINGCE|SHENLUN)$")
+    weak_modules: int = Field(2, ge=0, le=10, description="重点强化的薄弱模块数")
+    weak_per_module: int = Field(4, ge=1, le=20, description="薄弱模块每模块题量")
+    per_module: int = Field(2, ge=0, le=20, description="其余模块每模块题量")
+    max_difficulty: int = Field(3, ge=1, le=5)
+    duration_minutes: int = Field(45, ge=0)
+
+
 @router.get("/")
 async def admin_list_exams(
     category: Optional[str] = Query(None),
@@ -93,6 +108,14 @@ async def admin_create_exam(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/mock-pool")
+async def admin_mock_pool_stats(
+    current_user: dict = Depends(get_current_admin)
+):
+    """模拟试卷预热池状态：各配比就绪份数、命中/未命中次数、补充速率与累计补充份数"""
+    return get_mock_pool().stats()
+
+
 @router.put("/{exam_id}/publish")
 async def admin_publish_exam(
     exam_id: int,
@@ -105,6 +128,9 @@ async def admin_publish_exam(
         raise HTTPException(status_code=404, detail="Exam not found")
     exam.status = "PUBLISHED"
     db.commit()
+    # 发布时预先渲染试卷快照，首批开考的学生直接命中缓存
+    if exam.paper_id:
+        warm_paper_snapshot(db, exam.paper_id)
     return {"id": exam.id, "status": exam.status}
 
 
@@ -153,3 +179,70 @@ async def admin_regenerate_diagnostic_exam(
         raise HTTPException(status_code=500, detail=f"重新生成诊断考试失败: {str(e)}")
 
 
+
+
+def _get_batch(db: Session, batch_id: int) -> DiagnosticBatch:
+    batch = db.get(DiagnosticBatch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="批量诊断任务不存在")
+    return batch
+
+
+@router.post("/diagnostic/cohort")
+async def admin_create_cohort_diagnostics(
+    payload: CohortDiagnosticCreate,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """为一批学员生成个性化诊断考试（后台执行，返回任务进度）"""
+    try:
+        batch = create_diagnostic_batch(db, payload.model_dump(), current_user["id"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    start_diagnostic_batch(batch.id)
+    return {**batch_progress(batch), "running": True}
+
+
+@router.get("/diagnostic/cohort/{batch_id}")
+async def admin_get_cohort_diagnostics(
+    batch_id: int,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """批量诊断任务进度"""
+    batch = _get_batch(db, batch_id)
+    return {**batch_progress(batch), "running": is_batch_running(batch_id)}
+
+
+@router.post("/diagnostic/cohort/{batch_id}/pause")
+async def admin_pause_cohort_diagnostics(
+    batch_id: int,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """暂停批量诊断任务（当前块写完后停止）"""
+    batch = _get_batch(db, batch_id)
+    if batch.status != "RUNNING":
+        raise HTTPException(status_code=400, detail=f"任务状态为 {batch.status}，无法暂停")
+    batch.status = "PAUSED"
+    db.commit()
+    return batch_progress(batch)
+
+
+@router.post("/diagnostic/cohort/{batch_id}/resume")
+async def admin_resume_cohort_diagnostics(
+    batch_id: int,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """从断点续跑批量诊断任务（暂停、失败或服务重启后中断的任务）"""
+    batch = _get_batch(db, batch_id)
+    if batch.status == "DONE":
+        raise HTTPException(status_code=400, detail="任务已完成")
+    if batch.status == "RUNNING" and is_batch_running(batch_id):
+        raise HTTPException(status_code=400, detail="任务正在执行")
+    batch.status = "RUNNING"
+    batch.error = None
+    db.commit()
+    start_diagnostic_batch(batch_id)
+    return {**batch_progress(batch), "running": True}
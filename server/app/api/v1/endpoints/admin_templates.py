@@ -0,0 +1,225 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, field_validator
+
+from ....core.database import get_db
+from ....models.paper import PaperTemplate
+from ....services.paper_assembly import assemble_paper, build_template_exam, invalidate_compiled_template
+from ....services.paper_cache import warm_paper_snapshot
+from ....services.question_index import QUESTION_TYPES
+from ..deps import get_current_admin
+
+router = APIRouter()
+
+
+class TemplateModule(BaseModel):
+    code: str
+    count: int = Field(..., ge=1, le=500)
+
+
+class TemplateSpec(BaseModel):
+    modules: List[TemplateModule] = Field(..., min_length=1)
+    difficulty_distribution: Optional[Dict[str, float]] = None  # 难度 -> 权重
+    type_mix: Optional[Dict[str, float]] = None  # 题型 -> 权重
+    total_score: float = Field(100.0, gt=0, le=1000)
+    exclude_recent_days: int = Field(0, ge=0, le=365)
+
+    @field_validator("difficulty_distribution")
+    @classmethod
+    def check_difficulty(cls, v):
+        if v is None:
+            return v
+        if not v or any(k not in {"1", "2", "3", "4", "5"} for k in v):
+            raise ValueError("难度分布的键必须是 1-5")
+        if any(w < 0 for w in v.values()) or sum(v.values()) <= 0:
+            raise ValueError("难度分布权重必须非负且总和大于0")
+        return v
+
+    @field_validator("type_mix")
+    @classmethod
+    def check_type_mix(cls, v):
+        if v is None:
+            return v
+        if not v or any(k not in QUESTION_TYPES for k in v):
+            raise ValueError(f"题型必须是 {', '.join(QUESTION_TYPES)} 之一")
+        if any(w < 0 for w in v.values()) or sum(v.values()) <= 0:
+            raise ValueError("题型配比权重必须非负且总和大于0")
+        return v
+
+
+class PaperTemplateCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    category: str = Field("MOCK", pattern="^(DIAGNOSTIC|PRACTICE|MOCK)$")
+    duration_minutes: int = Field(60, ge=0)
+    spec: TemplateSpec
+
+
+class PaperTemplateUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    category: Optional[str] = Field(None, pattern="^(DIAGNOSTIC|PRACTICE|MOCK)$")
+    duration_minutes: Optional[int] = Field(None, ge=0)
+    is_active: Optional[bool] = None
+    spec: Optional[TemplateSpec] = None
+
+
+def _template_dict(template: PaperTemplate) -> dict:
+    return {
+        "id": template.id,
+        "name": template.name,
+        "category": template.category,
+        "duration_minutes": template.duration_minutes,
+        "is_active": template.is_active,
+        "spec": template.spec_json,
+        "updated_at": template.updated_at.isoformat() if template.updated_at else None
+    }
+
+
+def _get_template(db: Session, template_id: int) -> PaperTemplate:
+    template = db.get(PaperTemplate, template_id)
+    if not template:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="组卷模板不存在")
+    return template
+
+
+def _check_name(db: Session, name: str, template_id: Optional[int] = None):
+    stmt = select(PaperTemplate.id).where(PaperTemplate.name == name)
+    if template_id is not None:
+        stmt = stmt.where(PaperTemplate.id != template_id)
+    if db.execute(stmt).first():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="模板名称已存在")
+
+
+@router.get("/")
+async def list_paper_templates(
+    include_inactive: bool = Query(False),
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """组卷模板列表 (管理员权限)"""
+    stmt = select(PaperTemplate).order_by(PaperTemplate.id)
+    if not include_inactive:
+        stmt = stmt.where(PaperTemplate.is_active == True)
+    return {"items": [_template_dict(t) for t in db.execute(stmt).scalars().all()]}
+
+
+@router.post("/")
+async def create_paper_template(
+    payload: PaperTemplateCreate,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """创建组卷模板 (管理员权限)"""
+    try:
+        _check_name(db, payload.name)
+        template = PaperTemplate(
+            name=payload.name,
+            category=payload.category,
+            duration_minutes=payload.duration_minutes,
+            spec_json=payload.spec.model_dump(),
+            is_active=True,
+            created_by=current_user["id"]
+        )
+        db.add(template)
+        db.commit()
+        db.refresh(template)
+        return {"id": template.id, "message": "组卷模板创建成功"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"创建组卷模板失败: {str(e)}")
+
+
+@router.get("/{template_id}")
+async def get_paper_template(
+    template_id: int,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """组卷模板详情 (管理员权限)"""
+    return _template_dict(_get_template(db, template_id))
+
+
+@router.put("/{template_id}")
+async def update_paper_template(
+    template_id: int,
+    payload: PaperTemplateUpdate,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """更新组卷模板 (管理员权限)；updated_at 变化后编译缓存自动失效"""
+    try:
+        template = _get_template(db, template_id)
+        update_data = payload.model_dump(exclude_unset=True, exclude={"spec"})
+        if update_data.get("name") and update_data["name"] != template.name:
+            _check_name(db, update_data["name"], template_id)
+        for field, value in update_data.items():
+            if value is not None:
+                setattr(template, field, value)
+        if payload.spec is not None:
+            template.spec_json = payload.spec.model_dump()
+        db.commit()
+        return {"id": template.id, "message": "组卷模板更新成功"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"更新组卷模板失败: {str(e)}")
+
+
+@router.delete("/{template_id}")
+async def delete_paper_template(
+    template_id: int,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """删除组卷模板 (管理员权限)；已生成的试卷不受影响"""
+    template = _get_template(db, template_id)
+    db.delete(template)
+    db.commit()
+    invalidate_compiled_template(template_id)
+    return {"message": "组卷模板删除成功"}
+
+
+@router.post("/{template_id}/preview")
+async def preview_paper_template(
+    template_id: int,
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """试组卷：返回约束满足报告，不创建试卷 (管理员权限)"""
+    template = _get_template(db, template_id)
+    result = assemble_paper(db, template)
+    return {"question_ids": result.question_ids, "report": result.report}
+
+
+@router.post("/{template_id}/assemble")
+async def assemble_paper_template(
+    template_id: int,
+    publish: bool = Query(False, description="是否直接发布考试"),
+    current_user: dict = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """按模板组卷并创建考试 (管理员权限)；未满足的约束在 report.unmet 中列出"""
+    template = _get_template(db, template_id)
+    if not template.is_active:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="组卷模板已停用")
+    try:
+        paper, exam, report = build_template_exam(db, template, current_user["id"], publish=publish)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"模板组卷失败: {str(e)}")
+
+    if publish:
+        warm_paper_snapshot(db, paper.id)
+    return {
+        "exam_id": exam.id,
+        "paper_id": paper.id,
+        "status": exam.status,
+        "report": report
+    }
@@ -1,15 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import List, Optional
 
-from ....core.database import get_db
+from ....core.database import get_async_db
 from ....models.attempt import Attempt
 from ....models.progress import UserKnowledgeState, WrongQuestion
 from ....models.plan import LearningPlan, PlanItem, Goal
 from ....models.user import User
 from ....models.knowledge import KnowledgePoint
+from ....services.knowledge_tree import get_knowledge_tree
 from ..deps import get_current_student, get_current_admin
 
 router = APIRouter()
@@ -18,35 +19,35 @@ router = APIRouter()
 @router.get("/student/overview")
 async def student_overview(
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         uid = current_user["id"]
 
         # plan completion rate (active plan)
         plan_stmt = select(LearningPlan).where(LearningPlan.user_id == uid, LearningPlan.is_active == True)
-        plan = db.execute(plan_stmt).scalar_one_or_none()
+        plan = (await db.execute(plan_stmt)).scalar_one_or_none()
         plan_completion_rate = 0.0
         if plan:
             total_stmt = select(func.count()).select_from(PlanItem).where(PlanItem.plan_id == plan.id)
-            total = db.execute(total_stmt).scalar_one()
+            total = (await db.execute(total_stmt)).scalar_one()
             done_stmt = select(func.count()).select_from(PlanItem).where(PlanItem.plan_id == plan.id, PlanItem.status == "DONE")
-            done = db.execute(done_stmt).scalar_one()
+            done = (await db.execute(done_stmt)).scalar_one()
             plan_completion_rate = round((done / total) * 100, 2) if total > 0 else 0.0
 
         # avg mastery
         avg_stmt = select(func.avg(UserKnowledgeState.mastery)).where(UserKnowledgeState.user_id == uid)
-        avg_mastery_val = db.execute(avg_stmt).scalar_one() or 0.0
+        avg_mastery_val = (await db.execute(avg_stmt)).scalar_one() or 0.0
         avg_mastery_val = round(float(avg_mastery_val), 2)
 
         # wrong due count
         now = datetime.utcnow()
         wrong_stmt = select(func.count()).select_from(WrongQuestion).where(WrongQuestion.user_id == uid, WrongQuestion.next_review_at <= now)
-        wrong_due_count = db.execute(wrong_stmt).scalar_one()
+        wrong_due_count = (await db.execute(wrong_stmt)).scalar_one()
 
         # last score
         last_stmt = select(Attempt).where(Attempt.user_id == uid, Attempt.status == "SUBMITTED").order_by(Attempt.submitted_at.desc()).limit(1)
-        last_attempt = db.execute(last_stmt).scalar_one_or_none()
+        last_attempt = (await db.execute(last_stmt)).scalar_one_or_none()
         last_score = float(last_attempt.total_score) if last_attempt and last_attempt.total_score is not None else None
 
         return {
@@ -60,10 +61,10 @@ async def student_overview(
 
 
 @router.get("/student/score-trend")
-async def student_score_trend(limit: int = Query(10, ge=1, le=100), current_user: dict = Depends(get_current_student), db: Session = Depends(get_db)):
+async def student_score_trend(limit: int = Query(10, ge=1, le=100), current_user: dict = Depends(get_current_student), db: AsyncSession = Depends(get_async_db)):
     uid = current_user["id"]
     stmt = select(Attempt).where(Attempt.user_id == uid, Attempt.status == "SUBMITTED").order_by(Attempt.submitted_at.desc()).limit(limit)
-    tries = db.execute(stmt).scalars().all()
+    tries = (await db.execute(stmt)).scalars().all()
     items = []
     for a in reversed(tries):
         items.append({"submitted_at": a.submitted_at.isoformat() if a.submitted_at else None, "total_score": float(a.total_score) if a.total_score is not None else None})
@@ -71,11 +72,11 @@ async def student_score_trend(limit: int = Query(10, ge=1, le=100), current_user
 
 
 @router.get("/student/mastery-top")
-async def student_mastery_top(limit: int = Query(10, ge=1), current_user: dict = Depends(get_current_student), db: Session = Depends(get_db)):
+async def student_mastery_top(limit: int = Query(10, ge=1), current_user: dict = Depends(get_current_student), db: AsyncSession = Depends(get_async_db)):
     uid = current_user["id"]
     # 使用 SQLAlchemy 2.0 select 语法
     stmt = select(UserKnowledgeState, KnowledgePoint).join(KnowledgePoint, UserKnowledgeState.knowledge_id == KnowledgePoint.id).where(UserKnowledgeState.user_id == uid).order_by(UserKnowledgeState.mastery.asc()).limit(limit)
-    rows = db.execute(stmt).all()
+    rows = (await db.execute(stmt)).all()
     items = []
     for state, kp in rows:
         items.append({"knowledge_id": kp.id, "name": kp.name, "mastery": float(state.mastery)})
@@ -83,7 +84,7 @@ async def student_mastery_top(limit: int = Query(10, ge=1), current_user: dict =
 
 
 @router.get("/student/knowledge-state")
-async def student_knowledge_state(limit: int = Query(6, ge=1, le=20), current_user: dict = Depends(get_current_student), db: Session = Depends(get_db)):
+async def student_knowledge_state(limit: int = Query(6, ge=1, le=20), current_user: dict = Depends(get_current_student), db: AsyncSession = Depends(get_async_db)):
     """
     获取学生知识点掌握度雷达图数据
     返回最薄弱的N个知识点的掌握度（按掌握度升序，取薄弱TOP作为雷达维度）
@@ -102,7 +103,7 @@ async def student_knowledge_state(limit: int = Query(6, ge=1, le=20), current_us
         UserKnowledgeState.mastery.asc()
     ).limit(limit)
 
-    rows = db.execute(stmt).all()
+    rows = (await db.execute(stmt)).all()
 
     items = []
     for state, kp in rows:
@@ -121,7 +122,7 @@ async def student_knowledge_state(limit: int = Query(6, ge=1, le=20), current_us
 async def student_module_mastery(
     subject: str = Query(..., description="科目类型：XINGCE 或 SHENLUN"),
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取学生各模块的掌握度聚合数据（用于雷达图）
@@ -147,32 +148,34 @@ async def student_module_mastery(
                 detail="科目类型必须是 XINGCE 或 SHENLUN"
             )
 
-        # 获取指定科目的模块节点
-        from ....services.paper_template import _get_subject_module_nodes, _get_knowledge_point_tree_ids
-
-        module_nodes = _get_subject_module_nodes(db, subject)
+        # 获取指定科目的模块节点（内存知识点树索引）
+        tree = await db.run_sync(get_knowledge_tree)
+        category_node = tree.by_code(subject)
+        module_nodes = tree.children(category_node.id) if category_node else []
         if not module_nodes:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"未找到{subject}科目的模块节点"
             )
 
-        items = []
+        # 模块及其所有子知识点的ID（没有子节点时至少包含模块本身）
+        module_tree_ids = {module.id: tree.subtree_ids(module.id) or [module.id] for module in module_nodes}
 
-        for module in module_nodes:
-            # 获取模块及其所有子知识点的ID
-            module_tree_ids = _get_knowledge_point_tree_ids(db, module.id)
+        # 一次查询取出该科目下学生的全部掌握度，再按模块聚合
+        all_ids = {kp_id for ids in module_tree_ids.values() for kp_id in ids}
+        mastery_stmt = select(UserKnowledgeState.knowledge_id, UserKnowledgeState.mastery).where(
+            UserKnowledgeState.user_id == uid,
+            UserKnowledgeState.knowledge_id.in_(all_ids)
+        )
+        mastery_by_kp = {kp_id: mastery for kp_id, mastery in (await db.execute(mastery_stmt)).all()}
 
-            if not module_tree_ids:
-                # 如果没有子节点，至少包含模块本身
-                module_tree_ids = [module.id]
+        items = []
 
+        for module in module_nodes:
             # 计算该模块所有知识点的平均掌握度
-            avg_stmt = select(func.avg(UserKnowledgeState.mastery)).where(
-                UserKnowledgeState.user_id == uid,
-                UserKnowledgeState.knowledge_id.in_(module_tree_ids)
-            )
-            avg_mastery = db.execute(avg_stmt).scalar_one() or 0.0
+            values = [float(mastery_by_kp[kp_id]) for kp_id in module_tree_ids[module.id]
+                      if mastery_by_kp.get(kp_id) is not None]
+            avg_mastery = sum(values) / len(values) if values else 0.0
 
             # 转换为0-100百分制
             mastery_percentage = round(float(avg_mastery) * 100, 1)
@@ -216,41 +219,41 @@ async def student_module_mastery(
 
 
 @router.get("/admin/overview")
-async def admin_overview(current_user: dict = Depends(get_current_admin), db: Session = Depends(get_db)):
+async def admin_overview(current_user: dict = Depends(get_current_admin), db: AsyncSession = Depends(get_async_db)):
     try:
         # total users
         total_users_stmt = select(func.count()).select_from(User)
-        total_users = db.execute(total_users_stmt).scalar_one()
+        total_users = (await db.execute(total_users_stmt)).scalar_one()
 
         # active users: users with attempts in last 7 days
         since = datetime.utcnow() - timedelta(days=7)
         active_users_stmt = select(func.count(func.distinct(Attempt.user_id))).select_from(Attempt).where(Attempt.submitted_at >= since)
-        active_users = db.execute(active_users_stmt).scalar_one()
+        active_users = (await db.execute(active_users_stmt)).scalar_one()
 
         # avg completion rate (approx): average of users' active plan completion
         user_stmt = select(User.id)
-        user_ids = db.execute(user_stmt).scalars().all()
+        user_ids = (await db.execute(user_stmt)).scalars().all()
         rates = []
         for uid in user_ids:
             plan_stmt = select(LearningPlan).where(LearningPlan.user_id == uid, LearningPlan.is_active == True)
-            plan = db.execute(plan_stmt).scalar_one_or_none()
+            plan = (await db.execute(plan_stmt)).scalar_one_or_none()
             if plan:
                 total_stmt = select(func.count()).select_from(PlanItem).where(PlanItem.plan_id == plan.id)
-                total = db.execute(total_stmt).scalar_one()
+                total = (await db.execute(total_stmt)).scalar_one()
                 done_stmt = select(func.count()).select_from(PlanItem).where(PlanItem.plan_id == plan.id, PlanItem.status == "DONE")
-                done = db.execute(done_stmt).scalar_one()
+                done = (await db.execute(done_stmt)).scalar_one()
                 if total > 0:
                     rates.append(done / total)
         avg_completion = round((sum(rates) / len(rates)) * 100, 2) if rates else 0.0
 
         # avg score recent
         recent_stmt = select(Attempt).where(Attempt.status == "SUBMITTED", Attempt.submitted_at >= since)
-        recent_attempts = db.execute(recent_stmt).scalars().all()
+        recent_attempts = (await db.execute(recent_stmt)).scalars().all()
         avg_score = round(sum([float(a.total_score or 0) for a in recent_attempts]) / len(recent_attempts), 2) if recent_attempts else 0.0
 
         # wrong due total
         wrong_stmt = select(func.count()).select_from(WrongQuestion).where(WrongQuestion.next_review_at <= datetime.utcnow())
-        wrong_due_total = db.execute(wrong_stmt).scalar_one()
+        wrong_due_total = (await db.execute(wrong_stmt)).scalar_one()
 
         return {"total_users": total_users, "active_users": active_users, "avg_completion_rate": avg_completion, "avg_score": avg_score, "wrong_due_total": wrong_due_total}
     except Exception as e:
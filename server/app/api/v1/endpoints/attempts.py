@@ -1,18 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, func, update
-from sqlalchemy.orm import Session
-from typing import List, Union, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Union, Optional, Tuple
 from pydantic import BaseModel
-from datetime import datetime, timedelta
-import re
+from datetime import datetime
+import base64
 
-from ....core.database import get_db
+from ....core.database import get_async_db
 from ....models.attempt import Attempt, Answer
 from ....models.question import Question
 from ....models.knowledge import QuestionKnowledgeMap
-from ....models.progress import UserKnowledgeState, WrongQuestion
-from ....models.paper import PaperQuestion, Exam as ExamModel
-from ....models.plan import LearningPlan, PlanItem
+from ....models.paper import Exam as ExamModel
+from ....services.attempt_result import etag_matches, get_attempt_result_snapshot
+from ....services.attempt_submission import submit_attempts
+from ....services.question_index import get_question_index
+from ....services.answer_buffer import AnswerBuffer, flush_buffered_attempt, get_answer_buffer
+from ....services.paper_cache import get_paper_payload, merge_saved_answers
 from ..deps import get_current_student
 
 router = APIRouter()
@@ -28,21 +32,85 @@ class AttemptSubmit(BaseModel):
     answers: List[AnswerSubmit]
 
 
+def _normalize_submitted_answer(answer: Union[str, List[str]]) -> List[str]:
+    """标准化答案格式"""
+    if isinstance(answer, list):
+        # 多选题：排序并转换为字符串列表
+        return sorted([str(ans).strip().upper() for ans in answer if ans])
+    # 单选/判断/填空：转换为字符串列表
+    return [str(answer).strip()]
+
+
+async def _buffer_single_answer(
+    buffer: AnswerBuffer,
+    attempt_id: int,
+    answer_data: AnswerSubmit,
+    user_id: int,
+    db: AsyncSession
+) -> dict:
+    """自动保存模式下的单题保存：attempt/题目校验走进程内缓存，命中时不访问数据库"""
+    owner = buffer.attempt_owner(attempt_id)
+    if owner is None:
+        row = (await db.execute(
+            select(Attempt.user_id, Attempt.status).where(Attempt.id == attempt_id)
+        )).first()
+        if not row or row.user_id != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="作答记录不存在"
+            )
+        if row.status != "DOING":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="考试已结束，无法提交答案"
+            )
+        buffer.mark_open(attempt_id, user_id)
+    elif owner != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="作答记录不存在"
+        )
+
+    index = await db.run_sync(get_question_index)
+    if answer_data.question_id not in index:
+        exists = (await db.execute(select(Question.id).where(Question.id == answer_data.question_id))).first()
+        if not exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="题目不存在"
+            )
+
+    # 写日志（含 fsync）放到线程池，不阻塞事件循环
+    await run_in_threadpool(
+        buffer.append,
+        attempt_id,
+        answer_data.question_id,
+        _normalize_submitted_answer(answer_data.answer),
+        answer_data.time_spent_seconds
+    )
+    return {"message": "答案提交成功"}
+
+
 @router.post("/{attempt_id}/answer")
 async def submit_single_answer(
     attempt_id: int,
     answer_data: AnswerSubmit,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """提交单题答案"""
     try:
+        # 自动保存模式：写本地日志后立即返回，由后台批量落库
+        buffer = get_answer_buffer()
+        if buffer is not None:
+            return await _buffer_single_answer(buffer, attempt_id, answer_data, current_user["id"], db)
+
         # 验证作答记录存在且属于当前用户
         attempt_stmt = select(Attempt).where(
             Attempt.id == attempt_id,
             Attempt.user_id == current_user["id"]
         )
-        attempt = db.execute(attempt_stmt).scalar_one_or_none()
+        attempt = (await db.execute(attempt_stmt)).scalar_one_or_none()
 
         if not attempt:
             raise HTTPException(
@@ -58,7 +126,7 @@ async def submit_single_answer(
 
         # 验证题目存在且属于该考试
         question_stmt = select(Question).where(Question.id == answer_data.question_id)
-        question = db.execute(question_stmt).scalar_one_or_none()
+        question = (await db.execute(question_stmt)).scalar_one_or_none()
 
         if not question:
             raise HTTPException(
@@ -67,25 +135,20 @@ async def submit_single_answer(
             )
 
         # 标准化答案格式
-        if isinstance(answer_data.answer, list):
-            # 多选题：排序并转换为字符串列表
-            normalized_answer = sorted([str(ans).strip().upper() for ans in answer_data.answer if ans])
-        else:
-            # 单选/判断/填空：转换为字符串列表
-            normalized_answer = [str(answer_data.answer).strip()]
+        normalized_answer = _normalize_submitted_answer(answer_data.answer)
 
         # 检查是否已存在答案记录，如存在则更新，否则创建
         existing_answer_stmt = select(Answer).where(
             Answer.attempt_id == attempt_id,
             Answer.question_id == answer_data.question_id
         )
-        existing_answer = db.execute(existing_answer_stmt).scalar_one_or_none()
+        existing_answer = (await db.execute(existing_answer_stmt)).scalar_one_or_none()
 
         if existing_answer:
             # 更新答案
             existing_answer.answer_json = normalized_answer
             existing_answer.time_spent_seconds = answer_data.time_spent_seconds
-            db.commit()
+            await db.commit()
         else:
             # 创建新答案
             new_answer = Answer(
@@ -95,14 +158,14 @@ async def submit_single_answer(
                 time_spent_seconds=answer_data.time_spent_seconds
             )
             db.add(new_answer)
-            db.commit()
+            await db.commit()
 
         return {"message": "答案提交成功"}
 
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"提交答案失败: {str(e)}"
@@ -113,22 +176,25 @@ async def submit_single_answer(
 async def submit_attempt(
     attempt_id: int,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """提交整个考试并进行判分"""
     try:
         # 验证作答记录存在且属于当前用户
-        attempt_stmt = select(Attempt).where(
+        attempt_stmt = select(Attempt, ExamModel.paper_id).outerjoin(
+            ExamModel, ExamModel.id == Attempt.exam_id
+        ).where(
             Attempt.id == attempt_id,
             Attempt.user_id == current_user["id"]
         )
-        attempt = db.execute(attempt_stmt).scalar_one_or_none()
+        row = (await db.execute(attempt_stmt)).first()
 
-        if not attempt:
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="作答记录不存在"
             )
+        attempt, paper_id = row
 
         if attempt.status != "DOING":
             raise HTTPException(
@@ -136,277 +202,75 @@ async def submit_attempt(
                 detail="考试已提交"
             )
 
-        # 获取所有答案
-        answers_stmt = select(Answer).where(Answer.attempt_id == attempt_id)
-        answers = db.execute(answers_stmt).scalars().all()
-
-        if not answers:
+        # 自动保存模式：判分前强制落库该 attempt 的缓冲答案
+        buffer = get_answer_buffer()
+        if buffer is not None:
+            # 先结束本会话的读事务，之后的查询才能读到另一连接刚提交的答案（MySQL 可重复读）
+            await db.commit()
+            # 可能等待后台批次提交，放到线程池，不阻塞事件循环
+            await run_in_threadpool(flush_buffered_attempt, buffer, attempt_id)
+            buffer.mark_closed(attempt_id)
+
+        # 确认有答案记录
+        answered_stmt = select(Answer.id).where(Answer.attempt_id == attempt_id).limit(1)
+        if (await db.execute(answered_stmt)).first() is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="未找到任何答案记录"
             )
 
         # 批量获取试卷信息（确保有paper_id）
-        if not attempt.exam or not attempt.exam.paper_id:
+        if not paper_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="考试试卷信息不完整"
             )
 
-        paper_id = attempt.exam.paper_id
-        question_ids = [answer.question_id for answer in answers]
-
-        # 批量获取PaperQuestion分数映射
-        pq_stmt = select(PaperQuestion.question_id, PaperQuestion.score).where(
-            PaperQuestion.paper_id == paper_id,
-            PaperQuestion.question_id.in_(question_ids)
-        )
-        pq_results = db.execute(pq_stmt).all()
-        score_map = {row[0]: float(row[1]) for row in pq_results}
+        # 判分、错题本/掌握度写入、计划任务自动完成（与超时自动交卷共用）
+        now = datetime.utcnow()
+        submitted = await db.run_sync(submit_attempts, [(attempt, paper_id)], now)
+        if attempt_id not in submitted:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="考试已提交"
+            )
+        answers = submitted[attempt_id].answers
+        grade = submitted[attempt_id].grade
+        grade_map = {item.question_id: item for item in grade.items}
 
         # 批量获取Questions
+        question_ids = [answer.question_id for answer in answers]
         questions_stmt = select(Question).where(Question.id.in_(question_ids))
-        questions = db.execute(questions_stmt).scalars().all()
-        question_map = {q.id: q for q in questions}
+        question_map = {q.id: q for q in (await db.execute(questions_stmt)).scalars().all()}
 
-        # 判分逻辑
-        total_score = 0
-        correct_count = 0
+        total_score = grade.total_score
+        correct_count = grade.correct_count
         total_questions = len(answers)
         results = []
-        wrong_questions_data = []
-        knowledge_updates = {}
 
         for answer in answers:
             question = question_map.get(answer.question_id)
-            if not question:
+            item = grade_map.get(answer.question_id)
+            if not question or not item:
                 continue
 
-            # 获取题目分数（从预加载的score_map读取）
-            question_score = score_map.get(question.id, 2.0)
-
-            # 按题型进行判分
-            is_correct = False
-            user_answer = answer.answer_json or []
-            correct_answer = question.answer_json or []
-
-            if question.type == "SINGLE":
-                # 单选题：比较第一个答案
-                user_ans = user_answer[0] if user_answer else ""
-                correct_ans = correct_answer[0] if correct_answer else ""
-                is_correct = str(user_ans).strip().upper() == str(correct_ans).strip().upper()
-
-            elif question.type == "MULTI":
-                # 多选题：比较集合
-                user_set = set(str(ans).strip().upper() for ans in user_answer)
-                correct_set = set(str(ans).strip().upper() for ans in correct_answer)
-                is_correct = user_set == correct_set
-
-            elif question.type == "JUDGE":
-                # 判断题：支持多种格式
-                user_ans = (user_answer[0] if user_answer else "").strip().upper()
-                correct_ans = (correct_answer[0] if correct_answer else "").strip().upper()
-
-                # 标准化判断题答案
-                true_values = {"T", "TRUE", "正确", "是", "YES", "Y"}
-                false_values = {"F", "FALSE", "错误", "否", "NO", "N"}
-
-                user_bool = user_ans in true_values if user_ans in true_values | false_values else None
-                correct_bool = correct_ans in true_values if correct_ans in true_values | false_values else None
-
-                is_correct = user_bool == correct_bool and user_bool is not None
-
-            elif question.type == "FILL":
-                # 填空题：规范化比较（去首尾空白、连续空格压缩、忽略大小写）
-                def normalize_text(s: str) -> str:
-                    s2 = re.sub(r"\s+", " ", s.strip())
-                    return s2.lower()
-
-                user_ans_raw = (user_answer[0] if user_answer else "")
-                user_norm = normalize_text(str(user_ans_raw))
-
-                # support multiple correct answers
-                is_correct = False
-                if isinstance(correct_answer, list) and correct_answer:
-                    for ca in correct_answer:
-                        if normalize_text(str(ca)) == user_norm:
-                            is_correct = True
-                            break
-                else:
-                    correct_ans = (correct_answer[0] if correct_answer else "")
-                    is_correct = normalize_text(str(correct_ans)) == user_norm
-
-            elif question.type == "SHORT":
-                # 简答题：关键词命中评分（MVP）
-                # Expect question.answer_json to be like: {"keywords": [...], "min_hit": 2}
-                matched_keywords = []
-                user_text = (user_answer[0] if user_answer else "") if isinstance(user_answer, list) else (user_answer or "")
-                user_text_norm = user_text.lower()
-
-                score_awarded = 0.0
-                is_correct = False
-
-                if isinstance(correct_answer, dict) and "keywords" in correct_answer:
-                    keywords = [str(k).lower() for k in correct_answer.get("keywords", [])]
-                    min_hit = int(correct_answer.get("min_hit", max(1, len(keywords))))
-                    for kw in keywords:
-                        if kw and kw in user_text_norm:
-                            matched_keywords.append(kw)
-                    hit = len(matched_keywords)
-                    if hit >= min_hit:
-                        is_correct = True
-                        score_awarded = question_score
-                    else:
-                        # fallback: partial credit if any keyword matched
-                        if hit > 0:
-                            is_correct = False
-                            score_awarded = question_score * 0.5  # 半分
-                        else:
-                            is_correct = False
-                            score_awarded = 0.0
-                else:
-                    # fallback: if correct_answer provided as list of keywords
-                    if isinstance(correct_answer, list) and correct_answer:
-                        keywords = [str(k).lower() for k in correct_answer]
-                        for kw in keywords:
-                            if kw and kw in user_text_norm:
-                                matched_keywords.append(kw)
-                        if matched_keywords:
-                            is_correct = False
-                            score_awarded = question_score * 0.5  # 半分
-                        else:
-                            is_correct = False
-                            score_awarded = 0.0
-                    else:
-                        # no scoring rule available, default no score
-                        is_correct = False
-                        score_awarded = 0.0
-
-            # 计算得分及更新答案记录
-            # For SHORT we may have already set score_awarded above
-            if question.type != "SHORT":
-                score_awarded = question_score if is_correct else 0.0
-
-            # Update answer record
-            answer.is_correct = is_correct
-            answer.score_awarded = float(score_awarded)
-
-            total_score += score_awarded
-            if is_correct:
-                correct_count += 1
-
             # 收集结果
             res_item = {
                 "question_id": question.id,
                 "question_stem": question.stem,
-                "is_correct": is_correct,
-                "score_awarded": float(score_awarded),
+                "is_correct": item.is_correct,
+                "score_awarded": float(item.score_awarded),
                 "correct_answer": question.answer_json,
                 "user_answer": answer.answer_json,
                 "analysis": question.analysis
             }
             # include matched keywords for SHORT if available
             if question.type == "SHORT":
-                res_item["matched_keywords"] = matched_keywords if 'matched_keywords' in locals() else []
+                res_item["matched_keywords"] = item.matched_keywords or []
 
             results.append(res_item)
 
-            # 为知识点更新掌握度统计
-            for kp_map in question.knowledge_points:
-                kp_id = str(kp_map.knowledge_id)
-                if kp_id not in knowledge_updates:
-                    knowledge_updates[kp_id] = {"correct": 0, "total": 0}
-                knowledge_updates[kp_id]["total"] += 1
-                if is_correct:
-                    knowledge_updates[kp_id]["correct"] += 1
-
-            # 收集错题数据（只针对答错的题目）
-            if not is_correct:
-                wrong_questions_data.append({
-                    "question_id": question.id
-                })
-
-        # 更新错题本
-        for wrong_data in wrong_questions_data:
-            # 检查是否已存在错题记录
-            existing_wrong_stmt = select(WrongQuestion).where(
-                WrongQuestion.user_id == current_user["id"],
-                WrongQuestion.question_id == wrong_data["question_id"]
-            )
-            existing_wrong = db.execute(existing_wrong_stmt).scalar_one_or_none()
-
-            # 计算下次复习时间（简单遗忘曲线）
-            def calculate_next_review(wrong_count: int) -> datetime:
-                intervals = [1, 3, 7, 14, 30]  # 错题次数对应的复习间隔（天）
-                days = intervals[min(wrong_count - 1, len(intervals) - 1)]
-                return datetime.utcnow() + timedelta(days=days)
-
-            if existing_wrong:
-                existing_wrong.wrong_count += 1
-                existing_wrong.last_wrong_at = datetime.utcnow()
-                existing_wrong.next_review_at = calculate_next_review(existing_wrong.wrong_count)
-            else:
-                new_wrong = WrongQuestion(
-                    user_id=current_user["id"],
-                    question_id=wrong_data["question_id"],
-                    wrong_count=1,
-                    last_wrong_at=datetime.utcnow(),
-                    next_review_at=calculate_next_review(1)
-                )
-                db.add(new_wrong)
-
-        # 更新知识点掌握度
-        for knowledge_id_str, stats in knowledge_updates.items():
-            knowledge_id = int(knowledge_id_str)
-
-            # 计算新的掌握度 (使用简单平均，可以后续优化为更复杂的算法)
-            new_mastery = stats["correct"] / stats["total"] if stats["total"] > 0 else 0.0
-
-            # 查找或创建知识点掌握状态
-            existing_state_stmt = select(UserKnowledgeState).where(
-                UserKnowledgeState.user_id == current_user["id"],
-                UserKnowledgeState.knowledge_id == knowledge_id
-            )
-            existing_state = db.execute(existing_state_stmt).scalar_one_or_none()
-
-            if existing_state:
-                # 使用指数移动平均更新掌握度
-                alpha = 0.3  # 学习率
-                existing_state.mastery = alpha * new_mastery + (1 - alpha) * existing_state.mastery
-            else:
-                new_state = UserKnowledgeState(
-                    user_id=current_user["id"],
-                    knowledge_id=knowledge_id,
-                    mastery=new_mastery
-                )
-                db.add(new_state)
-
-        # 更新作答记录
-        attempt.submitted_at = datetime.utcnow()
-        attempt.total_score = total_score
-        attempt.status = "SUBMITTED"
-
-        # 如果该attempt对应某个PlanItem，则自动完成该计划任务
-        if attempt.exam_id:
-            from ....models.plan import LearningPlan, PlanItem
-            # 查找对应的计划任务
-            plan_item_stmt = select(PlanItem).where(
-                PlanItem.exam_id == attempt.exam_id,
-                PlanItem.plan_id.in_(
-                    select(LearningPlan.id).where(
-                        LearningPlan.user_id == current_user["id"],
-                        LearningPlan.is_active == True
-                    )
-                )
-            )
-            plan_item = db.execute(plan_item_stmt).scalar_one_or_none()
-
-            # 如果找到对应的计划任务，自动标记为完成
-            if plan_item and plan_item.status == "TODO":
-                plan_item.status = "DONE"
-                plan_item.completed_at = datetime.utcnow()
-
-        db.commit()
+        await db.commit()
 
         return {
             "attempt_id": attempt_id,
@@ -420,7 +284,7 @@ async def submit_attempt(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"提交考试失败: {str(e)}"
@@ -430,85 +294,90 @@ async def submit_attempt(
 @router.get("/{attempt_id}/result")
 async def get_attempt_result(
     attempt_id: int,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取考试结果"""
-    attempt_stmt = select(Attempt).where(
-        Attempt.id == attempt_id,
-        Attempt.user_id == current_user["id"]
-    )
-    attempt = db.execute(attempt_stmt).scalar_one_or_none()
+    """获取考试结果（不可变快照，支持 ETag / 304）"""
+    etag, body = await db.run_sync(get_attempt_result_snapshot, attempt_id, current_user["id"])
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    if not attempt:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="作答记录不存在"
-        )
 
-    if attempt.status != "SUBMITTED":
+def _encode_history_cursor(submitted_at: datetime, attempt_id: int) -> str:
+    """游标：最后一条记录的 (submitted_at, id)，base64url 编码"""
+    raw = f"{submitted_at.isoformat()}|{attempt_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        submitted_at, attempt_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(submitted_at), int(attempt_id)
+    except (ValueError, UnicodeDecodeError):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="考试尚未完成"
+            detail="无效的分页游标"
         )
 
-    # 获取答案详情
-    answers_stmt = select(Answer).where(Answer.attempt_id == attempt_id)
-    answers = db.execute(answers_stmt).scalars().all()
-    results = []
-
-    for answer in answers:
-        question_stmt = select(Question).where(Question.id == answer.question_id)
-        question = db.execute(question_stmt).scalar_one_or_none()
-        if question:
-            results.append({
-                "question_id": question.id,
-                "question_stem": question.stem,
-                "is_correct": answer.is_correct,
-                "score_awarded": answer.score_awarded,
-                "correct_answer": question.answer_json,
-                "user_answer": answer.answer_json,
-                "analysis": question.analysis,
-                "time_spent_seconds": answer.time_spent_seconds
-            })
-
-    return {
-        "attempt_id": attempt.id,
-        "exam_title": attempt.exam.title if attempt.exam else "未知考试",
-        "total_score": attempt.total_score,
-        "submitted_at": attempt.submitted_at.isoformat() if attempt.submitted_at else None,
-        "results": results
-    }
-
 
 @router.get("/history")
 async def get_attempts_history(
     category: Optional[str] = None,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取当前用户的作答历史（可按考试类别过滤）"""
+    """获取当前用户的作答历史（可按考试类别过滤，按 (submitted_at, id) 游标分页）"""
     try:
-        stmt = select(Attempt).where(Attempt.user_id == current_user["id"], Attempt.status == "SUBMITTED")
+        stmt = select(
+            Attempt.id,
+            Attempt.exam_id,
+            Attempt.total_score,
+            Attempt.submitted_at,
+            ExamModel.title,
+            ExamModel.category,
+            ExamModel.duration_minutes
+        ).outerjoin(
+            ExamModel, Attempt.exam_id == ExamModel.id
+        ).where(Attempt.user_id == current_user["id"], Attempt.status == "SUBMITTED")
         if category:
-            # join Exam
-            from ....models.paper import Exam as ExamModel
-            stmt = stmt.join(ExamModel, Attempt.exam_id == ExamModel.id).where(ExamModel.category == category)
+            stmt = stmt.where(ExamModel.category == category)
+        if cursor:
+            last_submitted_at, last_id = _decode_history_cursor(cursor)
+            stmt = stmt.where(or_(
+                Attempt.submitted_at < last_submitted_at,
+                and_(Attempt.submitted_at == last_submitted_at, Attempt.id < last_id)
+            ))
+
+        # 多取一条判断是否还有下一页
+        stmt = stmt.order_by(Attempt.submitted_at.desc(), Attempt.id.desc()).limit(limit + 1)
+        rows = (await db.execute(stmt)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
 
-        stmt = stmt.order_by(Attempt.submitted_at.desc()).limit(limit)
-        attempts = db.execute(stmt).scalars().all()
         items = []
-        for a in attempts:
+        for row in rows:
             items.append({
-                "attempt_id": a.id,
-                "exam_id": a.exam_id,
-                "exam_title": a.exam.title if a.exam else None,
-                "total_score": float(a.total_score) if a.total_score is not None else None,
-                "submitted_at": a.submitted_at.isoformat() if a.submitted_at else None,
-                "duration_minutes": a.exam.duration_minutes if a.exam else None
+                "attempt_id": row.id,
+                "exam_id": row.exam_id,
+                "exam_title": row.title,
+                "category": row.category,
+                "total_score": float(row.total_score) if row.total_score is not None else None,
+                "submitted_at": row.submitted_at.isoformat() if row.submitted_at else None,
+                "duration_minutes": row.duration_minutes
             })
-        return {"items": items}
+
+        next_cursor = None
+        if has_more and rows[-1].submitted_at is not None:
+            next_cursor = _encode_history_cursor(rows[-1].submitted_at, rows[-1].id)
+        return {"items": items, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -517,23 +386,25 @@ async def get_attempts_history(
 async def get_attempt_detail(
     attempt_id: int,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取 attempt 详情（用于答题页面恢复）"""
-    attempt_stmt = select(Attempt).where(
+    attempt_stmt = select(Attempt, ExamModel).outerjoin(
+        ExamModel, ExamModel.id == Attempt.exam_id
+    ).where(
         Attempt.id == attempt_id,
         Attempt.user_id == current_user["id"]
     )
-    attempt = db.execute(attempt_stmt).scalar_one_or_none()
+    row = (await db.execute(attempt_stmt)).first()
 
-    if not attempt:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="作答记录不存在"
         )
+    attempt, exam = row
 
     # exam info
-    exam = attempt.exam
     exam_info = {
         "id": exam.id if exam else None,
         "title": exam.title if exam else None,
@@ -541,35 +412,22 @@ async def get_attempt_detail(
         "duration_minutes": exam.duration_minutes if exam else None
     }
 
-    # gather questions from paper ordered by order_no
+    # 题目列表来自按 paper_id 缓存的载荷，已保存答案一次查出后合并
     questions = []
     if exam and exam.paper_id:
-        # query PaperQuestion model to build list
-        from ....models.paper import PaperQuestion
-        pqs_stmt = select(PaperQuestion).where(PaperQuestion.paper_id == exam.paper_id).order_by(PaperQuestion.order_no)
-        pqs = db.execute(pqs_stmt).scalars().all()
-
-        for pq in pqs:
-            q_stmt = select(Question).where(Question.id == pq.question_id)
-            q = db.execute(q_stmt).scalar_one_or_none()
-            if not q:
-                continue
-            # find saved answer if any
-            ans_stmt = select(Answer).where(Answer.attempt_id == attempt_id, Answer.question_id == q.id)
-            ans = db.execute(ans_stmt).scalar_one_or_none()
-            saved = ans.answer_json if ans and ans.answer_json is not None else None
-
-            questions.append({
-                "id": q.id,
-                "order_no": pq.order_no,
-                "question": {
-                    "id": q.id,
-                    "type": q.type,
-                    "stem": q.stem,
-                    "options_json": q.options_json
-                },
-                "saved_answer": saved
-            })
+        saved_stmt = select(Answer.question_id, Answer.answer_json).where(
+            Answer.attempt_id == attempt_id
+        )
+        saved = {qid: answer_json for qid, answer_json in (await db.execute(saved_stmt)).all()}
+
+        # 自动保存模式下尚未落库的答案（覆盖数据库中的旧答案）
+        buffer = get_answer_buffer()
+        if buffer is not None:
+            for qid, entry in buffer.pending_for_attempt(attempt_id).items():
+                saved[qid] = entry["answer_json"]
+
+        payload = await db.run_sync(get_paper_payload, exam.paper_id, attempt.user_id)
+        questions = merge_saved_answers(payload, saved)
 
     return {
         "attempt_id": attempt.id,
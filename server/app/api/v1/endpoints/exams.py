@@ -1,21 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
-from sqlalchemy import select, desc, func
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Response
+from sqlalchemy import select, desc, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from ....core.database import get_db
+from ....core.config import settings
+from ....core.database import get_async_db
 from ....models.paper import Exam, Paper, PaperQuestion
 from ....models.attempt import Attempt
 from ....models.question import Question
-from ..deps import get_current_student
+from ....services.seeded_papers import seeded_rule
+from ..deps import get_current_student, get_current_user_optional
 
 router = APIRouter()
 
 
 class MockGenerateRequest(BaseModel):
-    count: int = 20
+    count: int = Field(20, ge=1, le=settings.max_practice_questions)
     duration_minutes: int = 60
 
 
@@ -24,11 +26,16 @@ async def get_exams(
     category: Optional[str] = Query(None, description="考试类别: DIAGNOSTIC, PRACTICE, MOCK"),
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取考试列表"""
+    """获取考试列表（指定学员的考试只对该学员可见）"""
     try:
         stmt = select(Exam).where(Exam.status == "PUBLISHED")
+        if current_user is None:
+            stmt = stmt.where(Exam.assigned_user_id.is_(None))
+        elif current_user["role"] != "ADMIN":
+            stmt = stmt.where(or_(Exam.assigned_user_id.is_(None), Exam.assigned_user_id == current_user["id"]))
 
         if category:
             stmt = stmt.where(Exam.category == category)
@@ -38,16 +45,22 @@ async def get_exams(
 
         # 获取总数
         subq = stmt.order_by(None).with_only_columns(Exam.id).subquery()
-        total = db.execute(select(func.count()).select_from(subq)).scalar_one()
+        total = (await db.execute(select(func.count()).select_from(subq))).scalar_one()
 
         # 分页获取数据
-        exams = db.execute(stmt.offset((page - 1) * size).limit(size)).scalars().all()
+        exams = (await db.execute(stmt.offset((page - 1) * size).limit(size))).scalars().all()
 
         result = []
         for exam in exams:
             # 获取题目数量
             questions_stmt = select(func.count()).select_from(PaperQuestion).where(PaperQuestion.paper_id == exam.paper_id)
-            total_questions = db.execute(questions_stmt).scalar_one()
+            total_questions = (await db.execute(questions_stmt)).scalar_one()
+            if total_questions == 0:
+                # 未固化的种子试卷没有题目行，题数记在规则中
+                config_stmt = select(Paper.config_json).where(Paper.id == exam.paper_id)
+                rule = seeded_rule((await db.execute(config_stmt)).scalar_one_or_none())
+                if rule is not None:
+                    total_questions = rule["size"]
             result.append({
                 "id": exam.id,
                 "title": exam.title,
@@ -77,17 +90,18 @@ async def get_exams(
 async def start_exam(
     exam_id: int,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """开始考试"""
     try:
-        from ....services.exam_runtime import start_exam_for_user
-        return start_exam_for_user(db, exam_id, current_user["id"])
+        from ....services.exam_runtime import start_exam_snapshot
+        body = await db.run_sync(start_exam_snapshot, exam_id, current_user["id"])
+        return Response(content=body, media_type="application/json")
 
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"开始考试失败: {str(e)}"
@@ -98,33 +112,35 @@ async def start_exam(
 async def generate_mock_exam(
     request: MockGenerateRequest,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """生成个性化模拟考试"""
+    """生成个性化模拟考试：优先从预热池取现成试卷，未命中时同步组卷"""
     try:
-        # 使用模板化组卷服务生成模拟考试
-        from ....services.paper_template import build_mock_paper
-
-        # 根据题目数量计算比例（简化版：平均分配到5个模块）
-        total_questions = request.count
-        base_count = total_questions // 5
-        remainder = total_questions % 5
-
-        # ratio key 必须等于 KnowledgePoint.code，否则抽不到题
-        ratio = {
-            "XINGCE_SL": base_count + (1 if remainder > 0 else 0),  # 数量关系
-            "XINGCE_PD": base_count + (1 if remainder > 1 else 0),  # 判断推理
-            "XINGCE_YY": base_count + (1 if remainder > 2 else 0),  # 言语理解与表达
-            "XINGCE_ZL": base_count + (1 if remainder > 3 else 0),  # 资料分析
-            "XINGCE_CS": base_count                                   # 常识判断
-        }
-
-        paper, exam = build_mock_paper(
-            db=db,
+        from ....services.mock_pool import issue_mock_exam, take_mock_paper
+        from ....services.paper_template import build_mock_paper, xingce_mock_ratio
+        from ....services.seen_questions import load_seen_questions
+
+        # 根据题目数量计算比例（平均分配到5个模块）
+        ratio = xingce_mock_ratio(request.count)
+
+        paper_id = take_mock_paper("XINGCE", request.count, ratio)
+        if paper_id is not None:
+            exam = await db.run_sync(issue_mock_exam, paper_id, "XINGCE", current_user["id"])
+            return {
+                "exam_id": exam.id,
+                "paper_id": paper_id,
+                "count": request.count
+            }
+
+        # 未命中：为该学生同步组卷，避开已作答的题目
+        seen = await db.run_sync(load_seen_questions, current_user["id"])
+        paper, exam = await db.run_sync(
+            build_mock_paper,
             subject="XINGCE",
             total=request.count,
             ratio=ratio,
-            created_by=current_user["id"]
+            created_by=current_user["id"],
+            avoid=seen
         )
 
         return {
@@ -134,7 +150,7 @@ async def generate_mock_exam(
         }
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"生成模拟考试失败: {str(e)}"
@@ -5,7 +5,8 @@ from pydantic import BaseModel
 from datetime import date
 
 from ....core.database import get_db
-from ....models.plan import Goal
+from ....models.plan import Goal, LearningPlan
+from ....services.plan_cache import plan_version_bump
 from ..deps import get_current_student
 
 router = APIRouter()
@@ -117,6 +118,8 @@ async def update_goal(
                         detail="考试日期必须是未来日期"
                     )
                 setattr(goal, field, value)
+        # 活跃计划响应中包含目标信息
+        db.execute(plan_version_bump(LearningPlan.goal_id == goal.id))
 
         db.commit()
         db.refresh(goal)
@@ -6,6 +6,7 @@ from pydantic import BaseModel
 
 from ....core.database import get_db
 from ....models.knowledge import KnowledgePoint
+from ....services.knowledge_tree import bump_knowledge_version
 from ..deps import get_current_admin
 
 router = APIRouter()
@@ -103,6 +104,7 @@ async def create_knowledge_point(
 
         db.add(knowledge_point)
         db.commit()
+        bump_knowledge_version()
         db.refresh(knowledge_point)
 
         return {
@@ -170,6 +172,7 @@ async def update_knowledge_point(
                 setattr(knowledge_point, field, value)
 
         db.commit()
+        bump_knowledge_version()
         db.refresh(knowledge_point)
 
         return {
@@ -216,6 +219,7 @@ async def delete_knowledge_point(
         # 删除知识点
         db.delete(knowledge_point)
         db.commit()
+        bump_knowledge_version()
 
         return {"message": "知识点删除成功"}
     except HTTPException:
@@ -4,6 +4,7 @@ from typing import Optional
 
 from ....core.database import get_db
 from ....models.paper import Paper, PaperQuestion
+from ....services.seeded_papers import freeze_seeded_paper
 from ..deps import get_current_admin
 
 router = APIRouter()
@@ -46,3 +47,21 @@ async def create_paper(payload: dict, current_user: dict = Depends(get_current_a
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.post("/{paper_id}/freeze")
+async def freeze_paper(paper_id: int, current_user: dict = Depends(get_current_admin), db: Session = Depends(get_db)):
+    """固化种子试卷：把按规则推导出的题目写入 paper_questions，此后不再依赖推导"""
+    paper = db.query(Paper).filter(Paper.id == paper_id).first()
+    if not paper:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="试卷不存在")
+    try:
+        count = freeze_seeded_paper(db, paper)
+        db.commit()
+        return {"id": paper.id, "question_count": count}
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -1,133 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from datetime import date, datetime, timedelta
 from typing import Dict, Any
-import json
-import random
 
-from ....core.database import get_db
-from ....models.plan import Goal, LearningPlan, PlanItem
+from ....core.database import get_async_db
+from ....models.plan import LearningPlan, PlanItem
 from ....models.attempt import Attempt
-from ....models.question import Question
-from ....models.knowledge import QuestionKnowledgeMap
-from ....models.progress import UserKnowledgeState, WrongQuestion
-from ....models.paper import Paper, PaperQuestion, Exam
+from ....models.progress import WrongQuestion
+from ....models.paper import Exam
+from ....services.plan_cache import get_active_plan_snapshot, plan_version_bump
 from ....services.recommendation import generate_learning_plan
+from ....services.paper_store import get_or_create_auto_paper
+from ....services.practice_generator import generate_practice_exam
 from ..deps import get_current_student
 
 router = APIRouter()
 
 
-def generate_practice_exam(db: Session, user_id: int, knowledge_id: int, count: int = 10, mode: str = "ADAPTIVE") -> Exam:
-    """生成专项练习考试（抽取自practice.py逻辑）"""
-    count = max(1, int(count))
-    mode = (mode or "ADAPTIVE").upper()
-
-    # 获取符合知识点的题目
-    stmt = select(Question.id, Question.difficulty).join(
-        QuestionKnowledgeMap, Question.id == QuestionKnowledgeMap.question_id
-    ).where(QuestionKnowledgeMap.knowledge_id == knowledge_id)
-
-    candidates = db.execute(stmt).all()
-    if not candidates:
-        raise HTTPException(status_code=400, detail="所选知识点暂无题目")
-
-    # 按难度分组题目
-    by_diff = {}
-    for q in candidates:
-        by_diff.setdefault(q.difficulty, []).append(q.id)
-
-    # 选题策略
-    def pick_questions(target_diff, need):
-        picked = []
-        diff = target_diff
-        while len(picked) < need and diff >= 1:
-            pool = by_diff.get(diff, [])
-            remaining = [pid for pid in pool if pid not in picked]
-            take = min(len(remaining), need - len(picked))
-            if take > 0:
-                picked.extend(random.sample(remaining, take))
-            diff -= 1
-        return picked
-
-    # 获取用户掌握度
-    state_stmt = select(UserKnowledgeState).where(
-        UserKnowledgeState.user_id == user_id,
-        UserKnowledgeState.knowledge_id == knowledge_id
-    )
-    state = db.execute(state_stmt).scalar_one_or_none()
-    mastery = float(state.mastery) if state and state.mastery is not None else 0.0
-
-    # 根据掌握度确定目标难度
-    if mode == "ADAPTIVE":
-        if mastery < 0.3:
-            target = 2
-        elif mastery < 0.6:
-            target = 3
-        else:
-            target = 4
-    else:
-        target = 3
-
-    selected = pick_questions(target, count)
-
-    # 如果还不够，从所有题目中补充
-    all_ids = [q.id for q in candidates]
-    remaining_pool = [pid for pid in all_ids if pid not in selected]
-    if len(selected) < count and remaining_pool:
-        need = count - len(selected)
-        selected.extend(random.sample(remaining_pool, min(need, len(remaining_pool))))
-
-    if not selected:
-        raise HTTPException(status_code=400, detail="无法为该知识点抽题")
-
-    # 创建Paper
-    paper = Paper(
-        title=f"PRACTICE_KP_{knowledge_id}_{user_id}",
-        mode="AUTO",
-        config_json={
-            "knowledge_id": knowledge_id,
-            "count": count,
-            "mode": mode,
-            "mastery": mastery,
-            "target_diff": target
-        },
-        total_score=float(len(selected) * 2.0),
-        created_by=user_id
-    )
-    db.add(paper)
-    db.flush()
-
-    # 创建PaperQuestion
-    order_no = 1
-    for qid in selected:
-        pq = PaperQuestion(
-            paper_id=paper.id,
-            question_id=qid,
-            order_no=order_no,
-            score=2.0
-        )
-        db.add(pq)
-        order_no += 1
-
-    # 创建Exam
-    exam = Exam(
-        paper_id=paper.id,
-        title=f"专项练习 - 知识点 {knowledge_id}",
-        category="PRACTICE",
-        duration_minutes=0,
-        status="PUBLISHED",
-        created_by=user_id
-    )
-    db.add(exam)
-    db.commit()
-    db.refresh(exam)
-
-    return exam
-
-
 def generate_review_exam(db: Session, user_id: int, count: int = 10) -> Exam:
     """生成复习考试（抽取自wrong_questions.py逻辑）"""
     now = datetime.utcnow()
@@ -145,23 +37,15 @@ def generate_review_exam(db: Session, user_id: int, count: int = 10) -> Exam:
 
     question_ids = [w.question_id for w in due_q]
 
-    # 创建Paper
-    paper = Paper(
-        title=f"REVIEW_{user_id}_{int(now.timestamp())}",
-        mode="AUTO",
-        config_json={"type": "review", "source": "wrong_questions"},
-        total_score=float(len(question_ids) * 2.0),
-        created_by=user_id
+    # 创建或复用Paper（按有序题目与分值内容寻址）
+    paper, _ = get_or_create_auto_paper(
+        db,
+        title="REVIEW",
+        question_ids=question_ids,
+        scores=[2.0] * len(question_ids),
+        created_by=user_id,
+        config_json={"type": "review", "source": "wrong_questions"}
     )
-    db.add(paper)
-    db.flush()
-
-    # 创建PaperQuestion
-    order_no = 1
-    for qid in question_ids:
-        pq = PaperQuestion(paper_id=paper.id, question_id=qid, order_no=order_no, score=2.0)
-        db.add(pq)
-        order_no += 1
 
     # 创建Exam
     exam = Exam(
@@ -188,6 +72,7 @@ def generate_review_exam(db: Session, user_id: int, count: int = 10) -> Exam:
 
 class PlanGenerateRequest(BaseModel):
     days: int = 14  # 默认14天
+    incremental: bool = False  # 在当前活跃计划上增量重排（保留已完成的任务）
 
 
 class PlanItemCompleteRequest(BaseModel):
@@ -204,7 +89,7 @@ class PlanItemStartResponse(BaseModel):
 async def generate_learning_plan_endpoint(
     request: PlanGenerateRequest,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """生成学习计划"""
     try:
@@ -216,19 +101,21 @@ async def generate_learning_plan_endpoint(
             )
 
         # 调用推荐服务生成计划
-        result = generate_learning_plan(db, current_user["id"], request.days)
+        result = await db.run_sync(
+            generate_learning_plan, current_user["id"], request.days, request.incremental
+        )
 
-        db.commit()
+        await db.commit()
         return result
 
     except ValueError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"生成学习计划失败: {str(e)}"
@@ -238,61 +125,11 @@ async def generate_learning_plan_endpoint(
 @router.get("/active")
 async def get_active_plan(
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取当前活跃的学习计划"""
-    stmt = select(LearningPlan).where(
-        LearningPlan.user_id == current_user["id"],
-        LearningPlan.is_active == True
-    ).order_by(LearningPlan.created_at.desc()).limit(1)
-    plan = db.execute(stmt).scalar_one_or_none()
-
-    if not plan:
-        return None
-
-    # 获取计划项
-    stmt = select(PlanItem).where(PlanItem.plan_id == plan.id).order_by(PlanItem.date, PlanItem.id)
-    items = db.execute(stmt).scalars().all()
-
-    # 按日期分组
-    items_by_date = {}
-    for item in items:
-        date_str = item.date.isoformat()
-        if date_str not in items_by_date:
-            items_by_date[date_str] = []
-
-        # 解析reason_json
-        reason = {}
-        if item.reason_json:
-            try:
-                reason = json.loads(item.reason_json)
-            except:
-                reason = {"explanation": "系统生成"}
-
-        items_by_date[date_str].append({
-            "id": item.id,
-            "type": item.type,
-            "title": item.title,
-            "knowledge_id": item.knowledge_id,
-            "expected_minutes": item.expected_minutes,
-            "status": item.status,
-            "completed_at": item.completed_at.isoformat() if item.completed_at else None,
-            "exam_id": item.exam_id,
-            "reason": reason
-        })
-
-    return {
-        "plan_id": plan.id,
-        "start_date": plan.start_date.isoformat(),
-        "end_date": plan.end_date.isoformat(),
-        "strategy_version": plan.strategy_version,
-        "items_by_date": items_by_date,
-        "goal": {
-            "exam_date": plan.goal.exam_date.isoformat() if plan.goal else None,
-            "target_score": plan.goal.target_score if plan.goal else None,
-            "daily_minutes": plan.goal.daily_minutes if plan.goal else None
-        }
-    }
+    """获取当前活跃的学习计划（按计划版本缓存序列化后的响应）"""
+    body = await db.run_sync(get_active_plan_snapshot, current_user["id"])
+    return Response(content=body, media_type="application/json")
 
 
 @router.patch("/items/{item_id}")
@@ -300,7 +137,7 @@ async def update_plan_item_status(
     item_id: int,
     request: PlanItemCompleteRequest,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新计划项状态"""
     try:
@@ -309,7 +146,7 @@ async def update_plan_item_status(
             PlanItem.id == item_id,
             LearningPlan.user_id == current_user["id"]
         )
-        item = db.execute(stmt).scalar_one_or_none()
+        item = (await db.execute(stmt)).scalar_one_or_none()
 
         if not item:
             raise HTTPException(
@@ -329,8 +166,9 @@ async def update_plan_item_status(
         item.status = request.status
         if request.status == "DONE":
             item.completed_at = datetime.utcnow()
+        await db.execute(plan_version_bump(LearningPlan.id == item.plan_id))
 
-        db.commit()
+        await db.commit()
 
         return {
             "id": item.id,
@@ -342,7 +180,7 @@ async def update_plan_item_status(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"更新计划项状态失败: {str(e)}"
@@ -353,7 +191,7 @@ async def update_plan_item_status(
 async def start_plan_item(
     item_id: int,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> PlanItemStartResponse:
     """
     开始计划项任务（生成考试并开始答题）
@@ -369,7 +207,7 @@ async def start_plan_item(
                 )
             )
         )
-        item = db.execute(item_stmt).scalar_one_or_none()
+        item = (await db.execute(item_stmt)).scalar_one_or_none()
 
         if not item:
             raise HTTPException(
@@ -389,19 +227,23 @@ async def start_plan_item(
             if not item.exam_id:
                 # 生成新考试
                 if item.type == "PRACTICE":
-                    exam = generate_practice_exam(
-                        db, current_user["id"], item.knowledge_id, count=10, mode="ADAPTIVE"
-                    )
+                    try:
+                        exam, _ = await db.run_sync(
+                            generate_practice_exam, current_user["id"], item.knowledge_id, count=10, mode="ADAPTIVE"
+                        )
+                    except ValueError as e:
+                        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
                 else:  # REVIEW
-                    exam = generate_review_exam(db, current_user["id"], count=10)
+                    exam = await db.run_sync(generate_review_exam, current_user["id"], count=10)
 
                 # 更新计划项的exam_id
                 item.exam_id = exam.id
-                db.commit()
+                await db.execute(plan_version_bump(LearningPlan.id == item.plan_id))
+                await db.commit()
             else:
                 # 使用现有考试
                 exam_stmt = select(Exam).where(Exam.id == item.exam_id)
-                exam = db.execute(exam_stmt).scalar_one_or_none()
+                exam = (await db.execute(exam_stmt)).scalar_one_or_none()
                 if not exam:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -414,7 +256,7 @@ async def start_plan_item(
                 Attempt.user_id == current_user["id"],
                 Attempt.status == "DOING"
             )
-            existing_attempt = db.execute(attempt_stmt).scalar_one_or_none()
+            existing_attempt = (await db.execute(attempt_stmt)).scalar_one_or_none()
 
             if existing_attempt:
                 # 返回现有的attempt
@@ -431,8 +273,8 @@ async def start_plan_item(
                 status="DOING"
             )
             db.add(attempt)
-            db.commit()
-            db.refresh(attempt)
+            await db.commit()
+            await db.refresh(attempt)
 
             return PlanItemStartResponse(
                 action="EXAM",
@@ -455,7 +297,7 @@ async def start_plan_item(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"开始任务失败: {str(e)}"
@@ -8,6 +8,8 @@ from math import ceil
 from ....core.database import get_db
 from ....models.question import Question
 from ....models.knowledge import QuestionKnowledgeMap, KnowledgePoint
+from ....services.grading import invalidate_grader
+from ....services.question_index import bump_question_version
 from ..deps import get_current_admin
 
 router = APIRouter()
@@ -154,6 +156,7 @@ async def create_question(
 
         db.commit()
         db.refresh(question)
+        bump_question_version()
 
         return {
             "id": question.id,
@@ -224,6 +227,8 @@ async def update_question(
 
         db.commit()
         db.refresh(question)
+        bump_question_version()
+        invalidate_grader(question_id)
 
         return {
             "id": question.id,
@@ -267,6 +272,8 @@ async def delete_question(
         # 删除题目
         db.delete(question)
         db.commit()
+        bump_question_version()
+        invalidate_grader(question_id)
 
         return {"message": "题目删除成功"}
     except HTTPException:
@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime, date
 from pydantic import BaseModel
 
-from ....core.database import get_db
+from ....core.database import get_async_db
 from ....models.progress import WrongQuestion
 from ....models.question import Question
 from ....models.knowledge import QuestionKnowledgeMap, KnowledgePoint
+from ....services.question_index import get_question_index
+from ....services.paper_store import get_or_create_auto_paper
 from ..deps import get_current_student
 
 router = APIRouter()
@@ -20,7 +22,7 @@ async def list_wrong_questions(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=200),
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取错题本（可仅返回到期复习项）
@@ -33,10 +35,10 @@ async def list_wrong_questions(
         # 获取总数
         subq = stmt.order_by(None).with_only_columns(WrongQuestion.id).subquery()
         total_stmt = select(func.count()).select_from(subq)
-        total = db.execute(total_stmt).scalar_one()
+        total = (await db.execute(total_stmt)).scalar_one()
 
         # 获取分页数据
-        items = db.execute(stmt.order_by(WrongQuestion.next_review_at).offset((page - 1) * size).limit(size)).scalars().all()
+        items = (await db.execute(stmt.order_by(WrongQuestion.next_review_at).offset((page - 1) * size).limit(size))).scalars().all()
 
         if not items:
             return {"items": [], "total": total, "page": page, "size": size}
@@ -44,31 +46,35 @@ async def list_wrong_questions(
         # 批量获取题目信息
         question_ids = [w.question_id for w in items]
         questions_stmt = select(Question).where(Question.id.in_(question_ids))
-        questions = db.execute(questions_stmt).scalars().all()
+        questions = (await db.execute(questions_stmt)).scalars().all()
         question_map = {q.id: q for q in questions}
 
-        # 批量获取知识点映射
-        kp_maps_stmt = select(QuestionKnowledgeMap).where(QuestionKnowledgeMap.question_id.in_(question_ids))
-        kp_maps = db.execute(kp_maps_stmt).scalars().all()
+        # 知识点映射取自内存题库索引
+        index = await db.run_sync(get_question_index)
+        kp_maps = [
+            (qid, kid)
+            for qid in question_ids
+            for kid in index.knowledge_ids(qid)
+        ]
 
         # 收集所有知识点ID
-        knowledge_ids = list(set(km.knowledge_id for km in kp_maps))
+        knowledge_ids = list(set(kid for _, kid in kp_maps))
         if knowledge_ids:
             kps_stmt = select(KnowledgePoint).where(KnowledgePoint.id.in_(knowledge_ids))
-            kps = db.execute(kps_stmt).scalars().all()
+            kps = (await db.execute(kps_stmt)).scalars().all()
             kp_map = {kp.id: kp for kp in kps}
         else:
             kp_map = {}
 
         # 按题目ID分组知识点映射
         question_kps = {}
-        for km in kp_maps:
-            if km.question_id not in question_kps:
-                question_kps[km.question_id] = []
-            if km.knowledge_id in kp_map:
-                question_kps[km.question_id].append({
-                    "id": kp_map[km.knowledge_id].id,
-                    "name": kp_map[km.knowledge_id].name
+        for qid, kid in kp_maps:
+            if qid not in question_kps:
+                question_kps[qid] = []
+            if kid in kp_map:
+                question_kps[qid].append({
+                    "id": kp_map[kid].id,
+                    "name": kp_map[kid].name
                 })
 
         result = []
@@ -101,7 +107,7 @@ class ReviewGenerateRequest(BaseModel):
 async def generate_review_exam(
     request: ReviewGenerateRequest,
     current_user: dict = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     生成到期复习的考试（从到期错题中抽取）
@@ -113,30 +119,23 @@ async def generate_review_exam(
             WrongQuestion.user_id == current_user["id"],
             WrongQuestion.next_review_at <= now
         ).order_by(WrongQuestion.next_review_at).limit(request.count)
-        due_q = db.execute(due_q_stmt).scalars().all()
+        due_q = (await db.execute(due_q_stmt)).scalars().all()
 
         if not due_q:
             raise HTTPException(status_code=400, detail="暂无到期复习的错题")
 
         question_ids = [w.question_id for w in due_q]
 
-        # 生成 Paper + PaperQuestion
-        from ....models.paper import Paper, PaperQuestion, Exam
-        paper = Paper(
-            title=f"REVIEW_{current_user['id']}_{int(now.timestamp())}",
-            mode="AUTO",
-            config_json={"type": "review", "source": "wrong_questions"},
-            total_score=float(len(question_ids) * 2.0),
-            created_by=current_user["id"]
+        # 生成或复用 Paper + PaperQuestion（按有序题目与分值内容寻址）
+        from ....models.paper import Exam
+        paper, _ = await db.run_sync(
+            get_or_create_auto_paper,
+            title="REVIEW",
+            question_ids=question_ids,
+            scores=[2.0] * len(question_ids),
+            created_by=current_user["id"],
+            config_json={"type": "review", "source": "wrong_questions"}
         )
-        db.add(paper)
-        db.flush()
-
-        order_no = 1
-        for qid in question_ids:
-            pq = PaperQuestion(paper_id=paper.id, question_id=qid, order_no=order_no, score=2.0)
-            db.add(pq)
-            order_no += 1
 
         # 创建 Exam，复用 PRACTICE 类别并在 title 标注 REVIEW
         exam = Exam(
@@ -157,15 +156,15 @@ async def generate_review_exam(
             idx = min(w.wrong_count, len(intervals)) - 1
             w.next_review_at = datetime.utcnow() + timedelta(days=intervals[idx])
 
-        db.commit()
-        db.refresh(exam)
+        await db.commit()
+        await db.refresh(exam)
 
         return {"exam_id": exam.id, "paper_id": paper.id, "count": len(question_ids)}
 
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"生成复习试卷失败: {e}")
 
 
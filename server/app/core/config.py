@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
 
@@ -58,6 +58,88 @@ class Settings(BaseSettings):
     min_practice_questions: int = 10
     max_practice_questions: int = 50
 
+    # 缓存配置
+    # 题库内存索引的最长存活时间(秒)，多进程部署时兜底其他进程的题目修改；<=0 表示仅按版本号失效
+    question_index_ttl_seconds: int = 300
+    # 试卷题目载荷缓存的最大试卷数（LRU 淘汰）
+    paper_cache_size: int = 512
+    # 考试结果快照的进程内缓存条数（LRU 淘汰）
+    attempt_result_cache_size: int = 1024
+    # 已编译组卷模板的缓存条数（LRU 淘汰；每个模板按单元格持有题目位图，大题库下注意内存）
+    paper_template_cache_size: int = 16
+    # 知识点树内存索引的最长存活时间(秒)，多进程部署时兜底其他进程的知识点修改；<=0 表示仅按版本号失效
+    knowledge_tree_ttl_seconds: int = 300
+    # 活跃学习计划响应的缓存条数（LRU 淘汰；按计划版本失效）
+    plan_cache_size: int = 1024
+
+    # 服务进程数（与 uvicorn/gunicorn 读取的 WEB_CONCURRENCY 环境变量一致；用 --workers 启动多进程时须同时设置）
+    web_concurrency: int = 1
+
+    # 答题自动保存配置（write-behind：单题作答先写本地日志，定期批量落库）
+    # 缓冲在进程内，交卷与超时交卷必须落在同一进程：只支持单进程部署，web_concurrency > 1 或
+    # 另一个进程已在同一日志目录开启自动保存时拒绝启动
+    autosave_enabled: bool = False
+    autosave_journal_dir: str = "data/autosave"
+    autosave_flush_interval_seconds: float = 2.0
+    autosave_journal_fsync: bool = True
+    # 进行中作答归属的缓存（单题保存免查 attempts 表）：超过存活时间重新查库确认，超过条数按 LRU 淘汰
+    autosave_open_attempt_ttl_seconds: float = 300.0
+    autosave_open_attempt_cache_size: int = 10000
+
+    # 超时自动交卷配置（后台线程按批处理到期的 DOING 作答；多进程部署时只在一个进程开启）
+    attempt_sweeper_enabled: bool = False
+    attempt_sweep_interval_seconds: float = 30.0
+    attempt_sweep_batch_size: int = 200
+    # 批次之间的间隔(秒)，另加 0~1 倍随机抖动，避免集中交卷时数据库被瞬时打满
+    attempt_sweep_batch_pause_seconds: float = 0.5
+    # 到期后的宽限时间(秒)，留给前端最后一次自动保存/主动交卷
+    attempt_sweep_grace_seconds: int = 60
+
+    # 自动组卷试卷回收配置（删除无作答的学生自建考试及不再被引用的内容寻址试卷；多进程部署时只在一个进程开启）
+    paper_reclaimer_enabled: bool = False
+    paper_reclaim_interval_seconds: float = 3600.0
+    # 只回收创建时间（试卷为最近使用时间）早于该时长(小时)的记录，避免删掉刚生成还没开考的练习
+    paper_reclaim_retention_hours: int = 24
+    paper_reclaim_batch_size: int = 500
+
+    # 学习计划夜间批量刷新（按最新掌握度增量重排所有活跃计划的剩余天数；多进程部署时只在一个进程开启）
+    plan_refresh_enabled: bool = False
+    # 每天几点（服务器本地时间）开始刷新
+    plan_refresh_hour: int = 3
+    # 每块学员数：一块一个事务，掌握度矩阵为 块大小 × 知识点数
+    plan_refresh_chunk_size: int = 2000
+
+    # 学习计划排程方式：knapsack 每天在目标时长内最大化任务总优先级（v2.0），greedy 为按优先级顺序逐个填充（v1.0）
+    plan_scheduler: str = "knapsack"
+    # knapsack 排程中每类任务占当日时长的上限（每日配比约束）
+    plan_mix_max_share: Dict[str, float] = {"LEARN": 0.7, "PRACTICE": 0.5, "REVIEW": 0.5}
+
+    # 种子试卷（专项练习只记录组卷规则与随机种子，题目首次访问时推导，管理员固化后才写入题目行）
+    seeded_papers_enabled: bool = False
+    # 种子试卷按学生打乱题目与选项顺序
+    seeded_paper_shuffle: bool = True
+
+    # 模拟试卷预热池（后台按配比预先组卷，生成模拟考试时直接取用；每个服务进程各自持有队列）
+    mock_pool_enabled: bool = False
+    # 每个 (科目, 题量, 配比) 预热的试卷份数
+    mock_pool_size: int = 20
+    # 预热的行测模拟卷题量（只预热这些题量，其他题量的请求同步组卷）
+    mock_pool_warm_counts: List[int] = [20]
+    # 最多预热的配比数，超出后的新配比只走同步组卷
+    mock_pool_max_keys: int = 8
+    # 两份试卷之间的暂停(秒)，限制补充速率，避免与交卷争抢写锁
+    mock_pool_refill_pause_seconds: float = 0.5
+    # 无取用时的巡检间隔(秒)
+    mock_pool_refill_interval_seconds: float = 60.0
+
+    # 批量个性化诊断配置
+    # 抽题进程数（spawn 方式启动）；0 表示 CPU 核数减一（最多 8），结果 <=1 时在任务线程内抽题
+    cohort_diagnostic_workers: int = 0
+    # 每块学员数：一块一个事务，块提交后推进断点游标
+    cohort_diagnostic_chunk_size: int = 500
+    # 每个进程池任务包含的学员数
+    cohort_diagnostic_task_size: int = 100
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -111,6 +193,9 @@ class Settings(BaseSettings):
     @property
     def database_url_async(self) -> str:
         """异步数据库连接URL"""
+        if self.db_name.endswith('.db'):
+            # SQLite数据库
+            return f"sqlite+aiosqlite:///./{self.db_name}"
         return f"mysql+aiomysql://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
 
 
@@ -1,7 +1,9 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
+from typing import AsyncGenerator
 
 from .config import settings
 
@@ -26,6 +28,29 @@ else:
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步数据库引擎 (SQLite 使用 aiosqlite，MySQL 使用 aiomysql)
+database_url_async = settings.database_url_async
+if database_url_async.startswith("sqlite"):
+    async_engine = create_async_engine(
+        database_url_async,
+        echo=settings.debug,
+    )
+else:
+    async_engine = create_async_engine(
+        database_url_async,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        echo=settings.debug,
+    )
+
+# 异步会话工厂：提交后不过期对象，避免在事件循环中触发隐式懒加载
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # 创建基类
 Base = declarative_base()
 
@@ -39,6 +64,12 @@ def get_db() -> Session:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """获取异步数据库会话的依赖注入函数（查询不阻塞事件循环）"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 @contextmanager
 def get_db_context():
     """上下文管理器版本的数据库会话"""
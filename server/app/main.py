@@ -3,9 +3,15 @@ from fastapi.middleware.cors import CORSMiddleware
 import logging
 
 from .core.config import settings
-from .core.database import create_tables
+from .core.database import async_engine, create_tables
 from .core.exceptions import global_exception_handler
 from .api.v1.api import api_router
+from .services.answer_buffer import start_answer_buffer, stop_answer_buffer
+from .services.attempt_sweeper import start_attempt_sweeper, stop_attempt_sweeper
+from .services.paper_reclaimer import start_paper_reclaimer, stop_paper_reclaimer
+from .services.mock_pool import start_mock_pool, stop_mock_pool
+from .services.cohort_diagnostics import stop_diagnostic_batches
+from .services.plan_refresh import start_plan_refresh, stop_plan_refresh
 
 # 配置日志
 logging.basicConfig(
@@ -56,11 +62,47 @@ async def startup_event():
     except Exception as e:
         logger.error(f"数据库表创建失败: {e}")
 
+    # 预热题库与知识点树索引：事件循环上并发的冷启动请求不能互相等待重建（见 index_rebuild），启动时先建好
+    try:
+        from .core.database import SessionLocal
+        from .services.knowledge_tree import get_knowledge_tree
+        from .services.question_index import get_question_index
+        db = SessionLocal()
+        try:
+            get_question_index(db)
+            get_knowledge_tree(db)
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"预热题库索引失败: {e}")
+
+    # 答题自动保存：回放遗留日志并启动后台落库
+    start_answer_buffer()
+
+    # 超时作答自动交卷
+    start_attempt_sweeper()
+
+    # 回收未使用的自动组卷考试与试卷
+    start_paper_reclaimer()
+
+    # 模拟试卷预热池
+    start_mock_pool()
+
+    # 学习计划夜间批量刷新
+    start_plan_refresh()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时的清理"""
     logger.info("关闭应用")
+    stop_plan_refresh()
+    stop_diagnostic_batches()
+    stop_mock_pool()
+    stop_paper_reclaimer()
+    stop_attempt_sweeper()
+    stop_answer_buffer()
+    await async_engine.dispose()
 
 
 @app.get("/health")
@@ -3,10 +3,10 @@ from .base import BaseModel
 from .user import User
 from .knowledge import KnowledgePoint, QuestionKnowledgeMap
 from .question import Question
-from .paper import Paper, PaperQuestion, Exam
+from .paper import Paper, PaperQuestion, Exam, PaperTemplate, DiagnosticBatch
 from .attempt import Attempt, Answer
 from .plan import Goal, LearningPlan, PlanItem
-from .progress import UserKnowledgeState, WrongQuestion
+from .progress import UserKnowledgeState, WrongQuestion, UserSeenQuestions
 
 # 导出所有模型类
 __all__ = [
@@ -18,6 +18,8 @@ __all__ = [
     "Paper",
     "PaperQuestion",
     "Exam",
+    "PaperTemplate",
+    "DiagnosticBatch",
     "Attempt",
     "Answer",
     "Goal",
@@ -25,4 +27,5 @@ __all__ = [
     "PlanItem",
     "UserKnowledgeState",
     "WrongQuestion",
+    "UserSeenQuestions",
 ]
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, DECIMAL, Enum, Boolean, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, DECIMAL, Enum, Boolean, JSON, Index, Text
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
+from sqlalchemy.orm import deferred, relationship
 
 from .base import BaseModel
 
@@ -7,6 +8,12 @@ from .base import BaseModel
 class Attempt(BaseModel):
     """作答记录模型"""
     __tablename__ = "attempts"
+    __table_args__ = (
+        # 超时自动交卷按 (status, started_at) 范围扫描进行中的作答
+        Index("ix_attempts_status_started_at", "status", "started_at"),
+        # 作答历史按 (submitted_at, id) 游标分页
+        Index("ix_attempts_user_status_submitted", "user_id", "status", "submitted_at"),
+    )
 
     exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -14,6 +21,8 @@ class Attempt(BaseModel):
     submitted_at = Column(DateTime, nullable=True)
     total_score = Column(DECIMAL(5, 1), nullable=True)
     status = Column(Enum("DOING", "SUBMITTED", name="attempt_status"), nullable=False, default="DOING")
+    # 交卷后首次查看结果时生成的结果 JSON（不可变，之后直接返回，不再读 answers 表）；延迟加载，避免列表查询带出大字段
+    result_snapshot = deferred(Column(Text().with_variant(MEDIUMTEXT(), "mysql"), nullable=True))
 
     # 关联关系
     exam = relationship("Exam", back_populates="attempts")
@@ -27,6 +36,10 @@ class Attempt(BaseModel):
 class Answer(BaseModel):
     """答案模型"""
     __tablename__ = "answers"
+    __table_args__ = (
+        # 自动保存批量 upsert 依赖的唯一键：每个 attempt 每题一条答案
+        Index("uq_answers_attempt_question", "attempt_id", "question_id", unique=True),
+    )
 
     attempt_id = Column(Integer, ForeignKey("attempts.id"), nullable=False)
     question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
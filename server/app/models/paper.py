@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, JSON, DECIMAL, Integer, Enum, ForeignKey, DateTime
+from sqlalchemy import Column, String, Text, JSON, DECIMAL, Integer, Enum, ForeignKey, DateTime, Boolean
 from sqlalchemy.orm import relationship
 
 from .base import BaseModel
@@ -13,6 +13,8 @@ class Paper(BaseModel):
     config_json = Column(JSON, nullable=True)  # 自动组卷配置
     total_score = Column(DECIMAL(5, 1), nullable=False, default=100.0)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # 自动组卷试卷的内容哈希（有序题目ID + 分值），相同内容的试卷共用一行
+    content_hash = Column(String(64), nullable=True, index=True)
 
     # 关联关系
     creator = relationship("User")
@@ -52,12 +54,57 @@ class Exam(BaseModel):
     start_time = Column(DateTime, nullable=True)
     end_time = Column(DateTime, nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # 指定学员的考试（如批量生成的个性化诊断），只对该学员可见；为空表示所有学员可见
+    assigned_user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
 
     # 关联关系
     paper = relationship("Paper", back_populates="exams")
-    creator = relationship("User")
+    creator = relationship("User", foreign_keys=[created_by])
     attempts = relationship("Attempt", back_populates="exam")
     plan_items = relationship("PlanItem", back_populates="exam")
 
     def __repr__(self):
         return f"<Exam(id={self.id}, title='{self.title}', category='{self.category}')>"
+
+
+class PaperTemplate(BaseModel):
+    """组卷模板模型（声明式约束，由组卷引擎求解）"""
+    __tablename__ = "paper_templates"
+
+    name = Column(String(100), nullable=False, unique=True)
+    category = Column(Enum("DIAGNOSTIC", "PRACTICE", "MOCK", name="exam_category"), nullable=False, default="MOCK")
+    spec_json = Column(JSON, nullable=False)  # 模块题量、难度分布、题型配比、总分、排除窗口
+    duration_minutes = Column(Integer, nullable=False, default=60)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # 关联关系
+    creator = relationship("User")
+
+    def __repr__(self):
+        return f"<PaperTemplate(id={self.id}, name='{self.name}', category='{self.category}')>"
+
+
+class DiagnosticBatch(BaseModel):
+    """批量个性化诊断任务：按学员ID顺序分块生成，cursor_user_id 之前的学员已完成（可断点续跑）"""
+    __tablename__ = "diagnostic_batches"
+
+    status = Column(
+        Enum("RUNNING", "PAUSED", "DONE", "FAILED", name="diagnostic_batch_status"),
+        nullable=False,
+        default="RUNNING"
+    )
+    params_json = Column(JSON, nullable=False)  # 学员范围与组卷参数
+    total = Column(Integer, nullable=False, default=0)  # 学员总数
+    processed = Column(Integer, nullable=False, default=0)  # 已处理学员数
+    generated = Column(Integer, nullable=False, default=0)  # 已生成考试数（题库不足的学员不生成）
+    cursor_user_id = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # 关联关系
+    creator = relationship("User")
+
+    def __repr__(self):
+        return f"<DiagnosticBatch(id={self.id}, status='{self.status}', processed={self.processed}/{self.total})>"
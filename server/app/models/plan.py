@@ -31,6 +31,8 @@ class LearningPlan(BaseModel):
     end_date = Column(Date, nullable=False)
     strategy_version = Column(String(50), nullable=False, default="v1.0")
     is_active = Column(Boolean, nullable=False, default=True)
+    # 计划内容版本：计划项状态/关联考试变化、增量重排、目标修改时递增，作为活跃计划响应缓存的键
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # 关联关系
     user = relationship("User", back_populates="learning_plans")
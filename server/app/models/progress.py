@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, ForeignKey, DECIMAL, DateTime, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, ForeignKey, DECIMAL, DateTime, Date, Index, LargeBinary
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
+from sqlalchemy.orm import deferred, relationship
 
 from .base import BaseModel
 
@@ -7,6 +8,10 @@ from .base import BaseModel
 class UserKnowledgeState(BaseModel):
     """用户知识点掌握状态模型"""
     __tablename__ = "user_knowledge_state"
+    __table_args__ = (
+        # 批量 upsert 掌握度依赖的唯一键
+        Index("uq_user_knowledge_state_user_knowledge", "user_id", "knowledge_id", unique=True),
+    )
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     knowledge_id = Column(Integer, ForeignKey("knowledge_points.id"), nullable=False)
@@ -24,6 +29,10 @@ class UserKnowledgeState(BaseModel):
 class WrongQuestion(BaseModel):
     """错题本模型"""
     __tablename__ = "wrong_questions"
+    __table_args__ = (
+        # 批量 upsert 错题本依赖的唯一键
+        Index("uq_wrong_questions_user_question", "user_id", "question_id", unique=True),
+    )
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
@@ -37,3 +46,15 @@ class WrongQuestion(BaseModel):
 
     def __repr__(self):
         return f"<WrongQuestion(user_id={self.user_id}, question_id={self.question_id}, wrong_count={self.wrong_count})>"
+
+
+class UserSeenQuestions(BaseModel):
+    """用户已作答题目集合（分块位图，编码见 services/seen_questions.py），每个用户一行"""
+    __tablename__ = "user_seen_questions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    seen_count = Column(Integer, nullable=False, default=0)
+    bitmap = deferred(Column(LargeBinary().with_variant(MEDIUMBLOB(), "mysql"), nullable=False))
+
+    def __repr__(self):
+        return f"<UserSeenQuestions(user_id={self.user_id}, seen_count={self.seen_count})>"
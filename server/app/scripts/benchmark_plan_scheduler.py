@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+学习计划排程基准
+
+用合成数据（不访问数据库）比较 greedy 与 knapsack 两种排程的耗时与每日任务总优先级：
+知识点数、计划天数、每日时长、每天到期错题数均可调，默认接近一个学员一年的计划
+
+运行方式: python benchmark_plan_scheduler.py [--days 365] [--kps 120] [--daily-minutes 120] [--reviews-per-day 3] [--runs 20]
+"""
+import sys
+import os
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+# 添加app目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.services.plan_scheduler import DueReview, schedule_greedy, schedule_knapsack
+
+
+def build_inputs(rng: random.Random, kps: int, days: int, reviews_per_day: int, start_date: date):
+    """合成知识点（按优先级降序）与每日到期错题"""
+    knowledge = []
+    for kp_id in range(1, kps + 1):
+        mastery = rng.choice([0.0, 0.0, rng.random()])
+        weight = rng.choice([0.5, 1.0, 1.0, 1.5, 2.0])
+        knowledge.append({
+            "id": kp_id,
+            "name": f"知识点{kp_id}",
+            "priority": (1 - mastery) * weight,
+            "mastery": mastery,
+            "weight": weight,
+            "estimated_minutes": rng.choice([20, 30, 30, 45, 60, 90])
+        })
+    knowledge.sort(key=lambda x: x["priority"], reverse=True)
+
+    reviews_by_date = {}
+    for day in range(days):
+        count = rng.randint(0, 2 * reviews_per_day)
+        reviews_by_date[start_date + timedelta(days=day)] = [
+            DueReview(
+                knowledge_id=rng.randint(1, kps),
+                title=f"复习错题：题目{day}-{i}...",
+                reason_json={"type": "review", "wrong_count": 1}
+            )
+            for i in range(count)
+        ]
+    practiced_ids = [kp["id"] for kp in knowledge if kp["mastery"] > 0]
+    return knowledge, reviews_by_date, practiced_ids
+
+
+def total_value(items, knowledge):
+    """计划项按 LEARN 优先级 + 每道复习 1 分计的总价值（仅用于两种排程的粗略对比）"""
+    priority = {kp["id"]: kp["priority"] for kp in knowledge}
+    return sum(priority[item["knowledge_id"]] if item["type"] == "LEARN" else 1.0 for item in items)
+
+
+def measure(fn, runs: int):
+    timings = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return result, statistics.mean(timings), p95
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="学习计划排程基准")
+    parser.add_argument("--days", type=int, default=365, help="计划天数")
+    parser.add_argument("--kps", type=int, default=120, help="知识点数")
+    parser.add_argument("--daily-minutes", type=int, default=120, help="每日学习时长")
+    parser.add_argument("--reviews-per-day", type=int, default=3, help="平均每天到期错题数")
+    parser.add_argument("--runs", type=int, default=20, help="重复次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    start_date = date.today()
+    knowledge, reviews_by_date, practiced_ids = build_inputs(
+        random.Random(args.seed), args.kps, args.days, args.reviews_per_day, start_date
+    )
+
+    print(f"知识点 {args.kps} 个，{args.days} 天，每日 {args.daily_minutes} 分钟，"
+          f"到期错题 {sum(len(v) for v in reviews_by_date.values())} 道，重复 {args.runs} 次")
+    for name, fn in (
+        ("greedy", lambda: schedule_greedy(knowledge, reviews_by_date, start_date, args.days, args.daily_minutes)),
+        ("knapsack", lambda: schedule_knapsack(
+            knowledge, reviews_by_date, start_date, args.days, args.daily_minutes, practiced_ids
+        )),
+    ):
+        items, mean_ms, p95_ms = measure(fn, args.runs)
+        counts = {}
+        for item in items:
+            counts[item["type"]] = counts.get(item["type"], 0) + 1
+        print(f"{name:>8}: 平均 {mean_ms:.1f}ms，p95 {p95_ms:.1f}ms，计划项 {len(items)} 条 {counts}，"
+              f"学习+复习价值 {total_value(items, knowledge):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+学习计划批量刷新脚本
+
+按最新掌握度为所有有活跃计划的学员重新生成计划，适合由 cron 在夜间调用
+（服务进程内也可通过 PLAN_REFRESH_ENABLED 开启定时刷新）
+
+运行方式: python refresh_plans.py [--chunk-size 2000]
+"""
+import sys
+import os
+import argparse
+
+# 添加app目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.core.database import SessionLocal
+from app.services.plan_refresh import refresh_active_plans
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="批量刷新学习计划")
+    parser.add_argument("--chunk-size", type=int, default=None, help="每块学员数（默认读取配置）")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = refresh_active_plans(db, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(f"刷新完成：学员 {result['users']} 人，计划项 {result['items']} 条，耗时 {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
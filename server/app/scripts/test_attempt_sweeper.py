@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+超时自动交卷冒烟脚本
+
+验证后台收卷线程会把超过考试时长（加宽限时间）仍在作答的试卷自动交卷，判分与主动交卷一致：
+1. student01 登录，生成 10 题个性化模拟考试（限时 60 分钟）并开始考试，保存 3 题答案
+2. 直接在数据库中把该作答的开始时间往前拨到考试时长 + 宽限时间之前
+3. 等待收卷线程自动交卷：作答状态变为 SUBMITTED，结果页包含已保存的 3 题且有总分
+
+脚本与服务需连接同一个数据库（同一份 .env / 环境变量），运行方式（WSL Ubuntu / Git Bash）：
+    cd server && ATTEMPT_SWEEPER_ENABLED=true ATTEMPT_SWEEP_INTERVAL_SECONDS=2 uvicorn app.main:app --port 8000
+    python app/scripts/test_attempt_sweeper.py
+"""
+import sys
+import os
+import time
+from datetime import timedelta
+
+import requests
+
+# 添加app目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.attempt import Attempt
+
+BASE_URL = "http://localhost:8000/api/v1"
+SAVED_QUESTIONS = 3
+# 等待自动交卷的最长时间（秒）：需大于服务端 ATTEMPT_SWEEP_INTERVAL_SECONDS
+WAIT_SECONDS = 60
+
+
+def backdate_attempt(attempt_id, minutes):
+    """把作答开始时间往前拨到超时（考试时长 + 宽限时间 + 1 分钟之前）"""
+    db = SessionLocal()
+    try:
+        attempt = db.get(Attempt, attempt_id)
+        attempt.started_at -= timedelta(minutes=minutes + 1, seconds=settings.attempt_sweep_grace_seconds)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    print("🚀 开始超时自动交卷冒烟测试...")
+
+    resp = requests.post(f"{BASE_URL}/auth/login", json={"username": "student01", "password": "123456"})
+    if resp.status_code != 200:
+        print(f"❌ 登录失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    print("✅ 登录成功")
+
+    resp = requests.post(f"{BASE_URL}/exams/mock/generate", json={"count": 10, "duration_minutes": 60}, headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 生成模拟考试失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    exam_id = resp.json()["exam_id"]
+
+    resp = requests.post(f"{BASE_URL}/exams/{exam_id}/start", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 开始考试失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    started = resp.json()
+    attempt_id = started["attempt_id"]
+    duration = started["exam"]["duration_minutes"]
+    if not duration:
+        print("❌ 模拟考试不限时，无法验证自动交卷")
+        return False
+    print(f"✅ 开始考试: 考试ID {exam_id}，作答ID {attempt_id}，限时 {duration} 分钟")
+
+    saved = []
+    for item in started["questions"][:SAVED_QUESTIONS]:
+        question_id = item["question"]["id"]
+        payload = {"question_id": question_id, "answer": "A", "time_spent_seconds": 5}
+        resp = requests.post(f"{BASE_URL}/attempts/{attempt_id}/answer", json=payload, headers=headers)
+        if resp.status_code != 200:
+            print(f"❌ 保存答案失败: HTTP {resp.status_code} {resp.text}")
+            return False
+        saved.append(question_id)
+    print(f"✅ 已保存 {len(saved)} 题答案")
+
+    backdate_attempt(attempt_id, duration)
+    print(f"✅ 已将作答开始时间前移 {duration} 分钟 + 宽限时间，等待自动交卷...")
+
+    deadline = time.monotonic() + WAIT_SECONDS
+    status = None
+    while time.monotonic() < deadline:
+        resp = requests.get(f"{BASE_URL}/attempts/{attempt_id}", headers=headers)
+        if resp.status_code != 200:
+            print(f"❌ 获取作答详情失败: HTTP {resp.status_code} {resp.text}")
+            return False
+        status = resp.json()["status"]
+        if status == "SUBMITTED":
+            break
+        time.sleep(1)
+    if status != "SUBMITTED":
+        print(f"❌ {WAIT_SECONDS}s 内未自动交卷（状态 {status}），请确认服务以 ATTEMPT_SWEEPER_ENABLED=true 启动")
+        return False
+    print("✅ 作答已自动交卷")
+
+    resp = requests.get(f"{BASE_URL}/attempts/{attempt_id}/result", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 获取考试结果失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    result = resp.json()
+    graded = {r["question_id"] for r in result["results"] if r["is_correct"] is not None}
+    missing = [qid for qid in saved if qid not in graded]
+    if missing or result["total_score"] is None:
+        print(f"❌ 自动交卷未判分: 缺少 {missing}，总分 {result['total_score']}")
+        return False
+    print(f"✅ 自动交卷判分完成: 已判 {len(graded)} 题，总分 {result['total_score']}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
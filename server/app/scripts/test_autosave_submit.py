@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+答题自动保存 + 交卷冒烟脚本
+
+验证自动保存模式下刚保存、尚未落库的答案在交卷时全部参与判分：
+1. student01 登录，选一个客观题最多的知识点生成 5 题专项练习并开始考试
+2. 每题先保存一个错误答案，再改成正确答案（同一题以最后一次保存为准）
+3. 立即查看作答详情：已保存答案应全部可见（来自自动保存缓冲）
+4. 在后台落库间隔内立即交卷：每题都有作答记录，客观题全部判对，结果页一致
+
+运行方式（WSL Ubuntu / Git Bash）：
+    cd server && AUTOSAVE_ENABLED=true uvicorn app.main:app --port 8000
+    python app/scripts/test_autosave_submit.py
+服务未开启 AUTOSAVE_ENABLED 时同样可运行，此时答案直接写库
+"""
+import sys
+import requests
+
+BASE_URL = "http://localhost:8000/api/v1"
+OBJECTIVE_TYPES = ("SINGLE", "MULTI", "JUDGE")
+
+
+def load_question_bank():
+    """分页拉取题库（含标准答案与原始选项顺序）"""
+    questions = {}
+    page = 1
+    while True:
+        resp = requests.get(f"{BASE_URL}/questions/", params={"page": page, "size": 100})
+        resp.raise_for_status()
+        data = resp.json()
+        for item in data["items"]:
+            questions[item["id"]] = item
+        if page >= data["pages"]:
+            return questions
+        page += 1
+
+
+def display_answer(original, shown):
+    """把标准答案换成当前展示顺序下的字母（种子试卷可能打乱选项）"""
+    if original["type"] not in ("SINGLE", "MULTI"):
+        return original["answer_json"]
+    letters = []
+    for letter in original["answer_json"]:
+        option = original["options_json"][ord(letter.strip().upper()) - 65]
+        letters.append(chr(65 + shown["options_json"].index(option)))
+    return letters if original["type"] == "MULTI" else letters[0]
+
+
+def wrong_answer(original, correct):
+    """构造一个错误答案（用于验证覆盖保存）"""
+    if original["type"] == "JUDGE":
+        return "F" if str(correct).strip().upper() in ("T", "TRUE", "正确") else "T"
+    if original["type"] in ("SINGLE", "MULTI"):
+        picked = set(correct if isinstance(correct, list) else [correct])
+        for k in range(len(original["options_json"] or [])):
+            if chr(65 + k) not in picked:
+                return chr(65 + k)
+    return "__wrong__"
+
+
+def main():
+    print("🚀 开始答题自动保存交卷冒烟测试...")
+
+    resp = requests.post(f"{BASE_URL}/auth/login", json={"username": "student01", "password": "123456"})
+    if resp.status_code != 200:
+        print(f"❌ 登录失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    print("✅ 登录成功")
+
+    bank = load_question_bank()
+    objective_by_kp = {}
+    for question in bank.values():
+        if question["type"] in OBJECTIVE_TYPES:
+            for kp in question["knowledge_points"]:
+                objective_by_kp[kp["id"]] = objective_by_kp.get(kp["id"], 0) + 1
+    if not objective_by_kp:
+        print("❌ 题库中没有客观题")
+        return False
+    knowledge_id = max(objective_by_kp, key=objective_by_kp.get)
+
+    resp = requests.post(f"{BASE_URL}/practice/generate", json={"knowledge_id": knowledge_id, "count": 5, "mode": "FIXED"}, headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 生成练习失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    exam_id = resp.json()["exam_id"]
+
+    resp = requests.post(f"{BASE_URL}/exams/{exam_id}/start", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 开始考试失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    started = resp.json()
+    attempt_id = started["attempt_id"]
+    print(f"✅ 开始考试: 考试ID {exam_id}，作答ID {attempt_id}")
+
+    expected = {}
+    objective_ids = []
+    for item in started["questions"]:
+        shown = item["question"]
+        original = bank[shown["id"]]
+        correct = display_answer(original, shown)
+        expected[shown["id"]] = correct
+        if original["type"] in OBJECTIVE_TYPES:
+            objective_ids.append(shown["id"])
+        for answer in (wrong_answer(original, correct), correct):
+            payload = {"question_id": shown["id"], "answer": answer, "time_spent_seconds": 5}
+            resp = requests.post(f"{BASE_URL}/attempts/{attempt_id}/answer", json=payload, headers=headers)
+            if resp.status_code != 200:
+                print(f"❌ 保存答案失败: HTTP {resp.status_code} {resp.text}")
+                return False
+    print(f"✅ 已保存 {len(expected)} 题（每题先错后对）")
+
+    resp = requests.get(f"{BASE_URL}/attempts/{attempt_id}", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 获取作答详情失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    restored = sum(1 for q in resp.json()["questions"] if q.get("saved_answer") is not None)
+    if restored != len(expected):
+        print(f"❌ 作答详情中已保存答案 {restored}/{len(expected)}")
+        return False
+    print(f"✅ 作答详情恢复已保存答案 {restored}/{len(expected)}")
+
+    resp = requests.post(f"{BASE_URL}/attempts/{attempt_id}/submit", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 交卷失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    result = resp.json()
+    graded = {r["question_id"]: r for r in result["results"]}
+    missing = [qid for qid in expected if qid not in graded]
+    if missing:
+        print(f"❌ 交卷时缺少作答记录: {missing}")
+        return False
+    wrong = [qid for qid in objective_ids if not graded[qid]["is_correct"]]
+    if wrong:
+        print(f"❌ 客观题判错（未以最后一次保存为准？）: {wrong}")
+        return False
+    print(f"✅ 交卷判分: {result['correct_count']}/{result['total_questions']}，总分 {result['total_score']}")
+
+    resp = requests.get(f"{BASE_URL}/attempts/{attempt_id}/result", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 获取考试结果失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    if resp.json()["total_score"] != result["total_score"]:
+        print(f"❌ 结果页总分 {resp.json()['total_score']} 与交卷总分 {result['total_score']} 不一致")
+        return False
+    print("✅ 结果页与交卷结果一致")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+活跃学习计划缓存失效冒烟脚本
+
+GET /plans/active 按 (plan_id, 计划版本) 缓存序列化后的响应，验证各写路径之后读到的都是最新计划：
+1. student01 登录，确保有学习目标，生成 14 天学习计划，连续两次读取活跃计划结果一致
+2. PATCH 一个 TODO 学习任务为 DONE：再次读取时该任务为 DONE 且有完成时间
+3. 开始一个练习任务：再次读取时该任务已关联考试
+4. 作答并交卷：再次读取时该任务被自动完成（DONE）
+
+种子数据中练习任务的知识点可能没有题目，此时脚本直接在数据库中把一个练习任务改到题目最多的知识点上，
+因此脚本与服务需连接同一个数据库（同一份 .env / 环境变量），运行方式（WSL Ubuntu / Git Bash）：
+    cd server && uvicorn app.main:app --port 8000
+    python app/scripts/test_plan_cache.py
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+import requests
+
+# 添加app目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.core.database import SessionLocal
+from app.models.plan import PlanItem
+
+BASE_URL = "http://localhost:8000/api/v1"
+
+
+def get_active_items(headers):
+    """读取活跃计划，返回 (原始响应体, {计划项ID: 计划项})"""
+    resp = requests.get(f"{BASE_URL}/plans/active", headers=headers)
+    resp.raise_for_status()
+    plan = resp.json()
+    items = {item["id"]: item for items in (plan or {}).get("items_by_date", {}).values() for item in items}
+    return resp.content, items
+
+
+def busiest_knowledge_point():
+    """题目最多的知识点ID"""
+    counts = {}
+    page = 1
+    while True:
+        resp = requests.get(f"{BASE_URL}/questions/", params={"page": page, "size": 100})
+        resp.raise_for_status()
+        data = resp.json()
+        for question in data["items"]:
+            for kp in question["knowledge_points"]:
+                counts[kp["id"]] = counts.get(kp["id"], 0) + 1
+        if page >= data["pages"]:
+            break
+        page += 1
+    return max(counts, key=counts.get) if counts else None
+
+
+def retarget_item(item_id, knowledge_id):
+    """把练习任务改到有题目的知识点上（直接写库，不经过接口，因此不会递增计划版本）"""
+    db = SessionLocal()
+    try:
+        db.get(PlanItem, item_id).knowledge_id = knowledge_id
+        db.commit()
+    finally:
+        db.close()
+
+
+def start_practice_item(items, headers):
+    """依次尝试开始 TODO 的练习/复习任务，返回 (计划项ID, attempt_id)；都无法开始时返回 (None, None)"""
+    for item in items.values():
+        if item["status"] != "TODO" or item["type"] not in ("PRACTICE", "REVIEW"):
+            continue
+        resp = requests.post(f"{BASE_URL}/plans/items/{item['id']}/start", headers=headers)
+        if resp.status_code == 200 and resp.json()["action"] == "EXAM":
+            return item["id"], resp.json()["attempt_id"]
+    return None, None
+
+
+def main():
+    print("🚀 开始活跃学习计划缓存失效冒烟测试...")
+
+    resp = requests.post(f"{BASE_URL}/auth/login", json={"username": "student01", "password": "123456"})
+    if resp.status_code != 200:
+        print(f"❌ 登录失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    print("✅ 登录成功")
+
+    goal_resp = requests.get(f"{BASE_URL}/goals/me", headers=headers)
+    if goal_resp.status_code == 404 or not goal_resp.json():
+        exam_date = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+        resp = requests.post(f"{BASE_URL}/goals/", json={"exam_date": exam_date, "daily_minutes": 120}, headers=headers)
+        if resp.status_code != 200:
+            print(f"❌ 创建学习目标失败: HTTP {resp.status_code} {resp.text}")
+            return False
+
+    resp = requests.post(f"{BASE_URL}/plans/generate", json={"days": 14}, headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 生成学习计划失败: HTTP {resp.status_code} {resp.text}")
+        return False
+
+    first_body, items = get_active_items(headers)
+    second_body, _ = get_active_items(headers)
+    if not items or first_body != second_body:
+        print("❌ 活跃计划为空或两次读取不一致")
+        return False
+    print(f"✅ 生成学习计划并两次读取一致（{len(items)} 个计划项）")
+
+    # PATCH 计划项状态
+    learn = next((item for item in items.values() if item["type"] == "LEARN" and item["status"] == "TODO"), None)
+    if learn is None:
+        print("❌ 计划中没有 TODO 的学习任务")
+        return False
+    resp = requests.patch(f"{BASE_URL}/plans/items/{learn['id']}", json={"status": "DONE"}, headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 更新计划项失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    _, items = get_active_items(headers)
+    if items[learn["id"]]["status"] != "DONE" or not items[learn["id"]]["completed_at"]:
+        print(f"❌ PATCH 后读到旧计划: 计划项 {learn['id']} 状态 {items[learn['id']]['status']}")
+        return False
+    print(f"✅ PATCH 后读到最新状态: 计划项 {learn['id']} 为 DONE")
+
+    # 开始练习任务
+    item_id, attempt_id = start_practice_item(items, headers)
+    if item_id is None:
+        practice = next((item for item in items.values() if item["type"] == "PRACTICE" and item["status"] == "TODO"), None)
+        knowledge_id = busiest_knowledge_point()
+        if practice is None or knowledge_id is None:
+            print("❌ 计划中没有可开始的练习任务")
+            return False
+        print(f"   ⚠️ 计划中的练习任务都没有题目，把计划项 {practice['id']} 改到知识点 {knowledge_id}")
+        retarget_item(practice["id"], knowledge_id)
+        item_id, attempt_id = start_practice_item({practice["id"]: practice}, headers)
+        if item_id is None:
+            print("❌ 开始练习任务失败")
+            return False
+    _, items = get_active_items(headers)
+    if not items[item_id]["exam_id"]:
+        print(f"❌ 开始任务后读到旧计划: 计划项 {item_id} 未关联考试")
+        return False
+    print(f"✅ 开始任务后读到最新计划: 计划项 {item_id} 关联考试 {items[item_id]['exam_id']}")
+
+    # 交卷自动完成计划任务
+    resp = requests.get(f"{BASE_URL}/attempts/{attempt_id}", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 获取作答详情失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    for question in resp.json()["questions"]:
+        payload = {"question_id": question["id"], "answer": "A", "time_spent_seconds": 5}
+        resp = requests.post(f"{BASE_URL}/attempts/{attempt_id}/answer", json=payload, headers=headers)
+        if resp.status_code != 200:
+            print(f"❌ 保存答案失败: HTTP {resp.status_code} {resp.text}")
+            return False
+    resp = requests.post(f"{BASE_URL}/attempts/{attempt_id}/submit", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 交卷失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    _, items = get_active_items(headers)
+    if items[item_id]["status"] != "DONE":
+        print(f"❌ 交卷后读到旧计划: 计划项 {item_id} 状态 {items[item_id]['status']}")
+        return False
+    print(f"✅ 交卷后读到最新计划: 计划项 {item_id} 已自动完成")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+种子试卷打乱判分冒烟脚本
+
+验证按学生打乱题目/选项顺序的种子试卷能正确判分：
+1. student01 登录，选一个客观题最多的知识点生成 5 题专项练习
+2. 开始考试，按前端的方式（按展示位置标注 A/B/C...）选出每题的正确选项并保存
+3. 交卷，客观题应全部判对
+
+运行方式（WSL Ubuntu / Git Bash）：
+    cd server && SEEDED_PAPERS_ENABLED=true uvicorn app.main:app --port 8000
+    python app/scripts/test_seeded_paper_grading.py
+服务未开启 SEEDED_PAPERS_ENABLED 时同样可运行，只是试卷不打乱
+"""
+import sys
+import requests
+
+BASE_URL = "http://localhost:8000/api/v1"
+OBJECTIVE_TYPES = ("SINGLE", "MULTI", "JUDGE")
+
+
+def load_question_bank():
+    """分页拉取题库（含标准答案与原始选项顺序）"""
+    questions = {}
+    page = 1
+    while True:
+        resp = requests.get(f"{BASE_URL}/questions/", params={"page": page, "size": 100})
+        resp.raise_for_status()
+        data = resp.json()
+        for item in data["items"]:
+            questions[item["id"]] = item
+        if page >= data["pages"]:
+            return questions
+        page += 1
+
+
+def display_answer(original, shown):
+    """把标准答案（原选项字母）换成当前展示顺序下的字母，模拟学生在页面上选中正确选项"""
+    if original["type"] not in ("SINGLE", "MULTI"):
+        return original["answer_json"]
+    letters = []
+    for letter in original["answer_json"]:
+        option = original["options_json"][ord(letter.strip().upper()) - 65]
+        letters.append(chr(65 + shown["options_json"].index(option)))
+    return letters if original["type"] == "MULTI" else letters[0]
+
+
+def main():
+    print("🚀 开始种子试卷打乱判分冒烟测试...")
+
+    resp = requests.post(f"{BASE_URL}/auth/login", json={"username": "student01", "password": "123456"})
+    if resp.status_code != 200:
+        print(f"❌ 登录失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+    print("✅ 登录成功")
+
+    bank = load_question_bank()
+    objective_by_kp = {}
+    for question in bank.values():
+        if question["type"] in OBJECTIVE_TYPES:
+            for kp in question["knowledge_points"]:
+                objective_by_kp[kp["id"]] = objective_by_kp.get(kp["id"], 0) + 1
+    if not objective_by_kp:
+        print("❌ 题库中没有客观题")
+        return False
+    knowledge_id = max(objective_by_kp, key=objective_by_kp.get)
+
+    resp = requests.post(f"{BASE_URL}/practice/generate", json={"knowledge_id": knowledge_id, "count": 5, "mode": "FIXED"}, headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 生成练习失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    exam_id = resp.json()["exam_id"]
+    print(f"✅ 生成专项练习: 知识点 {knowledge_id}，考试ID {exam_id}")
+
+    resp = requests.post(f"{BASE_URL}/exams/{exam_id}/start", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 开始考试失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    started = resp.json()
+    attempt_id = started["attempt_id"]
+
+    shuffled = 0
+    objective_ids = []
+    for item in started["questions"]:
+        shown = item["question"]
+        original = bank[shown["id"]]
+        if shown.get("options_json") != original.get("options_json"):
+            shuffled += 1
+        if original["type"] in OBJECTIVE_TYPES:
+            objective_ids.append(shown["id"])
+        payload = {"question_id": shown["id"], "answer": display_answer(original, shown), "time_spent_seconds": 5}
+        resp = requests.post(f"{BASE_URL}/attempts/{attempt_id}/answer", json=payload, headers=headers)
+        if resp.status_code != 200:
+            print(f"❌ 保存答案失败: HTTP {resp.status_code} {resp.text}")
+            return False
+    print(f"✅ 已按展示顺序作答 {len(started['questions'])} 题，其中 {shuffled} 题选项被打乱")
+    if shuffled == 0:
+        print("   ⚠️ 未观察到选项打乱，请确认服务以 SEEDED_PAPERS_ENABLED=true 启动")
+
+    resp = requests.post(f"{BASE_URL}/attempts/{attempt_id}/submit", headers=headers)
+    if resp.status_code != 200:
+        print(f"❌ 交卷失败: HTTP {resp.status_code} {resp.text}")
+        return False
+    result = resp.json()
+    wrong = [r["question_id"] for r in result["results"] if r["question_id"] in objective_ids and not r["is_correct"]]
+    if wrong:
+        print(f"❌ 客观题判错: {wrong}（总分 {result['total_score']}）")
+        return False
+    print(f"✅ 客观题全部判对: {result['correct_count']}/{result['total_questions']}，总分 {result['total_score']}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,496 @@
+"""
+答题自动保存写缓冲（write-behind）
+单题作答先追加到本地日志文件（崩溃可恢复）并在内存中按 (attempt_id, question_id) 合并，
+只保留最后一次作答；后台线程定期把缓冲批量写入 answers 表（一个事务一条 upsert 语句）
+
+- 交卷前调用 flush_attempt() 强制落库该 attempt 的缓冲，保证判分读到最新答案；
+  后台正在落库的批次包含该 attempt 时先等待其提交，避免判分读到旧答案、随后整批因 attempt 已交卷被丢弃
+- 每个进程一个日志文件 answers-<pid>.jsonl；启动时回放已退出进程遗留的日志
+- 落库时只写仍处于 DOING 状态的 attempt，避免崩溃回放覆盖已交卷的答案
+
+只支持单进程部署：缓冲只在本进程可见，交卷或超时交卷落在其他进程时会读不到缓冲中的答案，
+随后这些答案因 attempt 已交卷被丢弃。因此 web_concurrency > 1，或同一日志目录已被另一个进程
+加锁（autosave.lock）时，start_answer_buffer 直接报错，不以部分进程开启自动保存的状态运行
+"""
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只依赖 web_concurrency 检查
+    fcntl = None
+
+from ..core.config import settings
+from ..models.attempt import Attempt, Answer
+from .progress_writer import _dialect_name
+
+logger = logging.getLogger(__name__)
+
+AnswerKey = Tuple[int, int]
+
+
+def upsert_answers(db: Session, entries: List[Dict[str, Any]]) -> int:
+    """
+    批量写入答案（依赖 answers (attempt_id, question_id) 唯一键）
+
+    Args:
+        entries: [{"attempt_id", "question_id", "answer_json", "time_spent_seconds"}]
+
+    Returns:
+        int: 实际写入的答案数（非 DOING 状态的 attempt 会被丢弃）
+    """
+    if not entries:
+        return 0
+
+    # 只写入仍在作答中的 attempt
+    attempt_ids = {e["attempt_id"] for e in entries}
+    doing_stmt = select(Attempt.id).where(Attempt.id.in_(attempt_ids), Attempt.status == "DOING")
+    doing = set(db.execute(doing_stmt).scalars().all())
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "attempt_id": e["attempt_id"],
+            "question_id": e["question_id"],
+            "answer_json": e["answer_json"],
+            "time_spent_seconds": e.get("time_spent_seconds", 0),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for e in entries if e["attempt_id"] in doing
+    ]
+    if not rows:
+        return 0
+
+    table = Answer.__table__
+    dialect = _dialect_name(db)
+    if dialect == "sqlite":
+        stmt = sqlite_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.attempt_id, table.c.question_id],
+            set_={
+                "answer_json": stmt.excluded.answer_json,
+                "time_spent_seconds": stmt.excluded.time_spent_seconds,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt)
+    elif dialect == "mysql":
+        stmt = mysql_insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            answer_json=stmt.inserted.answer_json,
+            time_spent_seconds=stmt.inserted.time_spent_seconds,
+            updated_at=stmt.inserted.updated_at,
+        )
+        db.execute(stmt)
+    else:
+        existing_stmt = select(Answer).where(Answer.attempt_id.in_({r["attempt_id"] for r in rows}))
+        existing = {(a.attempt_id, a.question_id): a for a in db.execute(existing_stmt).scalars().all()}
+        for r in rows:
+            answer = existing.get((r["attempt_id"], r["question_id"]))
+            if answer:
+                answer.answer_json = r["answer_json"]
+                answer.time_spent_seconds = r["time_spent_seconds"]
+            else:
+                db.add(Answer(
+                    attempt_id=r["attempt_id"],
+                    question_id=r["question_id"],
+                    answer_json=r["answer_json"],
+                    time_spent_seconds=r["time_spent_seconds"]
+                ))
+        db.flush()
+    return len(rows)
+
+
+class AnswerBuffer:
+    """进程内答题写缓冲（线程安全）"""
+
+    def __init__(self, journal_dir: str, fsync: bool = True):
+        self.journal_dir = journal_dir
+        self.fsync = fsync
+        self._pending: Dict[AnswerKey, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._journal = None
+        self._journal_path = os.path.join(journal_dir, f"answers-{os.getpid()}.jsonl")
+        self._segment = 0
+        # 落库失败的分段：其中的答案已放回缓冲，下次落库成功后一并删除
+        self._failed_segments: List[str] = []
+        # 进行中的 attempt -> (user_id, 过期时间)，单题保存时免查 attempts 表（LRU + TTL）
+        self._open_attempts: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+        # 正在落库（已移出 _pending、尚未提交）的批次；提交或放回缓冲后通知 flush_attempt
+        self._inflight: Dict[AnswerKey, Dict[str, Any]] = {}
+        self._inflight_done = threading.Condition(self._lock)
+        # 串行化 flush()：后台线程与超时交卷线程各自调用，后者需要等前者的批次提交后再判分
+        # （只在非事件循环线程持有，flush_attempt 不取这把锁）
+        self._flush_lock = threading.Lock()
+
+    # ---------- 日志 ----------
+
+    def _open_journal(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    def _append_journal(self, entry: Dict[str, Any]) -> Optional[int]:
+        """追加一行日志；需要 fsync 时返回复制的文件描述符，由调用方在锁外 fsync 并关闭"""
+        if self._journal is None:
+            self._open_journal()
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            # 复制的描述符在日志轮转关闭原文件后仍指向同一文件
+            return os.dup(self._journal.fileno())
+        return None
+
+    def _rotate_journal(self) -> Optional[str]:
+        """把当前日志改名为待落库分段，之后的写入进入新日志；返回分段路径"""
+        if self._journal is None:
+            return None
+        self._journal.close()
+        self._journal = None
+        self._segment += 1
+        segment_path = f"{self._journal_path}.{self._segment}.flushing"
+        os.replace(self._journal_path, segment_path)
+        return segment_path
+
+    # ---------- 进行中的 attempt ----------
+
+    def attempt_owner(self, attempt_id: int) -> Optional[int]:
+        """近期确认处于 DOING 的 attempt 的所属用户（未知或已过期返回 None，由调用方查库确认）"""
+        with self._lock:
+            cached = self._open_attempts.get(attempt_id)
+            if cached is None:
+                return None
+            if cached[1] <= time.monotonic():
+                del self._open_attempts[attempt_id]
+                return None
+            self._open_attempts.move_to_end(attempt_id)
+            return cached[0]
+
+    def mark_open(self, attempt_id: int, user_id: int):
+        with self._lock:
+            self._open_attempts[attempt_id] = (user_id, time.monotonic() + settings.autosave_open_attempt_ttl_seconds)
+            self._open_attempts.move_to_end(attempt_id)
+            while len(self._open_attempts) > settings.autosave_open_attempt_cache_size:
+                self._open_attempts.popitem(last=False)
+
+    def mark_closed(self, attempt_id: int):
+        with self._lock:
+            self._open_attempts.pop(attempt_id, None)
+
+    # ---------- 写入与读取 ----------
+
+    def append(self, attempt_id: int, question_id: int, answer_json: Any, time_spent_seconds: int = 0):
+        """记录一次作答：先写日志再更新内存，返回即表示已持久化到本地"""
+        entry = {
+            "attempt_id": attempt_id,
+            "question_id": question_id,
+            "answer_json": answer_json,
+            "time_spent_seconds": time_spent_seconds,
+        }
+        with self._lock:
+            fd = self._append_journal(entry)
+            # 同一题多次作答只保留最后一次
+            self._pending[(attempt_id, question_id)] = entry
+        if fd is not None:
+            # fsync 在锁外进行，不阻塞其他请求的写入与落库
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def pending_for_attempt(self, attempt_id: int) -> Dict[int, Dict[str, Any]]:
+        """尚未落库的答案 {question_id: entry}（用于答题页恢复）"""
+        with self._lock:
+            return {qid: e for (aid, qid), e in self._pending.items() if aid == attempt_id}
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    # ---------- 落库 ----------
+
+    def flush(self, db: Session) -> int:
+        """把全部缓冲批量写入数据库（一个事务）；并发调用时依次执行"""
+        with self._flush_lock:
+            return self._flush(db)
+
+    def _flush(self, db: Session) -> int:
+        with self._lock:
+            if not self._pending:
+                # 缓冲已全部由交卷落库，日志中的记录均已持久化，直接截断
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                    os.remove(self._journal_path)
+                return 0
+            batch = self._pending
+            self._pending = {}
+            self._inflight = batch
+            segment_path = self._rotate_journal()
+
+        try:
+            written = upsert_answers(db, list(batch.values()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            # 落库失败：放回缓冲（不覆盖期间的新作答），分段日志保留供重试/回放
+            with self._lock:
+                for key, entry in batch.items():
+                    self._pending.setdefault(key, entry)
+                if segment_path:
+                    self._failed_segments.append(segment_path)
+                self._inflight = {}
+                self._inflight_done.notify_all()
+            raise
+
+        with self._lock:
+            self._inflight = {}
+            self._inflight_done.notify_all()
+            done_segments = self._failed_segments + ([segment_path] if segment_path else [])
+            self._failed_segments = []
+        for path in done_segments:
+            if os.path.exists(path):
+                os.remove(path)
+        return written
+
+    def flush_attempt(self, db: Session, attempt_id: int, timeout: float = 10.0) -> int:
+        """
+        交卷前强制落库该 attempt 的缓冲（独立事务，先于判分提交）
+
+        后台批次包含该 attempt 时先等待其提交（等待期间不持锁，后台批次使用独立的同步会话）；
+        超时仍未完成时把批次中该 attempt 的答案一并写入，同一题以缓冲中更新的作答为准
+
+        Args:
+            db: 数据库会话
+            attempt_id: 作答ID
+            timeout: 等待后台批次的最长时间(秒)
+
+        Returns:
+            int: 写入的答案数
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while any(key[0] == attempt_id for key in self._inflight):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._inflight_done.wait(remaining):
+                    break
+            entries = {key: entry for key, entry in self._inflight.items() if key[0] == attempt_id}
+            for key in [key for key in self._pending if key[0] == attempt_id]:
+                entries[key] = self._pending.pop(key)
+        if not entries:
+            return 0
+        try:
+            written = upsert_answers(db, list(entries.values()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for key, entry in entries.items():
+                    self._pending.setdefault(key, entry)
+            raise
+        # 日志中的旧记录在交卷后回放时会因 attempt 非 DOING 被过滤
+        return written
+
+    def recover(self, db: Session) -> int:
+        """启动时回放已退出进程遗留的日志与未完成的分段"""
+        candidates = []
+        for path in glob.glob(os.path.join(self.journal_dir, "answers-*.jsonl*")):
+            pid, segment = _journal_order(path)
+            if pid is None or (pid != os.getpid() and _pid_alive(pid)):
+                continue
+            candidates.append((pid, segment, path))
+        # 同一进程内：分段按编号先后，当前日志最新
+        candidates.sort()
+
+        # 改名认领，避免多个 worker 同时回放同一文件
+        claimed = []
+        for _, _, path in candidates:
+            claimed_path = f"{path}.recovering-{os.getpid()}"
+            try:
+                os.replace(path, claimed_path)
+            except FileNotFoundError:
+                continue
+            claimed.append(claimed_path)
+        if not claimed:
+            return 0
+
+        merged: Dict[AnswerKey, Dict[str, Any]] = {}
+        for path in claimed:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 崩溃时最后一行可能不完整
+                        continue
+                    merged[(entry["attempt_id"], entry["question_id"])] = entry
+
+        written = upsert_answers(db, list(merged.values()))
+        db.commit()
+        for path in claimed:
+            os.remove(path)
+        logger.info(f"回放答题日志 {len(claimed)} 个文件，写入 {written} 条答案")
+        return written
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+def _journal_order(path: str) -> Tuple[Optional[int], float]:
+    """
+    解析日志文件名，返回 (pid, 分段序号)
+    answers-<pid>.jsonl.<n>.flushing 为第 n 个待落库分段，answers-<pid>.jsonl 为当前日志（最新，序号视为无穷大）
+    """
+    name = os.path.basename(path)
+    if ".recovering-" in name:
+        return None, 0
+    try:
+        pid_part, rest = name[len("answers-"):].split(".jsonl", 1)
+        pid = int(pid_part)
+        if not rest:
+            return pid, float("inf")
+        return pid, float(rest.split(".")[1])
+    except (IndexError, ValueError):
+        return None, 0
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_buffer: Optional[AnswerBuffer] = None
+_process_lock = None
+_stop_event = threading.Event()
+_flush_thread: Optional[threading.Thread] = None
+
+
+def get_answer_buffer() -> Optional[AnswerBuffer]:
+    """自动保存模式开启时返回写缓冲，否则返回 None"""
+    return _buffer
+
+
+def flush_buffered_attempt(buffer: AnswerBuffer, attempt_id: int) -> int:
+    """
+    交卷前用独立的同步会话落库该 attempt 的缓冲
+
+    可能等待后台批次提交（最长 flush_attempt 的超时时间），须在线程池中调用，不要在事件循环中执行
+
+    Returns:
+        int: 写入的答案数
+    """
+    from ..core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return buffer.flush_attempt(db, attempt_id)
+    finally:
+        db.close()
+
+
+def _acquire_process_lock(journal_dir: str):
+    """
+    对日志目录加进程锁，保证只有一个进程开启自动保存
+
+    Raises:
+        RuntimeError: 另一个进程已在该目录开启自动保存
+    """
+    if fcntl is None:
+        return None
+    os.makedirs(journal_dir, exist_ok=True)
+    lock_file = open(os.path.join(journal_dir, "autosave.lock"), "a")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise RuntimeError(f"自动保存只支持单进程部署：日志目录 {journal_dir} 已被另一个进程使用")
+    return lock_file
+
+
+def _flush_loop(interval: float):
+    from ..core.database import SessionLocal
+
+    while not _stop_event.wait(interval):
+        db = SessionLocal()
+        try:
+            _buffer.flush(db)
+        except Exception as e:
+            logger.error(f"答题缓冲落库失败: {e}")
+        finally:
+            db.close()
+
+
+def start_answer_buffer():
+    """
+    应用启动：回放遗留日志并启动定期落库线程（仅 autosave_enabled 时）
+
+    Raises:
+        RuntimeError: 配置为多进程部署，或另一个进程已开启自动保存
+    """
+    global _buffer, _flush_thread, _process_lock
+    if not settings.autosave_enabled or _buffer is not None:
+        return
+    if settings.web_concurrency > 1:
+        raise RuntimeError(
+            f"自动保存只支持单进程部署（web_concurrency={settings.web_concurrency}），请关闭 autosave_enabled 或改为单进程"
+        )
+    from ..core.database import SessionLocal
+
+    _process_lock = _acquire_process_lock(settings.autosave_journal_dir)
+    _buffer = AnswerBuffer(settings.autosave_journal_dir, fsync=settings.autosave_journal_fsync)
+    db = SessionLocal()
+    try:
+        _buffer.recover(db)
+    finally:
+        db.close()
+
+    _stop_event.clear()
+    _flush_thread = threading.Thread(
+        target=_flush_loop,
+        args=(settings.autosave_flush_interval_seconds,),
+        name="answer-buffer-flush",
+        daemon=True,
+    )
+    _flush_thread.start()
+
+
+def stop_answer_buffer():
+    """应用关闭：停止后台线程并把剩余缓冲落库"""
+    global _buffer, _flush_thread, _process_lock
+    if _buffer is None:
+        return
+    from ..core.database import SessionLocal
+
+    _stop_event.set()
+    if _flush_thread is not None:
+        _flush_thread.join(timeout=5)
+    db = SessionLocal()
+    try:
+        _buffer.flush(db)
+    finally:
+        db.close()
+        _buffer.close()
+        if _process_lock is not None:
+            _process_lock.close()
+    _buffer = None
+    _flush_thread = None
+    _process_lock = None
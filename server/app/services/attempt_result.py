@@ -0,0 +1,148 @@
+"""
+考试结果快照服务
+已交卷作答的结果不会再变化：首次查看时用一条 JOIN 查询渲染并序列化，
+写入 attempts.result_snapshot，同时放入进程内 LRU 缓存；之后直接返回同一份字节，
+并以内容哈希作为强 ETag，客户端重复访问可得到 304
+"""
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from typing import Optional, Tuple
+import hashlib
+import threading
+
+from ..core.config import settings
+from ..models.attempt import Attempt, Answer
+from ..models.question import Question
+from ..models.paper import Exam
+from .paper_cache import dumps_json
+
+# attempt_id -> (user_id, etag, body)
+_cache: "OrderedDict[int, Tuple[int, str, bytes]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def make_etag(body: bytes) -> str:
+    """内容哈希生成强 ETag"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中当前 ETag"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag == etag or tag == "W/" + etag:
+            return True
+    return False
+
+
+def render_attempt_result(db: Session, attempt: Attempt, exam_title: Optional[str]) -> bytes:
+    """一条 JOIN 查询渲染考试结果并序列化"""
+    stmt = select(
+        Answer.question_id,
+        Answer.is_correct,
+        Answer.score_awarded,
+        Answer.answer_json,
+        Answer.time_spent_seconds,
+        Question.stem,
+        Question.answer_json.label("correct_answer"),
+        Question.analysis
+    ).join(
+        Question, Question.id == Answer.question_id
+    ).where(
+        Answer.attempt_id == attempt.id
+    ).order_by(Answer.id)
+
+    results = [
+        {
+            "question_id": row.question_id,
+            "question_stem": row.stem,
+            "is_correct": row.is_correct,
+            "score_awarded": float(row.score_awarded) if row.score_awarded is not None else None,
+            "correct_answer": row.correct_answer,
+            "user_answer": row.answer_json,
+            "analysis": row.analysis,
+            "time_spent_seconds": row.time_spent_seconds
+        }
+        for row in db.execute(stmt).all()
+    ]
+
+    return dumps_json({
+        "attempt_id": attempt.id,
+        "exam_title": exam_title if exam_title is not None else "未知考试",
+        "total_score": float(attempt.total_score) if attempt.total_score is not None else None,
+        "submitted_at": attempt.submitted_at.isoformat() if attempt.submitted_at else None,
+        "results": results
+    })
+
+
+def _remember(attempt_id: int, user_id: int, body: bytes) -> Tuple[str, bytes]:
+    etag = make_etag(body)
+    with _lock:
+        _cache[attempt_id] = (user_id, etag, body)
+        _cache.move_to_end(attempt_id)
+        while len(_cache) > settings.attempt_result_cache_size:
+            _cache.popitem(last=False)
+    return etag, body
+
+
+def get_attempt_result_snapshot(db: Session, attempt_id: int, user_id: int) -> Tuple[str, bytes]:
+    """
+    获取考试结果快照
+
+    Args:
+        db: 数据库会话
+        attempt_id: 作答ID
+        user_id: 当前用户ID（只能查看自己的结果）
+
+    Returns:
+        Tuple[str, bytes]: (ETag, JSON 响应体)
+
+    Raises:
+        HTTPException: 作答不存在或尚未交卷时
+    """
+    from fastapi import HTTPException, status
+
+    with _lock:
+        cached = _cache.get(attempt_id)
+        if cached is not None:
+            _cache.move_to_end(attempt_id)
+    if cached is not None and cached[0] == user_id:
+        return cached[1], cached[2]
+
+    stmt = select(Attempt, Exam.title, Attempt.result_snapshot).outerjoin(
+        Exam, Exam.id == Attempt.exam_id
+    ).where(
+        Attempt.id == attempt_id,
+        Attempt.user_id == user_id
+    )
+    row = db.execute(stmt).first()
+
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="作答记录不存在"
+        )
+    attempt, exam_title, snapshot = row
+
+    if attempt.status != "SUBMITTED":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="考试尚未完成"
+        )
+
+    if snapshot is not None:
+        return _remember(attempt_id, user_id, snapshot.encode("utf-8"))
+
+    body = render_attempt_result(db, attempt, exam_title)
+    db.execute(
+        update(Attempt).where(
+            Attempt.id == attempt_id,
+            Attempt.result_snapshot.is_(None)
+        ).values(result_snapshot=body.decode("utf-8")).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return _remember(attempt_id, user_id, body)
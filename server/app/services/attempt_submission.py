@@ -0,0 +1,196 @@
+"""
+交卷服务
+判分、回写答案得分、错题本/知识点掌握度/已作答集合写入、关联计划任务自动完成；
+学生主动交卷（attempts.submit_attempt）与超时自动交卷（attempt_sweeper）共用同一套规则
+
+批量处理：多份作答的答案、分值、判分器各只查询一次
+"""
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..models.attempt import Attempt, Answer
+from ..models.question import Question
+from ..models.knowledge import QuestionKnowledgeMap
+from ..models.paper import PaperQuestion
+from ..models.plan import LearningPlan, PlanItem
+from .grading import AttemptGrade, compile_graders, grade_attempts
+from .paper_cache import get_option_orders
+from .plan_cache import plan_version_bump
+from .progress_writer import apply_attempt_progress
+from .question_index import get_question_index
+from .seeded_papers import restore_option_letters, seeded_scores
+from .seen_questions import record_seen_questions
+
+
+class SubmittedAttempt:
+    """一次交卷的结果"""
+    __slots__ = ("attempt", "answers", "grade")
+
+    def __init__(self, attempt: Attempt, answers: List[Answer], grade: AttemptGrade):
+        self.attempt = attempt
+        self.answers = answers
+        self.grade = grade
+
+
+def _claim_attempts(
+    db: Session,
+    attempts: Sequence[Tuple[Attempt, Optional[int]]],
+    now: datetime
+) -> List[Tuple[Attempt, Optional[int]]]:
+    """逐条把 DOING 改为 SUBMITTED，只保留本事务抢到的作答（防止主动交卷与自动交卷重复判分）"""
+    claimed = []
+    for attempt, paper_id in attempts:
+        result = db.execute(
+            update(Attempt).where(
+                Attempt.id == attempt.id,
+                Attempt.status == "DOING"
+            ).values(status="SUBMITTED", submitted_at=now)
+        )
+        if result.rowcount == 1:
+            claimed.append((attempt, paper_id))
+    return claimed
+
+
+def submit_attempts(
+    db: Session,
+    attempts: Sequence[Tuple[Attempt, Optional[int]]],
+    now: Optional[datetime] = None
+) -> Dict[int, SubmittedAttempt]:
+    """
+    批量交卷并判分（不提交事务，由调用方 commit）
+
+    Args:
+        db: 数据库会话
+        attempts: [(attempt, paper_id)]
+        now: 交卷时间
+
+    Returns:
+        Dict[int, SubmittedAttempt]: 本次完成交卷的 {attempt_id: 结果}，已被其他请求交卷的作答不在其中
+    """
+    now = now or datetime.utcnow()
+    claimed = _claim_attempts(db, attempts, now)
+    if not claimed:
+        return {}
+    attempt_ids = [attempt.id for attempt, _ in claimed]
+
+    # 获取所有答案
+    answers_by_attempt: Dict[int, List[Answer]] = {attempt_id: [] for attempt_id in attempt_ids}
+    answers_stmt = select(Answer).where(Answer.attempt_id.in_(attempt_ids)).order_by(Answer.id)
+    for answer in db.execute(answers_stmt).scalars().all():
+        answers_by_attempt[answer.attempt_id].append(answer)
+    question_ids = {answer.question_id for answers in answers_by_attempt.values() for answer in answers}
+
+    # 按学生打乱选项的试卷：前端按展示位置提交字母，换回原选项字母后再判分（同时回写，结果页与标准答案一致）
+    for attempt, paper_id in claimed:
+        option_orders = get_option_orders(db, paper_id, attempt.user_id) if paper_id else None
+        if not option_orders:
+            continue
+        for answer in answers_by_attempt[attempt.id]:
+            option_order = option_orders.get(answer.question_id)
+            if option_order is not None and answer.answer_json is not None:
+                answer.answer_json = restore_option_letters(option_order, answer.answer_json)
+
+    # 试卷分值映射
+    paper_ids = {paper_id for _, paper_id in claimed if paper_id}
+    scores_by_paper: Dict[int, Dict[int, float]] = {paper_id: {} for paper_id in paper_ids}
+    if paper_ids and question_ids:
+        pq_stmt = select(PaperQuestion.paper_id, PaperQuestion.question_id, PaperQuestion.score).where(
+            PaperQuestion.paper_id.in_(paper_ids),
+            PaperQuestion.question_id.in_(question_ids)
+        )
+        for paper_id, question_id, score in db.execute(pq_stmt).all():
+            scores_by_paper[paper_id][question_id] = float(score)
+        # 没有题目行的试卷可能是未固化的种子试卷：按规则中的统一分值
+        unscored = [paper_id for paper_id, scores in scores_by_paper.items() if not scores]
+        for paper_id, score in seeded_scores(db, unscored).items():
+            scores_by_paper[paper_id] = dict.fromkeys(question_ids, score)
+    score_maps = {attempt.id: scores_by_paper.get(paper_id, {}) for attempt, paper_id in claimed}
+
+    # 判分器优先取内存题库索引，缺失或版本过期（其他进程刚修改）的题目按当前行重新编译
+    index = get_question_index(db)
+    question_rows = []
+    if question_ids:
+        question_stmt = select(
+            Question.id, Question.type, Question.answer_json, Question.updated_at
+        ).where(Question.id.in_(question_ids))
+        question_rows = db.execute(question_stmt).all()
+    graders = index.graders(row.id for row in question_rows)
+    stale = [row for row in question_rows if row.id not in graders or graders[row.id].version != row.updated_at]
+    graders.update(compile_graders(stale))
+
+    grades = grade_attempts(graders, answers_by_attempt, score_maps)
+
+    # 索引中缺失的题目单独查询知识点映射
+    missing_kps: Dict[int, List[int]] = {}
+    missing_ids = [row.id for row in question_rows if row.id not in index]
+    if missing_ids:
+        kp_stmt = select(QuestionKnowledgeMap.question_id, QuestionKnowledgeMap.knowledge_id).where(
+            QuestionKnowledgeMap.question_id.in_(missing_ids)
+        )
+        for question_id, knowledge_id in db.execute(kp_stmt).all():
+            missing_kps.setdefault(question_id, []).append(knowledge_id)
+
+    submitted = {}
+    seen_by_user: Dict[int, List[int]] = {}
+    for attempt, _ in claimed:
+        answers = answers_by_attempt[attempt.id]
+        grade = grades[attempt.id]
+        grade_map = {item.question_id: item for item in grade.items}
+
+        wrong_ids = []
+        knowledge_updates: Dict[int, Dict[str, int]] = {}
+        for answer in answers:
+            item = grade_map.get(answer.question_id)
+            if item is None:
+                continue
+            answer.is_correct = item.is_correct
+            answer.score_awarded = float(item.score_awarded)
+
+            if answer.question_id in index:
+                kp_ids = index.knowledge_ids(answer.question_id)
+            else:
+                kp_ids = missing_kps.get(answer.question_id, [])
+            for kp_id in kp_ids:
+                stats = knowledge_updates.setdefault(kp_id, {"correct": 0, "total": 0})
+                stats["total"] += 1
+                if item.is_correct:
+                    stats["correct"] += 1
+
+            if not item.is_correct:
+                wrong_ids.append(answer.question_id)
+
+        # 错题本与知识点掌握度（集合 upsert）
+        apply_attempt_progress(db, attempt.user_id, wrong_ids, knowledge_updates, now)
+        seen_by_user.setdefault(attempt.user_id, []).extend(answer.question_id for answer in answers)
+
+        attempt.total_score = grade.total_score
+
+        # 如果该attempt对应某个PlanItem，则自动完成该计划任务
+        if attempt.exam_id:
+            completed = db.execute(
+                update(PlanItem).where(
+                    PlanItem.exam_id == attempt.exam_id,
+                    PlanItem.status == "TODO",
+                    PlanItem.plan_id.in_(
+                        select(LearningPlan.id).where(
+                            LearningPlan.user_id == attempt.user_id,
+                            LearningPlan.is_active == True
+                        )
+                    )
+                ).values(status="DONE", completed_at=now).execution_options(synchronize_session=False)
+            )
+            if completed.rowcount:
+                db.execute(plan_version_bump(
+                    LearningPlan.user_id == attempt.user_id,
+                    LearningPlan.is_active == True
+                ))
+
+        submitted[attempt.id] = SubmittedAttempt(attempt, answers, grade)
+
+    # 已作答集合（每个用户读写一次）
+    record_seen_questions(db, seen_by_user)
+
+    return submitted
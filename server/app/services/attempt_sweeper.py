@@ -0,0 +1,163 @@
+"""
+超时自动交卷服务
+后台线程定期查找已超过考试时长（加宽限时间）仍处于 DOING 的作答，按批自动交卷：
+- 通过 attempts (status, started_at) 索引按时长分组做范围扫描，每批最多 attempt_sweep_batch_size 条
+- 判分规则与学生主动交卷一致（attempt_submission.submit_attempts）
+- 每批一个事务；批次之间暂停并随机抖动，集中收卷时把写入摊开
+- duration_minutes 为 0 的考试（练习/复习）不限时，不会被自动交卷
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import logging
+import random
+import threading
+import time
+
+from ..core.config import settings
+from ..models.attempt import Attempt
+from ..models.paper import Exam
+from .answer_buffer import get_answer_buffer
+from .attempt_submission import submit_attempts
+
+logger = logging.getLogger(__name__)
+
+
+def find_expired_attempts(
+    db: Session,
+    now: datetime,
+    limit: int
+) -> List[Tuple[Attempt, Optional[int]]]:
+    """
+    查找到期未交卷的作答
+
+    Args:
+        db: 数据库会话
+        now: 当前时间
+        limit: 最多返回条数
+
+    Returns:
+        List[Tuple[Attempt, Optional[int]]]: [(attempt, paper_id)]，按开始时间升序
+    """
+    grace = timedelta(seconds=settings.attempt_sweep_grace_seconds)
+    durations_stmt = select(Exam.duration_minutes).where(Exam.duration_minutes > 0).distinct()
+    durations = sorted(db.execute(durations_stmt).scalars().all())
+
+    expired: List[Tuple[Attempt, Optional[int]]] = []
+    for minutes in durations:
+        if len(expired) >= limit:
+            break
+        cutoff = now - timedelta(minutes=minutes) - grace
+        stmt = select(Attempt, Exam.paper_id).join(
+            Exam, Exam.id == Attempt.exam_id
+        ).where(
+            Attempt.status == "DOING",
+            Attempt.started_at <= cutoff,
+            Exam.duration_minutes == minutes
+        ).order_by(Attempt.started_at).limit(limit - len(expired))
+        expired.extend((attempt, paper_id) for attempt, paper_id in db.execute(stmt).all())
+    return expired
+
+
+def sweep_expired_attempts(
+    db: Session,
+    batch_size: Optional[int] = None,
+    pause_seconds: Optional[float] = None,
+    stop_event: Optional[threading.Event] = None
+) -> int:
+    """
+    分批自动交卷，直到没有到期作答
+
+    Args:
+        db: 数据库会话
+        batch_size: 每批条数（默认 settings.attempt_sweep_batch_size）
+        pause_seconds: 批次间隔（默认 settings.attempt_sweep_batch_pause_seconds）
+        stop_event: 置位后在批次之间退出
+
+    Returns:
+        int: 自动交卷的作答数
+    """
+    batch_size = batch_size or settings.attempt_sweep_batch_size
+    if pause_seconds is None:
+        pause_seconds = settings.attempt_sweep_batch_pause_seconds
+    buffer = get_answer_buffer()
+    total = 0
+
+    while True:
+        now = datetime.utcnow()
+        batch = find_expired_attempts(db, now, batch_size)
+        if not batch:
+            break
+
+        # 自动保存模式：判分前先把缓冲答案落库
+        if buffer is not None:
+            buffer.flush(db)
+
+        try:
+            submitted = submit_attempts(db, batch, now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        db.expunge_all()
+
+        if buffer is not None:
+            for attempt, _ in batch:
+                buffer.mark_closed(attempt.id)
+        total += len(submitted)
+        logger.info(f"超时自动交卷 {len(submitted)} 份")
+
+        if len(batch) < batch_size:
+            break
+        wait = pause_seconds * (1 + random.random())
+        if stop_event is not None:
+            if stop_event.wait(wait):
+                break
+        else:
+            time.sleep(wait)
+
+    return total
+
+
+_stop_event = threading.Event()
+_sweep_thread: Optional[threading.Thread] = None
+
+
+def _sweep_loop(interval: float):
+    from ..core.database import SessionLocal
+
+    while not _stop_event.wait(interval):
+        db = SessionLocal()
+        try:
+            sweep_expired_attempts(db, stop_event=_stop_event)
+        except Exception as e:
+            logger.error(f"超时自动交卷失败: {e}")
+        finally:
+            db.close()
+
+
+def start_attempt_sweeper():
+    """应用启动：启动超时自动交卷线程（仅 attempt_sweeper_enabled 时）"""
+    global _sweep_thread
+    if not settings.attempt_sweeper_enabled or _sweep_thread is not None:
+        return
+    _stop_event.clear()
+    _sweep_thread = threading.Thread(
+        target=_sweep_loop,
+        args=(settings.attempt_sweep_interval_seconds,),
+        name="attempt-sweeper",
+        daemon=True,
+    )
+    _sweep_thread.start()
+
+
+def stop_attempt_sweeper():
+    """应用关闭：停止超时自动交卷线程"""
+    global _sweep_thread
+    if _sweep_thread is None:
+        return
+    _stop_event.set()
+    _sweep_thread.join(timeout=5)
+    _sweep_thread = None
@@ -0,0 +1,450 @@
+"""
+批量个性化诊断服务
+管理员一次为整批学员（可达上万人）生成个性化诊断考试：每个学员按模块掌握度排序，
+最薄弱的若干模块多抽题，其余模块按基础题量覆盖；尽量避开学员已作答的题目
+
+执行方式：
+- 主进程按学员ID顺序分块（cohort_diagnostic_chunk_size），每块一次查询掌握度、一次查询已作答集合
+- 抽题分发到进程池：各模块候选题目ID（去重后的紧凑数组）在启动进程池时下发一次，之后只读；
+  任务只携带学员ID、模块顺序和已作答位图
+- 每块的试卷、题目行、考试批量写入，并在同一事务中推进 cursor_user_id，
+  中断（停机、暂停、失败）后从游标处续跑，不重复生成
+- 进度：diagnostic_batches 的 processed / generated / total，接口按已用时间估算剩余时间
+
+进程数 <= 1 时（单核机器或显式配置）在任务线程内抽题，省去进程启动开销
+"""
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+import multiprocessing
+import os
+import random
+import threading
+
+from ..core.config import settings
+from ..models.paper import DiagnosticBatch, Exam
+from ..models.progress import UserKnowledgeState, UserSeenQuestions
+from ..models.user import User
+from .knowledge_tree import get_knowledge_tree
+from .paper_store import materialize_papers
+from .paper_template import OBJECTIVE_TYPES
+from .question_sampler import QuestionPool, get_question_sampler
+from .seen_questions import SeenSet
+
+logger = logging.getLogger(__name__)
+
+# (模块code, 模块名称, 候选题目ID)
+_ModuleCandidates = Tuple[str, str, array]
+
+# 进程池中各进程的只读候选（由 _init_worker 设置）
+_worker_modules: Dict[str, Tuple[str, array]] = {}
+
+
+def _init_worker(modules: Sequence[_ModuleCandidates]):
+    global _worker_modules
+    _worker_modules = {code: (name, candidates) for code, name, candidates in modules}
+
+
+def _generate_for_users(
+    tasks: Sequence[Tuple[int, Sequence[str], Optional[bytes]]],
+    weak_modules: int,
+    weak_per_module: int,
+    per_module: int
+) -> List[Tuple[int, List[int], List[Dict[str, Any]]]]:
+    """
+    为一组学员抽题（在进程池中执行，不访问数据库）
+
+    Args:
+        tasks: [(user_id, 按掌握度升序的模块code, 已作答位图)]
+        weak_modules: 重点强化的薄弱模块数
+        weak_per_module: 薄弱模块每模块题量
+        per_module: 其余模块每模块题量
+
+    Returns:
+        List[Tuple[int, List[int], List[Dict[str, Any]]]]: [(user_id, 题目ID, 各模块抽题统计)]
+    """
+    results = []
+    for user_id, module_order, seen_bytes in tasks:
+        seen = SeenSet.from_bytes(seen_bytes) if seen_bytes else None
+        picked: List[int] = []
+        picked_set = set()
+        module_stats = []
+        for rank, code in enumerate(module_order):
+            name, candidates = _worker_modules[code]
+            target = weak_per_module if rank < weak_modules else per_module
+            if target <= 0:
+                continue
+            pool = QuestionPool(None, [candidates], None)
+            selected = pool.draw(target, exclude=picked_set, avoid=seen)
+            random.shuffle(selected)
+            picked.extend(selected)
+            picked_set.update(selected)
+            module_stats.append({
+                "module_code": code,
+                "module_name": name,
+                "weak": rank < weak_modules,
+                "target_count": target,
+                "actual_count": len(selected)
+            })
+        results.append((user_id, picked, module_stats))
+    return results
+
+
+def _module_candidates(db: Session, subject: str, max_difficulty: int) -> List[_ModuleCandidates]:
+    """各模块（科目下一级知识点）的客观题候选，去重后存为紧凑数组"""
+    tree = get_knowledge_tree(db)
+    sampler = get_question_sampler(db)
+    subject_node = tree.by_code(subject)
+    if subject_node is None:
+        raise ValueError(f"未找到{subject}科目的模块节点")
+
+    modules = []
+    for module in tree.children(subject_node.id):
+        kp_ids = tree.subtree_ids(module.id) or [module.id]
+        pool = sampler.pool(kp_ids, question_types=OBJECTIVE_TYPES, max_difficulty=max_difficulty)
+        modules.append((module.code, module.name, array("i", sorted(set(pool.iter_ids())))))
+    if not modules:
+        raise ValueError(f"未找到{subject}科目的模块节点")
+    return modules
+
+
+def _student_filter(params: Dict[str, Any]):
+    conditions = [User.role == "STUDENT", User.is_active == True]
+    if params.get("user_ids"):
+        conditions.append(User.id.in_(params["user_ids"]))
+    return conditions
+
+
+def create_diagnostic_batch(db: Session, params: Dict[str, Any], created_by: int) -> DiagnosticBatch:
+    """
+    创建批量诊断任务（提交事务）
+
+    Args:
+        db: 数据库会话
+        params: 学员范围与组卷参数（user_ids, subject, per_module, weak_modules, weak_per_module,
+                max_difficulty, duration_minutes）
+        created_by: 管理员用户ID
+
+    Returns:
+        DiagnosticBatch: 新任务，状态为 RUNNING
+
+    Raises:
+        ValueError: 没有符合条件的学员（不创建任务）
+    """
+    total = db.execute(select(func.count()).select_from(User).where(*_student_filter(params))).scalar_one()
+    if total == 0:
+        raise ValueError("没有符合条件的学员")
+    batch = DiagnosticBatch(
+        status="RUNNING",
+        params_json=params,
+        total=total,
+        processed=0,
+        generated=0,
+        cursor_user_id=0,
+        created_by=created_by
+    )
+    db.add(batch)
+    db.commit()
+    db.refresh(batch)
+    return batch
+
+
+def _module_order(
+    db: Session,
+    user_ids: Sequence[int],
+    modules: Sequence[_ModuleCandidates]
+) -> Dict[int, List[str]]:
+    """一次查询本块学员的掌握度，按模块平均掌握度升序排列模块（无记录视为 0）"""
+    tree = get_knowledge_tree(db)
+    subject_codes = [code for code, _, _ in modules]
+    module_of: Dict[int, str] = {}
+    for code in subject_codes:
+        node = tree.by_code(code)
+        for kp_id in tree.subtree_ids(node.id) or [node.id]:
+            module_of.setdefault(kp_id, code)
+
+    sums: Dict[int, Dict[str, List[float]]] = {user_id: {} for user_id in user_ids}
+    stmt = select(UserKnowledgeState.user_id, UserKnowledgeState.knowledge_id, UserKnowledgeState.mastery).where(
+        UserKnowledgeState.user_id.in_(user_ids),
+        UserKnowledgeState.knowledge_id.in_(list(module_of))
+    )
+    for user_id, knowledge_id, mastery in db.execute(stmt).all():
+        if mastery is not None:
+            sums[user_id].setdefault(module_of[knowledge_id], []).append(float(mastery))
+
+    order = {}
+    for user_id in user_ids:
+        averages = {}
+        for code in subject_codes:
+            values = sums[user_id].get(code)
+            averages[code] = sum(values) / len(values) if values else 0.0
+        order[user_id] = sorted(subject_codes, key=lambda code: averages[code])
+    return order
+
+
+def _seen_bitmaps(db: Session, user_ids: Sequence[int]) -> Dict[int, bytes]:
+    stmt = select(UserSeenQuestions.user_id, UserSeenQuestions.bitmap).where(
+        UserSeenQuestions.user_id.in_(user_ids)
+    )
+    return {user_id: bitmap for user_id, bitmap in db.execute(stmt).all()}
+
+
+def _next_user_ids(db: Session, params: Dict[str, Any], cursor: int, limit: int) -> List[int]:
+    stmt = select(User.id).where(*_student_filter(params), User.id > cursor).order_by(User.id).limit(limit)
+    return list(db.execute(stmt).scalars().all())
+
+
+def _write_chunk(
+    db: Session,
+    batch: DiagnosticBatch,
+    results: Sequence[Tuple[int, List[int], List[Dict[str, Any]]]],
+    cursor: int,
+    now: datetime
+) -> bool:
+    """写入一块结果并推进游标（不提交事务）；游标已被其他执行者推进时返回 False"""
+    params = batch.params_json
+    advanced = db.execute(
+        update(DiagnosticBatch).where(
+            DiagnosticBatch.id == batch.id,
+            DiagnosticBatch.cursor_user_id == batch.cursor_user_id,
+            DiagnosticBatch.status == "RUNNING"
+        ).values(
+            cursor_user_id=cursor,
+            processed=DiagnosticBatch.processed + len(results),
+            generated=DiagnosticBatch.generated + sum(1 for _, ids, _ in results if ids)
+        ).execution_options(synchronize_session=False)
+    )
+    if advanced.rowcount != 1:
+        return False
+
+    results = [(user_id, ids, stats) for user_id, ids, stats in results if ids]
+    if not results:
+        return True
+
+    stamp = now.strftime('%Y-%m-%d %H:%M')
+    papers = materialize_papers(
+        db,
+        [
+            (
+                f"个性化诊断试卷 (薄弱模块强化 {stamp})",
+                question_ids,
+                [2.0] * len(question_ids),
+                {
+                    "type": "cohort_diagnostic",
+                    "batch_id": batch.id,
+                    "user_id": user_id,
+                    "generation_rule": "按模块掌握度升序，薄弱模块加量抽题，避开已作答题目",
+                    "weak_modules": [s["module_code"] for s in module_stats if s["weak"]],
+                    "modules": module_stats,
+                    "total_questions": len(question_ids),
+                    "generated_at": now.isoformat()
+                }
+            )
+            for user_id, question_ids, module_stats in results
+        ],
+        created_by=batch.created_by
+    )
+
+    # 学员此前的个性化诊断归档，只保留本次生成的一份
+    db.execute(
+        update(Exam).where(
+            Exam.category == "DIAGNOSTIC",
+            Exam.status == "PUBLISHED",
+            Exam.assigned_user_id.in_([user_id for user_id, _, _ in results])
+        ).values(status="ARCHIVED").execution_options(synchronize_session=False)
+    )
+    # 考试不需要回读ID，整块一条多行 INSERT
+    db.execute(
+        insert(Exam),
+        [
+            {
+                "paper_id": paper.id,
+                "title": f"个性化诊断考试 (薄弱模块强化 {stamp})",
+                "category": "DIAGNOSTIC",
+                "duration_minutes": params.get("duration_minutes", 45),
+                "status": "PUBLISHED",
+                "created_by": batch.created_by,
+                "assigned_user_id": user_id
+            }
+            for paper, (user_id, _, _) in zip(papers, results)
+        ]
+    )
+    return True
+
+
+def run_diagnostic_batch(db: Session, batch_id: int, stop_event: Optional[threading.Event] = None) -> DiagnosticBatch:
+    """
+    从游标处执行批量诊断任务直到完成、暂停或失败
+
+    Args:
+        db: 数据库会话
+        batch_id: 任务ID
+        stop_event: 置位后在块之间退出（任务保持 RUNNING，可续跑）
+
+    Returns:
+        DiagnosticBatch: 任务最新状态
+    """
+    batch = db.get(DiagnosticBatch, batch_id)
+    if batch is None or batch.status != "RUNNING":
+        return batch
+    params = batch.params_json
+    weak_args = (
+        params.get("weak_modules", 2),
+        params.get("weak_per_module", 4),
+        params.get("per_module", 2)
+    )
+
+    try:
+        modules = _module_candidates(db, params.get("subject", "XINGCE"), params.get("max_difficulty", 3))
+    except Exception as e:
+        batch.status, batch.error = "FAILED", str(e)
+        db.commit()
+        return batch
+
+    workers = settings.cohort_diagnostic_workers or min(max((os.cpu_count() or 1) - 1, 1), 8)
+    executor = None
+    if workers > 1:
+        # spawn：不从带线程的服务进程 fork；候选数组在每个进程启动时下发一次
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(modules,)
+        )
+    else:
+        _init_worker(modules)
+
+    task_size = max(1, settings.cohort_diagnostic_task_size)
+
+    def dispatch(user_ids: List[int]):
+        order = _module_order(db, user_ids, modules)
+        seen = _seen_bitmaps(db, user_ids)
+        tasks = [(user_id, order[user_id], seen.get(user_id)) for user_id in user_ids]
+        groups = [tasks[i:i + task_size] for i in range(0, len(tasks), task_size)]
+        if executor is None:
+            return [item for group in groups for item in _generate_for_users(group, *weak_args)]
+        return [executor.submit(_generate_for_users, group, *weak_args) for group in groups]
+
+    def collect(submitted) -> List[Tuple[int, List[int], List[Dict[str, Any]]]]:
+        if executor is None:
+            return submitted
+        return [item for future in submitted for item in future.result()]
+
+    # 流水线：下一块在进程池中抽题的同时，主线程写入上一块
+    pending: Optional[Tuple[List[int], Any]] = None
+    cursor = batch.cursor_user_id
+    try:
+        while stop_event is None or not stop_event.is_set():
+            db.refresh(batch)
+            if batch.status != "RUNNING":
+                break
+            user_ids = _next_user_ids(db, params, cursor, settings.cohort_diagnostic_chunk_size)
+            submitted = dispatch(user_ids) if user_ids else None
+
+            if pending is not None:
+                pending_ids, pending_submitted = pending
+                if not _write_chunk(db, batch, collect(pending_submitted), pending_ids[-1], datetime.utcnow()):
+                    # 其他执行者已推进该任务或任务已暂停
+                    db.rollback()
+                    break
+                db.commit()
+                pending = None
+
+            if not user_ids:
+                batch.status = "DONE"
+                batch.finished_at = datetime.utcnow()
+                db.commit()
+                break
+            pending = (user_ids, submitted)
+            cursor = user_ids[-1]
+    except Exception as e:
+        db.rollback()
+        logger.error(f"批量诊断任务 {batch_id} 失败: {e}")
+        db.execute(
+            update(DiagnosticBatch).where(DiagnosticBatch.id == batch_id).values(status="FAILED", error=str(e))
+        )
+        db.commit()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    db.refresh(batch)
+    return batch
+
+
+def batch_progress(batch: DiagnosticBatch) -> Dict[str, Any]:
+    """任务进度（含按已用时间估算的剩余秒数）"""
+    end = batch.finished_at or datetime.utcnow()
+    elapsed = max((end - batch.created_at).total_seconds(), 0.0) if batch.created_at else 0.0
+    rate = batch.processed / elapsed if elapsed > 0 else None
+    remaining = max(batch.total - batch.processed, 0)
+    return {
+        "id": batch.id,
+        "status": batch.status,
+        "params": batch.params_json,
+        "total": batch.total,
+        "processed": batch.processed,
+        "generated": batch.generated,
+        "skipped": batch.processed - batch.generated,
+        "percent": round(batch.processed * 100.0 / batch.total, 1) if batch.total else 100.0,
+        "rate_per_second": round(rate, 1) if rate else None,
+        "eta_seconds": round(remaining / rate) if rate and batch.status == "RUNNING" else None,
+        "error": batch.error,
+        "created_at": batch.created_at.isoformat() if batch.created_at else None,
+        "finished_at": batch.finished_at.isoformat() if batch.finished_at else None
+    }
+
+
+_runners: Dict[int, threading.Thread] = {}
+_runners_lock = threading.Lock()
+_stop_event = threading.Event()
+
+
+def _run_in_background(batch_id: int):
+    from ..core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        run_diagnostic_batch(db, batch_id, stop_event=_stop_event)
+    except Exception as e:
+        logger.error(f"批量诊断任务 {batch_id} 异常退出: {e}")
+    finally:
+        db.close()
+        with _runners_lock:
+            _runners.pop(batch_id, None)
+
+
+def start_diagnostic_batch(batch_id: int) -> bool:
+    """在后台线程中执行任务；本进程已在执行时返回 False"""
+    with _runners_lock:
+        if batch_id in _runners:
+            return False
+        _stop_event.clear()
+        thread = threading.Thread(
+            target=_run_in_background,
+            args=(batch_id,),
+            name=f"cohort-diagnostic-{batch_id}",
+            daemon=True,
+        )
+        _runners[batch_id] = thread
+        thread.start()
+        return True
+
+
+def is_batch_running(batch_id: int) -> bool:
+    with _runners_lock:
+        return batch_id in _runners
+
+
+def stop_diagnostic_batches():
+    """应用关闭：在块之间停止执行中的任务（状态保持 RUNNING，重启后可续跑）"""
+    _stop_event.set()
+    with _runners_lock:
+        threads = list(_runners.values())
+    for thread in threads:
+        thread.join(timeout=5)
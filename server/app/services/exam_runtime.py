@@ -6,35 +6,23 @@
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 
 from ..models.attempt import Attempt
-from ..models.question import Question
-from ..models.paper import Exam, PaperQuestion
+from ..models.paper import Exam, Paper
+from .paper_cache import dumps_json, get_paper_payload, get_paper_snapshot, invalidate_paper_payload
+from .seeded_papers import freeze_seeded_paper, seeded_rule
 
 
-def start_exam_for_user(db: Session, exam_id: int, user_id: int) -> Dict[str, Any]:
-    """
-    为用户开始考试
-
-    Args:
-        db: 数据库会话
-        exam_id: 考试ID
-        user_id: 用户ID
-
-    Returns:
-        dict: 包含attempt_id, exam, questions, started_at的响应数据
-
-    Raises:
-        HTTPException: 当考试不存在、未发布或用户已有进行中的考试时
-    """
+def _create_attempt(db: Session, exam_id: int, user_id: int) -> Tuple[Exam, Attempt]:
+    """校验考试状态并创建进行中的 attempt（不提交事务）"""
     from fastapi import HTTPException, status
 
     # 验证考试存在且已发布
     exam_stmt = select(Exam).where(Exam.id == exam_id, Exam.status == "PUBLISHED")
     exam = db.execute(exam_stmt).scalar_one_or_none()
 
-    if not exam:
+    if not exam or (exam.assigned_user_id is not None and exam.assigned_user_id != user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="考试不存在或未发布"
@@ -65,30 +53,19 @@ def start_exam_for_user(db: Session, exam_id: int, user_id: int) -> Dict[str, An
     db.add(attempt)
     db.flush()  # 获取attempt.id
 
-    # 获取试卷题目
-    paper_questions_stmt = select(PaperQuestion).where(
-        PaperQuestion.paper_id == exam.paper_id
-    ).order_by(PaperQuestion.order_no)
-    paper_questions = db.execute(paper_questions_stmt).scalars().all()
-
-    questions = []
-    for pq in paper_questions:
-        question_stmt = select(Question).where(Question.id == pq.question_id)
-        question = db.execute(question_stmt).scalar_one_or_none()
-        if question:
-            questions.append({
-                "id": question.id,
-                "order_no": pq.order_no,
-                "question": {
-                    "id": question.id,
-                    "type": question.type,
-                    "stem": question.stem,
-                    "options_json": question.options_json
-                }
-            })
+    # 种子试卷在首次开考时固化：之后的作答与判分按题目行，不随题库修改重新推导
+    config_json = db.execute(select(Paper.config_json).where(Paper.id == exam.paper_id)).scalar_one_or_none()
+    if seeded_rule(config_json) is not None:
+        paper = db.execute(select(Paper).where(Paper.id == exam.paper_id).with_for_update()).scalar_one()
+        # 加锁后复查，并发开考时只固化一次
+        if seeded_rule(paper.config_json) is not None:
+            freeze_seeded_paper(db, paper)
+            db.flush()
+            invalidate_paper_payload(paper.id)
+    return exam, attempt
 
-    db.commit()
 
+def _start_response_fields(exam: Exam, attempt: Attempt) -> Dict[str, Any]:
     return {
         "attempt_id": attempt.id,
         "exam": {
@@ -97,6 +74,55 @@ def start_exam_for_user(db: Session, exam_id: int, user_id: int) -> Dict[str, An
             "category": exam.category,
             "duration_minutes": exam.duration_minutes
         },
-        "questions": questions,
         "started_at": attempt.started_at.isoformat() if attempt.started_at else None
     }
+
+
+def start_exam_for_user(db: Session, exam_id: int, user_id: int) -> Dict[str, Any]:
+    """
+    为用户开始考试
+
+    Args:
+        db: 数据库会话
+        exam_id: 考试ID
+        user_id: 用户ID
+
+    Returns:
+        dict: 包含attempt_id, exam, questions, started_at的响应数据
+
+    Raises:
+        HTTPException: 当考试不存在、未发布或用户已有进行中的考试时
+    """
+    exam, attempt = _create_attempt(db, exam_id, user_id)
+
+    # 试卷题目来自按 paper_id 缓存的载荷
+    questions = list(get_paper_payload(db, exam.paper_id, user_id))
+
+    db.commit()
+
+    result = _start_response_fields(exam, attempt)
+    result["questions"] = questions
+    return result
+
+
+def start_exam_snapshot(db: Session, exam_id: int, user_id: int) -> bytes:
+    """
+    为用户开始考试，直接返回序列化后的响应体
+
+    与 start_exam_for_user 返回相同的 JSON 结构，但题目列表使用试卷快照字节拼接，
+    同一试卷的题目只序列化一次
+
+    Returns:
+        bytes: JSON 响应体
+
+    Raises:
+        HTTPException: 当考试不存在、未发布或用户已有进行中的考试时
+    """
+    exam, attempt = _create_attempt(db, exam_id, user_id)
+    snapshot = get_paper_snapshot(db, exam.paper_id, user_id)
+
+    db.commit()
+
+    head = dumps_json(_start_response_fields(exam, attempt))
+    # head 形如 {...}，在结尾花括号前插入 questions 字段
+    return b"".join((head[:-1], b',"questions":', snapshot, b"}"))
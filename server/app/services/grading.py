@@ -0,0 +1,316 @@
+"""
+判分服务
+将每道题目预编译为判分器（标准化答案键、预编译正则、关键词匹配器），
+提交时只做一次字典查找 + 一次比较，避免在循环中反复推导判分规则
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import re
+
+from ..models.question import Question
+
+# 题目默认分值（PaperQuestion 中缺失分数时使用）
+DEFAULT_QUESTION_SCORE = 2.0
+
+# 判断题答案的等价写法
+JUDGE_TRUE_VALUES = frozenset({"T", "TRUE", "正确", "是", "YES", "Y"})
+JUDGE_FALSE_VALUES = frozenset({"F", "FALSE", "错误", "否", "NO", "N"})
+
+# 连续空白（填空题规范化用）
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(s: str) -> str:
+    """填空题规范化：去首尾空白、连续空格压缩、忽略大小写"""
+    return _WHITESPACE_RE.sub(" ", s.strip()).lower()
+
+
+def normalize_choice(value: Any) -> str:
+    """选择题选项规范化：去空白并转大写"""
+    return str(value).strip().upper()
+
+
+def normalize_judge(value: Any) -> Optional[bool]:
+    """判断题答案规范化：返回 True/False，无法识别时返回 None"""
+    v = str(value).strip().upper()
+    if v in JUDGE_TRUE_VALUES:
+        return True
+    if v in JUDGE_FALSE_VALUES:
+        return False
+    return None
+
+
+def _first(answer: Any) -> Any:
+    """取作答/答案列表的第一个元素（空值返回空串）"""
+    if isinstance(answer, list):
+        return answer[0] if answer else ""
+    return answer or ""
+
+
+class GradeResult:
+    """单题判分结果"""
+    __slots__ = ("question_id", "is_correct", "score_awarded", "matched_keywords")
+
+    def __init__(
+        self,
+        question_id: int,
+        is_correct: bool,
+        score_awarded: float,
+        matched_keywords: Optional[List[str]] = None
+    ):
+        self.question_id = question_id
+        self.is_correct = is_correct
+        self.score_awarded = score_awarded
+        self.matched_keywords = matched_keywords
+
+
+class AttemptGrade:
+    """整份作答的判分结果"""
+    __slots__ = ("total_score", "correct_count", "items")
+
+    def __init__(self):
+        self.total_score = 0.0
+        self.correct_count = 0
+        self.items: List[GradeResult] = []
+
+    def add(self, result: GradeResult):
+        self.items.append(result)
+        self.total_score += result.score_awarded
+        if result.is_correct:
+            self.correct_count += 1
+
+
+class QuestionGrader:
+    """
+    题目判分器基类
+    version 为题目的 updated_at，题目被编辑后版本变化，缓存的判分器自动失效
+    """
+    __slots__ = ("question_id", "version")
+
+    def __init__(self, question_id: int, version: Any = None):
+        self.question_id = question_id
+        self.version = version
+
+    def grade(self, user_answer: Any, full_score: float) -> GradeResult:
+        # 未知题型（如需人工评分的作文）不自动给分
+        return GradeResult(self.question_id, False, 0.0)
+
+
+class SingleChoiceGrader(QuestionGrader):
+    """单选题：比较第一个答案"""
+    __slots__ = ("key",)
+
+    def __init__(self, question_id: int, answer_key: Any, version: Any = None):
+        super().__init__(question_id, version)
+        self.key = normalize_choice(_first(answer_key))
+
+    def grade(self, user_answer: Any, full_score: float) -> GradeResult:
+        is_correct = normalize_choice(_first(user_answer)) == self.key
+        return GradeResult(self.question_id, is_correct, full_score if is_correct else 0.0)
+
+
+class MultiChoiceGrader(QuestionGrader):
+    """多选题：比较选项集合"""
+    __slots__ = ("key",)
+
+    def __init__(self, question_id: int, answer_key: Any, version: Any = None):
+        super().__init__(question_id, version)
+        self.key = frozenset(normalize_choice(a) for a in (answer_key or []))
+
+    def grade(self, user_answer: Any, full_score: float) -> GradeResult:
+        user_set = frozenset(normalize_choice(a) for a in (user_answer or []))
+        is_correct = user_set == self.key
+        return GradeResult(self.question_id, is_correct, full_score if is_correct else 0.0)
+
+
+class JudgeGrader(QuestionGrader):
+    """判断题：支持 T/F、正确/错误、是/否 等多种写法"""
+    __slots__ = ("key",)
+
+    def __init__(self, question_id: int, answer_key: Any, version: Any = None):
+        super().__init__(question_id, version)
+        self.key = normalize_judge(_first(answer_key))
+
+    def grade(self, user_answer: Any, full_score: float) -> GradeResult:
+        user_bool = normalize_judge(_first(user_answer))
+        is_correct = user_bool is not None and user_bool == self.key
+        return GradeResult(self.question_id, is_correct, full_score if is_correct else 0.0)
+
+
+class FillGrader(QuestionGrader):
+    """填空题：规范化后与任一标准答案相同即判对"""
+    __slots__ = ("keys",)
+
+    def __init__(self, question_id: int, answer_key: Any, version: Any = None):
+        super().__init__(question_id, version)
+        if isinstance(answer_key, list) and answer_key:
+            # 支持多个标准答案
+            self.keys = frozenset(normalize_text(str(a)) for a in answer_key)
+        else:
+            self.keys = frozenset({normalize_text(str(_first(answer_key)))})
+
+    def grade(self, user_answer: Any, full_score: float) -> GradeResult:
+        is_correct = normalize_text(str(_first(user_answer))) in self.keys
+        return GradeResult(self.question_id, is_correct, full_score if is_correct else 0.0)
+
+
+class ShortAnswerGrader(QuestionGrader):
+    """
+    简答题：关键词命中评分（MVP）
+    answer_json 形如 {"keywords": [...], "min_hit": 2}：
+      命中数 >= min_hit 得满分；有命中但不足得半分；无命中 0 分
+    answer_json 为关键词列表时：有命中得半分（不判对）
+    """
+    __slots__ = ("keywords", "min_hit")
+
+    def __init__(self, question_id: int, answer_key: Any, version: Any = None):
+        super().__init__(question_id, version)
+        if isinstance(answer_key, dict) and "keywords" in answer_key:
+            self.keywords: Tuple[str, ...] = tuple(str(k).lower() for k in answer_key.get("keywords", []))
+            self.min_hit: Optional[int] = int(answer_key.get("min_hit", max(1, len(self.keywords))))
+        elif isinstance(answer_key, list) and answer_key:
+            self.keywords = tuple(str(k).lower() for k in answer_key)
+            # 仅有关键词列表时没有满分规则
+            self.min_hit = None
+        else:
+            self.keywords = ()
+            self.min_hit = None
+
+    def grade(self, user_answer: Any, full_score: float) -> GradeResult:
+        user_text = str(_first(user_answer)).lower()
+        matched = [kw for kw in self.keywords if kw and kw in user_text]
+        hit = len(matched)
+
+        if self.min_hit is not None and hit >= self.min_hit:
+            return GradeResult(self.question_id, True, full_score, matched)
+        # 有命中但未达到满分规则：半分
+        score = full_score * 0.5 if hit > 0 else 0.0
+        return GradeResult(self.question_id, False, score, matched)
+
+
+_GRADER_TYPES = {
+    "SINGLE": SingleChoiceGrader,
+    "MULTI": MultiChoiceGrader,
+    "JUDGE": JudgeGrader,
+    "FILL": FillGrader,
+    "SHORT": ShortAnswerGrader,
+}
+
+# 进程内判分器缓存：question_id -> 判分器
+_grader_cache: Dict[int, QuestionGrader] = {}
+
+
+def compile_grader(
+    question_id: int,
+    question_type: str,
+    answer_json: Any,
+    version: Any = None
+) -> QuestionGrader:
+    """
+    将题目编译为判分器（按 question_id + version 缓存）
+
+    Args:
+        question_id: 题目ID
+        question_type: 题型
+        answer_json: 标准答案
+        version: 题目版本（一般为 updated_at），变化时重新编译
+
+    Returns:
+        QuestionGrader: 判分器
+    """
+    cached = _grader_cache.get(question_id)
+    if cached is not None and version is not None and cached.version == version:
+        return cached
+
+    grader_cls = _GRADER_TYPES.get(question_type)
+    if grader_cls is None:
+        grader = QuestionGrader(question_id, version)
+    else:
+        grader = grader_cls(question_id, answer_json, version)
+    if version is not None:
+        _grader_cache[question_id] = grader
+    return grader
+
+
+def compile_graders(questions: Iterable[Question]) -> Dict[int, QuestionGrader]:
+    """将一批 Question 编译为 {question_id: 判分器}"""
+    return {
+        q.id: compile_grader(q.id, q.type, q.answer_json, q.updated_at)
+        for q in questions
+    }
+
+
+def load_graders(db: Session, question_ids: Iterable[int]) -> Dict[int, QuestionGrader]:
+    """按题目ID批量加载判分器（只查询判分需要的列）"""
+    ids = list(set(question_ids))
+    if not ids:
+        return {}
+    stmt = select(Question.id, Question.type, Question.answer_json, Question.updated_at).where(
+        Question.id.in_(ids)
+    )
+    return {
+        row.id: compile_grader(row.id, row.type, row.answer_json, row.updated_at)
+        for row in db.execute(stmt).all()
+    }
+
+
+def invalidate_grader(question_id: Optional[int] = None):
+    """使判分器缓存失效（不传ID则清空）；题目修改/删除后调用，版本号之外再即时清掉本进程的旧判分器"""
+    if question_id is None:
+        _grader_cache.clear()
+    else:
+        _grader_cache.pop(question_id, None)
+
+
+def grade_attempt(
+    graders: Dict[int, QuestionGrader],
+    answers: Iterable[Any],
+    score_map: Dict[int, float],
+    default_score: float = DEFAULT_QUESTION_SCORE
+) -> AttemptGrade:
+    """
+    对一次作答的全部答案判分
+
+    Args:
+        graders: {question_id: 判分器}
+        answers: 带 question_id / answer_json 属性的答案记录
+        score_map: {question_id: 该题在试卷中的分值}
+        default_score: 缺失分值时的默认分
+
+    Returns:
+        AttemptGrade: 总分、答对数和逐题结果（题目不存在的答案跳过）
+    """
+    result = AttemptGrade()
+    for answer in answers:
+        grader = graders.get(answer.question_id)
+        if grader is None:
+            continue
+        full_score = score_map.get(answer.question_id, default_score)
+        result.add(grader.grade(answer.answer_json or [], full_score))
+    return result
+
+
+def grade_attempts(
+    graders: Dict[int, QuestionGrader],
+    answers_by_attempt: Dict[int, Sequence[Any]],
+    score_maps: Dict[int, Dict[int, float]],
+    default_score: float = DEFAULT_QUESTION_SCORE
+) -> Dict[int, AttemptGrade]:
+    """
+    一次遍历批量判分多份作答
+
+    Args:
+        graders: 所有作答涉及题目的判分器
+        answers_by_attempt: {attempt_id: 答案记录列表}
+        score_maps: {attempt_id: {question_id: 分值}}
+        default_score: 缺失分值时的默认分
+
+    Returns:
+        Dict[int, AttemptGrade]: {attempt_id: 判分结果}
+    """
+    return {
+        attempt_id: grade_attempt(graders, answers, score_maps.get(attempt_id, {}), default_score)
+        for attempt_id, answers in answers_by_attempt.items()
+    }
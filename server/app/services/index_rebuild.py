@@ -0,0 +1,54 @@
+"""
+进程内只读索引的单飞重建标记
+题库索引、知识点树索引失效后，同一时刻只让一个请求查询数据库重建，其余请求：
+- 已有旧索引时继续使用旧索引（重建完成前的短暂窗口内读到上一版本）
+- 冷启动没有旧索引时等待重建完成；重建者就在当前线程时（异步接口经 run_sync 调用，
+  事件循环上的其他协程正在重建）不能阻塞等待，否则重建者无法继续执行，只能自行重建
+  （应用启动时先建好索引，运行中只有 TTL 到期或版本号递增后的重建，此时都有旧索引可用）
+"""
+
+from typing import Optional
+import threading
+
+# 冷启动等待其他请求重建的最长时间（秒），超时后自行重建
+REBUILD_WAIT_SECONDS = 30.0
+
+
+class RebuildFlag:
+    """标记是否有请求正在重建索引（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done: Optional[threading.Event] = None
+        self._owner: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        """没有进行中的重建时登记当前请求为重建者并返回 True"""
+        with self._lock:
+            if self._done is not None:
+                return False
+            self._done = threading.Event()
+            self._owner = threading.get_ident()
+            return True
+
+    def release(self):
+        """重建结束（无论成功与否）：清除标记并唤醒等待者"""
+        with self._lock:
+            done, self._done, self._owner = self._done, None, None
+        if done is not None:
+            done.set()
+
+    def wait(self, timeout: float = REBUILD_WAIT_SECONDS) -> bool:
+        """
+        等待进行中的重建结束
+
+        Returns:
+            bool: 重建已结束返回 True；超时或重建者在当前线程（不能等待）返回 False
+        """
+        with self._lock:
+            done, owner = self._done, self._owner
+        if done is None:
+            return True
+        if owner == threading.get_ident():
+            return False
+        return done.wait(timeout)
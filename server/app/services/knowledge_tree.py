@@ -0,0 +1,239 @@
+"""
+知识点树内存索引服务
+一条 SELECT 读出全部知识点，按先序遍历（Euler-tour / 嵌套集合）编号：
+节点 v 的子树恰好是先序序列中的区间 [_tin[v], _tout[v])，叶子另按先序排成一列并记录区间，
+子树ID、叶子集合、祖先链、code -> 节点查询都在内存中完成
+
+失效方式：知识点增删改接口调用 bump_knowledge_version() 递增版本号，
+下一次读取时整体重建；多进程部署下另有 TTL 兜底
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from array import array
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+
+from ..core.config import settings
+from ..models.knowledge import KnowledgePoint
+from .index_rebuild import RebuildFlag
+
+
+class KnowledgeNode:
+    """知识点只读快照（与 KnowledgePoint 同名属性，脱离数据库会话使用）"""
+    __slots__ = ("id", "parent_id", "name", "code", "weight", "estimated_minutes")
+
+    def __init__(
+        self,
+        id: int,
+        parent_id: Optional[int],
+        name: str,
+        code: Optional[str],
+        weight: Optional[Decimal],
+        estimated_minutes: Optional[int]
+    ):
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.code = code
+        self.weight = weight
+        self.estimated_minutes = estimated_minutes
+
+    def __repr__(self):
+        return f"<KnowledgeNode(id={self.id}, name='{self.name}', code='{self.code}')>"
+
+
+class KnowledgeTreeIndex:
+    """
+    不可变知识点树索引
+    - _order: 先序遍历的节点ID，子树 v 为 _order[_tin[v]:_tout[v]]
+    - _leaf_order: 先序遍历中的叶子ID，子树 v 的叶子为 _leaf_order[_leaf_lo[v]:_leaf_hi[v]]
+    """
+    __slots__ = (
+        "version", "built_at", "_nodes", "_by_code", "_children", "_roots",
+        "_order", "_tin", "_tout", "_leaf_order", "_leaf_lo", "_leaf_hi",
+    )
+
+    def __init__(self, version: int, nodes: Iterable[KnowledgeNode]):
+        self.version = version
+        self.built_at = time.monotonic()
+        self._nodes: Dict[int, KnowledgeNode] = {}
+        self._by_code: Dict[str, KnowledgeNode] = {}
+        children: Dict[int, List[int]] = {}
+        roots: List[int] = []
+
+        for node in sorted(nodes, key=lambda n: n.id):
+            self._nodes[node.id] = node
+            if node.code:
+                self._by_code[node.code] = node
+        for node in self._nodes.values():
+            if node.parent_id is not None and node.parent_id in self._nodes:
+                children.setdefault(node.parent_id, []).append(node.id)
+            else:
+                roots.append(node.id)
+
+        self._children: Dict[int, Tuple[int, ...]] = {pid: tuple(ids) for pid, ids in children.items()}
+        self._roots: Tuple[int, ...] = tuple(roots)
+
+        # 迭代式先序遍历，出栈第二次时记录区间终点
+        self._order = array("i")
+        self._leaf_order = array("i")
+        self._tin: Dict[int, int] = {}
+        self._tout: Dict[int, int] = {}
+        self._leaf_lo: Dict[int, int] = {}
+        self._leaf_hi: Dict[int, int] = {}
+        for root in roots:
+            stack = [(root, False)]
+            while stack:
+                node_id, exiting = stack.pop()
+                if exiting:
+                    self._tout[node_id] = len(self._order)
+                    self._leaf_hi[node_id] = len(self._leaf_order)
+                    continue
+                if node_id in self._tin:
+                    # 数据异常（环）时跳过重复节点
+                    continue
+                self._tin[node_id] = len(self._order)
+                self._leaf_lo[node_id] = len(self._leaf_order)
+                self._order.append(node_id)
+                kids = self._children.get(node_id, ())
+                if not kids:
+                    self._leaf_order.append(node_id)
+                stack.append((node_id, True))
+                for child_id in reversed(kids):
+                    stack.append((child_id, False))
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, knowledge_id: int) -> bool:
+        return knowledge_id in self._nodes
+
+    def node(self, knowledge_id: int) -> Optional[KnowledgeNode]:
+        return self._nodes.get(knowledge_id)
+
+    def by_code(self, code: str) -> Optional[KnowledgeNode]:
+        """按 code 查找节点"""
+        return self._by_code.get(code)
+
+    def roots(self) -> List[KnowledgeNode]:
+        return [self._nodes[i] for i in self._roots]
+
+    def children(self, knowledge_id: int) -> List[KnowledgeNode]:
+        """直接子节点（按ID升序）"""
+        return [self._nodes[i] for i in self._children.get(knowledge_id, ())]
+
+    def is_leaf(self, knowledge_id: int) -> bool:
+        return knowledge_id in self._nodes and knowledge_id not in self._children
+
+    def subtree_ids(self, knowledge_id: int) -> List[int]:
+        """子树全部节点ID（含自身，先序）；节点不存在时返回空列表"""
+        lo = self._tin.get(knowledge_id)
+        if lo is None:
+            return []
+        return self._order[lo:self._tout[knowledge_id]].tolist()
+
+    def leaf_ids(self, knowledge_id: int) -> List[int]:
+        """子树中的叶子节点ID（先序；节点本身是叶子时只含自身）"""
+        lo = self._leaf_lo.get(knowledge_id)
+        if lo is None:
+            return []
+        return self._leaf_order[lo:self._leaf_hi[knowledge_id]].tolist()
+
+    def descendant_leaves(self, knowledge_id: int) -> List[KnowledgeNode]:
+        """子孙中的叶子节点（不含自身）"""
+        return [self._nodes[i] for i in self.leaf_ids(knowledge_id) if i != knowledge_id]
+
+    def ancestors(self, knowledge_id: int) -> List[int]:
+        """祖先ID链（由父节点到根，不含自身）"""
+        result = []
+        node = self._nodes.get(knowledge_id)
+        while node is not None and node.parent_id is not None and node.parent_id in self._nodes:
+            if node.parent_id in result:
+                break
+            result.append(node.parent_id)
+            node = self._nodes[node.parent_id]
+        return result
+
+    def is_ancestor(self, ancestor_id: int, knowledge_id: int) -> bool:
+        """ancestor_id 是否为 knowledge_id 的祖先或自身（O(1) 区间判断）"""
+        lo = self._tin.get(ancestor_id)
+        pos = self._tin.get(knowledge_id)
+        if lo is None or pos is None:
+            return False
+        return lo <= pos < self._tout[ancestor_id]
+
+
+_version = 0
+_tree: Optional[KnowledgeTreeIndex] = None
+_lock = threading.Lock()
+_rebuild = RebuildFlag()
+
+
+def bump_knowledge_version() -> int:
+    """知识点增删改后调用：递增版本号，使知识点树索引失效"""
+    global _version
+    with _lock:
+        _version += 1
+        return _version
+
+
+def _is_fresh(tree: Optional[KnowledgeTreeIndex]) -> bool:
+    if tree is None or tree.version != _version:
+        return False
+    ttl = settings.knowledge_tree_ttl_seconds
+    return ttl <= 0 or time.monotonic() - tree.built_at < ttl
+
+
+def build_knowledge_tree(db: Session, version: int) -> KnowledgeTreeIndex:
+    """从数据库构建知识点树索引（一条查询）"""
+    stmt = select(
+        KnowledgePoint.id,
+        KnowledgePoint.parent_id,
+        KnowledgePoint.name,
+        KnowledgePoint.code,
+        KnowledgePoint.weight,
+        KnowledgePoint.estimated_minutes
+    )
+    return KnowledgeTreeIndex(version, (KnowledgeNode(*row) for row in db.execute(stmt).all()))
+
+
+def get_knowledge_tree(db: Session) -> KnowledgeTreeIndex:
+    """
+    获取进程内知识点树索引（热路径不访问数据库）
+
+    Args:
+        db: 数据库会话，仅在索引失效需要重建时使用
+
+    Returns:
+        KnowledgeTreeIndex: 当前版本的只读索引
+    """
+    tree = _tree
+    if _is_fresh(tree):
+        return tree
+    # 与 get_question_index 相同：单飞重建，已有请求在重建时沿用旧索引或等待
+    if not _rebuild.try_acquire():
+        if tree is not None:
+            return tree
+        if _rebuild.wait() and _is_fresh(_tree):
+            return _tree
+        return _rebuild_tree(db)
+    try:
+        return _rebuild_tree(db)
+    finally:
+        _rebuild.release()
+
+
+def _rebuild_tree(db: Session) -> KnowledgeTreeIndex:
+    # 重建查询在锁外执行，只在替换时加锁
+    global _tree
+    version = _version
+    tree = build_knowledge_tree(db, version)
+    with _lock:
+        if _is_fresh(_tree):
+            return _tree
+        if version == _version:
+            _tree = tree
+        return tree
@@ -1,17 +1,90 @@
 """
 个性化模拟卷生成服务
 根据用户薄弱知识点智能生成模拟考试
+
+候选题目用一条窗口查询（ROW_NUMBER() OVER (PARTITION BY knowledge_id ...)）一次取出，
+每个薄弱知识点最多取固定条数；不足时按随机题目ID区间探测补题（每次探测一次主键范围查找），
+不再对全表 ORDER BY random()，生成耗时与题库规模无关
 """
 
 from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Collection, List, Sequence
 import random
 
 from ..models.question import Question
 from ..models.knowledge import QuestionKnowledgeMap, KnowledgePoint
 from ..models.progress import UserKnowledgeState
-from ..models.paper import Paper, PaperQuestion, Exam
+from ..models.paper import Exam
+from .paper_store import get_or_create_auto_paper
+from .seen_questions import load_seen_questions
+
+# 优先抽取的客观题题型与难度
+_OBJECTIVE_TYPES = ('SINGLE', 'MULTI', 'JUDGE')
+_MOCK_DIFFICULTIES = (1, 2, 3)
+# 每次ID区间探测最多取的连续题数（越小越分散，越大查询次数越少）
+_PROBE_RUN = 4
+
+
+def _weak_point_candidates(db: Session, kp_ids: Sequence[int], per_kp: int) -> List[int]:
+    """一条窗口查询取各薄弱知识点的随机候选题目ID，每个知识点最多 per_kp 条"""
+    ranked = select(
+        QuestionKnowledgeMap.question_id,
+        func.row_number().over(
+            partition_by=QuestionKnowledgeMap.knowledge_id,
+            order_by=func.random()
+        ).label("rn")
+    ).join(
+        Question, Question.id == QuestionKnowledgeMap.question_id
+    ).where(
+        QuestionKnowledgeMap.knowledge_id.in_(kp_ids),
+        Question.type.in_(_OBJECTIVE_TYPES),  # 优先选择客观题
+        Question.difficulty.in_(_MOCK_DIFFICULTIES)  # 中等难度
+    ).subquery()
+
+    stmt = select(ranked.c.question_id).where(ranked.c.rn <= per_kp)
+    # 一道题关联多个薄弱知识点时会出现多次，去重保持首次出现顺序
+    return list(dict.fromkeys(db.execute(stmt).scalars().all()))
+
+
+def _probe_random_questions(db: Session, need: int, exclude: Collection[int]) -> List[int]:
+    """
+    按随机题目ID区间探测补题：每次在 [min_id, max_id] 中取随机起点，按主键取其后连续几道客观题；
+    起点之后不足时从 min_id 绕回继续取，落在题库末尾的探测不会白白浪费
+
+    Args:
+        db: 数据库会话
+        need: 需要补充的题数
+        exclude: 已选题目ID
+
+    Returns:
+        List[int]: 最多 need 个题目ID（探测次数有上限，题库极稀疏时可能不足）
+    """
+    min_id, max_id = db.execute(select(func.min(Question.id), func.max(Question.id))).one()
+    if min_id is None:
+        return []
+    picked: List[int] = []
+    for _ in range(need * 4):
+        if len(picked) >= need:
+            break
+        start = random.randint(min_id, max_id)
+        run = min(need - len(picked), _PROBE_RUN)
+        stmt = select(Question.id).where(
+            Question.id >= start,
+            Question.type.in_(_OBJECTIVE_TYPES)
+        ).order_by(Question.id).limit(run)
+        question_ids = db.execute(stmt).scalars().all()
+        if len(question_ids) < run:
+            wrap_stmt = select(Question.id).where(
+                Question.id < start,
+                Question.type.in_(_OBJECTIVE_TYPES)
+            ).order_by(Question.id).limit(run - len(question_ids))
+            question_ids += db.execute(wrap_stmt).scalars().all()
+        for question_id in question_ids:
+            if question_id not in exclude and question_id not in picked:
+                picked.append(question_id)
+    return picked[:need]
 
 
 def generate_personalized_mock_exam(db: Session, user_id: int, count: int = 3, duration_minutes: int = 60) -> Exam:
@@ -48,78 +121,38 @@ def generate_personalized_mock_exam(db: Session, user_id: int, count: int = 3, d
     if not weak_kp_ids:
         raise Exception("暂无知识点数据，无法生成模拟卷")
 
-    # 2. 根据薄弱知识点获取题目，优先抽SINGLE/MULTI/JUDGE，难度1-3
-    question_candidates = []
-
-    for kp_id in weak_kp_ids:
-        # 获取该知识点的题目
-        kp_questions_stmt = select(Question).join(
-            QuestionKnowledgeMap,
-            Question.id == QuestionKnowledgeMap.question_id
-        ).where(
-            QuestionKnowledgeMap.knowledge_id == kp_id,
-            Question.type.in_(['SINGLE', 'MULTI', 'JUDGE']),  # 优先选择客观题
-            Question.difficulty.in_([1, 2, 3])  # 中等难度
-        )
-
-        questions = db.execute(kp_questions_stmt).scalars().all()
-        question_candidates.extend(questions)
-
-    # 去重
-    seen_ids = set()
-    unique_questions = []
-    for q in question_candidates:
-        if q.id not in seen_ids:
-            unique_questions.append(q)
-            seen_ids.add(q.id)
-
-    # 如果不够，补充其他题目
-    if len(unique_questions) < count:
-        remaining_count = count - len(unique_questions)
-        all_questions_stmt = select(Question).where(
-            Question.type.in_(['SINGLE', 'MULTI', 'JUDGE'])
-        ).order_by(func.random()).limit(remaining_count * 2)  # 多取一些用于去重
-
-        additional_questions = db.execute(all_questions_stmt).scalars().all()
-
-        for q in additional_questions:
-            if q.id not in seen_ids and len(unique_questions) < count:
-                unique_questions.append(q)
-                seen_ids.add(q.id)
-
-    if len(unique_questions) < count:
-        raise Exception(f"题库题目不足，无法生成{count}题的模拟卷")
+    # 2. 根据薄弱知识点获取题目，优先抽SINGLE/MULTI/JUDGE，难度1-3（每个知识点取有限条候选）
+    candidate_ids = _weak_point_candidates(db, weak_kp_ids, per_kp=max(2 * count, 20))
 
-    # 随机选择指定数量的题目
-    selected_questions = random.sample(unique_questions, count)
+    # 如果不够，按随机ID区间探测补充其他题目
+    if len(candidate_ids) < count:
+        candidate_ids.extend(_probe_random_questions(db, count - len(candidate_ids), set(candidate_ids)))
 
-    # 3. 创建Paper
-    paper = Paper(
-        title=f"个性化模拟考试 - {user_id}",
-        mode="AUTO",
+    if len(candidate_ids) < count:
+        raise Exception(f"题库题目不足，无法生成{count}题的模拟卷")
+
+    # 随机选择指定数量的题目：优先未作答过的题，不足时再从已作答的题中补齐
+    seen = load_seen_questions(db, user_id)
+    fresh = [question_id for question_id in candidate_ids if question_id not in seen]
+    if len(fresh) >= count:
+        selected_ids = random.sample(fresh, count)
+    else:
+        repeated = [question_id for question_id in candidate_ids if question_id in seen]
+        selected_ids = fresh + random.sample(repeated, count - len(fresh))
+        random.shuffle(selected_ids)
+
+    # 3-4. 创建或复用Paper及PaperQuestion（按有序题目与分值内容寻址）
+    paper, _ = get_or_create_auto_paper(
+        db,
+        title="个性化模拟考试",
+        question_ids=selected_ids,
+        scores=[2.0] * len(selected_ids),
+        created_by=user_id,
         config_json={
             "type": "personalized_mock",
-            "weak_knowledge_points": weak_kp_ids,
-            "count": count,
-            "generated_at": datetime.utcnow().isoformat()
-        },
-        total_score=float(count * 2.0),
-        created_by=user_id
+            "count": count
+        }
     )
-    db.add(paper)
-    db.flush()
-
-    # 4. 创建PaperQuestion
-    order_no = 1
-    for question in selected_questions:
-        pq = PaperQuestion(
-            paper_id=paper.id,
-            question_id=question.id,
-            order_no=order_no,
-            score=2.0
-        )
-        db.add(pq)
-        order_no += 1
 
     # 5. 创建Exam
     exam = Exam(
@@ -0,0 +1,302 @@
+"""
+模拟试卷预热池
+学生点击"生成模拟考试"时原本要同步完成五个模块抽题、补题与整卷写入；
+这里由后台线程按 (科目, 题量, 模块配比) 预先组好若干份试卷放入进程内队列：
+- 请求命中时 O(1) 取出一份试卷，只为该学生新增一行 Exam
+- 取走后唤醒补充线程异步补齐；补充时逐份提交、份与份之间暂停，晚高峰不与交卷争抢数据库写锁
+- 只预热 mock_pool_warm_counts 中的题量；未命中（池空或其他题量）时退化为同步组卷，不登记新配比，
+  学生传入的任意题量不会占用预热名额或让补充线程生成无人取用的试卷
+
+池中试卷是尚未被任何考试引用的 AUTO 试卷（content_hash 为空，不在 paper_reclaimer 回收范围内），
+进程重启后按试卷配置重新装入队列；多进程部署时各进程各自持有队列，同一份试卷可能被两个进程分别发出，
+试卷只读，共用不影响作答
+"""
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+import logging
+import threading
+import time
+
+from ..core.config import settings
+from ..models.paper import Exam, Paper
+from ..models.user import User
+from .paper_template import assemble_mock_paper, xingce_mock_ratio
+
+logger = logging.getLogger(__name__)
+
+# (科目, 题量, ((模块code, 题数), ...))
+PoolKey = Tuple[str, int, Tuple[Tuple[str, int], ...]]
+
+
+def pool_key(subject: str, total: int, ratio: Mapping[str, int]) -> PoolKey:
+    return subject, int(total), tuple(sorted((code, int(count)) for code, count in ratio.items()))
+
+
+class MockPaperPool:
+    """按配比分队列的预热试卷ID及命中统计（线程安全）"""
+
+    def __init__(self):
+        self._papers: "OrderedDict[PoolKey, Deque[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._demand = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.refilled = 0
+        self.refill_failures = 0
+        self.last_refill_at: Optional[datetime] = None
+
+    def register(self, key: PoolKey) -> bool:
+        """登记需要预热的配比（仅启动时按 mock_pool_warm_counts 登记），超过 mock_pool_max_keys 时不再登记"""
+        with self._lock:
+            if key in self._papers:
+                return True
+            if len(self._papers) >= settings.mock_pool_max_keys:
+                return False
+            self._papers[key] = deque()
+            return True
+
+    def take(self, key: PoolKey) -> Optional[int]:
+        """取出一份预热试卷ID；未命中返回 None。已登记的配比被取用后唤醒补充线程"""
+        with self._lock:
+            queue = self._papers.get(key)
+            if queue:
+                paper_id = queue.popleft()
+                self.hits += 1
+            else:
+                paper_id = None
+                self.misses += 1
+        if queue is not None:
+            self._demand.set()
+        return paper_id
+
+    def put(self, key: PoolKey, paper_id: int) -> bool:
+        """放入一份试卷；配比未登记时不放入，返回是否放入"""
+        with self._lock:
+            queue = self._papers.get(key)
+            if queue is None:
+                return False
+            queue.append(paper_id)
+            return True
+
+    def record_refill(self, key: PoolKey, paper_id: int):
+        """补充线程新组好一份试卷"""
+        with self._lock:
+            queue = self._papers.get(key)
+            if queue is not None:
+                queue.append(paper_id)
+            self.refilled += 1
+            self.last_refill_at = datetime.utcnow()
+
+    def record_failure(self):
+        with self._lock:
+            self.refill_failures += 1
+
+    def deficits(self) -> List[Tuple[PoolKey, int]]:
+        """各配比距目标容量的缺口"""
+        with self._lock:
+            return [
+                (key, settings.mock_pool_size - len(queue))
+                for key, queue in self._papers.items()
+                if len(queue) < settings.mock_pool_size
+            ]
+
+    def wait_for_demand(self, timeout: float) -> bool:
+        """等待取用唤醒或超时"""
+        woken = self._demand.wait(timeout)
+        self._demand.clear()
+        return woken
+
+    def wake(self):
+        self._demand.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "enabled": settings.mock_pool_enabled,
+                "running": _refill_thread is not None,
+                "target_size": settings.mock_pool_size,
+                "refill_pause_seconds": settings.mock_pool_refill_pause_seconds,
+                "refill_interval_seconds": settings.mock_pool_refill_interval_seconds,
+                "pools": [
+                    {"subject": subject, "count": total, "ratio": dict(ratio), "ready": len(queue)}
+                    for (subject, total, ratio), queue in self._papers.items()
+                ],
+                "ready": sum(len(queue) for queue in self._papers.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests, 4) if requests else None,
+                "refilled": self.refilled,
+                "refill_failures": self.refill_failures,
+                "last_refill_at": self.last_refill_at.isoformat() if self.last_refill_at else None
+            }
+
+
+_pool = MockPaperPool()
+
+
+def get_mock_pool() -> MockPaperPool:
+    return _pool
+
+
+def take_mock_paper(subject: str, total: int, ratio: Mapping[str, int]) -> Optional[int]:
+    """
+    取出一份预热的模拟试卷
+
+    Args:
+        subject: 科目类型
+        total: 总题目数量
+        ratio: 各模块抽题比例
+
+    Returns:
+        Optional[int]: 试卷ID；预热池未运行或未命中时返回 None，由调用方同步组卷
+    """
+    if _refill_thread is None:
+        return None
+    return _pool.take(pool_key(subject, total, ratio))
+
+
+def issue_mock_exam(db: Session, paper_id: int, subject: str, created_by: int) -> Exam:
+    """为预热试卷创建学生的模拟考试（提交事务）"""
+    exam = Exam(
+        paper_id=paper_id,
+        title=f"{subject}模拟考试 (模板化生成 {datetime.now().strftime('%Y-%m-%d %H:%M')})",
+        category="MOCK",
+        duration_minutes=60,
+        status="PUBLISHED",
+        created_by=created_by
+    )
+    db.add(exam)
+    db.commit()
+    return exam
+
+
+def _pool_creator(db: Session) -> Optional[int]:
+    """预热试卷记在最早的管理员名下"""
+    stmt = select(User.id).where(User.role == "ADMIN").order_by(User.id).limit(1)
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def reload_pooled_papers(db: Session, creator: int) -> int:
+    """进程启动：把未被考试引用的预热试卷重新装入已登记配比的队列，返回装入份数"""
+    stmt = select(Paper.id, Paper.config_json).where(
+        Paper.mode == "AUTO",
+        Paper.content_hash.is_(None),
+        Paper.created_by == creator,
+        ~exists().where(Exam.paper_id == Paper.id)
+    ).order_by(Paper.id)
+    loaded = 0
+    for paper_id, config in db.execute(stmt).all():
+        if not config or config.get("type") != "mock" or not config.get("ratio"):
+            continue
+        if _pool.put(pool_key(config["subject"], config["total_target"], config["ratio"]), paper_id):
+            loaded += 1
+    return loaded
+
+
+def refill_mock_pool(
+    db: Session,
+    pause_seconds: Optional[float] = None,
+    stop_event: Optional[threading.Event] = None
+) -> int:
+    """
+    逐份补齐各配比的预热试卷，每份一个事务
+
+    Args:
+        db: 数据库会话
+        pause_seconds: 两份试卷之间的暂停（默认 settings.mock_pool_refill_pause_seconds），即补充速率上限
+        stop_event: 置位后在两份试卷之间退出
+
+    Returns:
+        int: 本轮补充的份数
+    """
+    pause_seconds = settings.mock_pool_refill_pause_seconds if pause_seconds is None else pause_seconds
+    creator = _pool_creator(db)
+    if creator is None:
+        logger.warning("没有管理员账号，模拟试卷预热池暂不补充")
+        return 0
+
+    built = 0
+    for key, deficit in _pool.deficits():
+        subject, total, ratio = key
+        for _ in range(deficit):
+            if stop_event is not None and stop_event.is_set():
+                return built
+            try:
+                paper = assemble_mock_paper(db, subject=subject, total=total, ratio=dict(ratio), created_by=creator)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                _pool.record_failure()
+                logger.error(f"预热模拟试卷失败 {subject}/{total}: {e}")
+                break
+            _pool.record_refill(key, paper.id)
+            built += 1
+            if pause_seconds > 0:
+                if stop_event is None:
+                    time.sleep(pause_seconds)
+                elif stop_event.wait(pause_seconds):
+                    return built
+    return built
+
+
+_stop_event = threading.Event()
+_refill_thread: Optional[threading.Thread] = None
+
+
+def _refill_loop(interval: float):
+    from ..core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        creator = _pool_creator(db)
+        if creator is not None:
+            loaded = reload_pooled_papers(db, creator)
+            if loaded:
+                logger.info(f"模拟试卷预热池装入已有试卷 {loaded} 份")
+    except Exception as e:
+        logger.error(f"装入预热模拟试卷失败: {e}")
+    finally:
+        db.close()
+
+    while not _stop_event.is_set():
+        db = SessionLocal()
+        try:
+            refill_mock_pool(db, stop_event=_stop_event)
+        except Exception as e:
+            logger.error(f"补充模拟试卷预热池失败: {e}")
+        finally:
+            db.close()
+        _pool.wait_for_demand(interval)
+
+
+def start_mock_pool():
+    """应用启动：登记默认配比并启动补充线程（仅 mock_pool_enabled 时）"""
+    global _refill_thread
+    if not settings.mock_pool_enabled or _refill_thread is not None:
+        return
+    for count in settings.mock_pool_warm_counts:
+        _pool.register(pool_key("XINGCE", count, xingce_mock_ratio(count)))
+    _stop_event.clear()
+    _refill_thread = threading.Thread(
+        target=_refill_loop,
+        args=(settings.mock_pool_refill_interval_seconds,),
+        name="mock-pool-refill",
+        daemon=True,
+    )
+    _refill_thread.start()
+
+
+def stop_mock_pool():
+    """应用关闭：停止补充线程（队列中的试卷留在库中，下次启动重新装入）"""
+    global _refill_thread
+    if _refill_thread is None:
+        return
+    _stop_event.set()
+    _pool.wake()
+    _refill_thread.join(timeout=5)
+    _refill_thread = None
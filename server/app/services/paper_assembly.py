@@ -0,0 +1,522 @@
+"""
+约束组卷引擎
+管理员定义的组卷模板（PaperTemplate.spec_json）声明：
+- modules: 各模块（知识点 code）题量
+- difficulty_distribution: 难度分布权重，如 {"1": 1, "2": 2, "3": 2}
+- type_mix: 题型配比权重，如 {"SINGLE": 3, "MULTI": 1, "JUDGE": 1}（未列出的题型不参与组卷）
+- total_score: 试卷总分
+- exclude_recent_days: 排除窗口，近 N 天内组入过同类别管理员试卷的题目不再使用
+  （只看非内容寻址的试卷，即模板/手工组卷；学生自建的练习、模拟卷不占用题目）
+
+编译：模板按 (模块, 题型, 难度) 拆成单元格，每格持有分桶抽题池和题目位图（Python int，位号为题库索引下标），
+编译结果按 (模板更新时间, 题库索引版本, 知识点树版本) 缓存
+求解：先在计数层面贪心分配各单元格题量，再做局部修复（同模块内单元格间挪题）使题型/难度偏差最小，
+最后按单元格无放回抽题；无法满足的约束写入报告，不从模块外补题
+"""
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+
+from ..core.config import settings
+from ..models.paper import Exam, Paper, PaperQuestion, PaperTemplate
+from .knowledge_tree import get_knowledge_tree
+from .question_index import QUESTION_TYPES, QuestionIndex
+from .question_sampler import QuestionPool, get_question_sampler
+from .paper_store import create_exam, materialize_paper
+
+DIFFICULTY_LEVELS: Tuple[int, ...] = (1, 2, 3, 4, 5)
+
+# 排除窗口最多考察的最近试卷数，避免长窗口扫描全部历史试卷
+_RECENT_PAPER_LIMIT = 200
+
+# (题型, 难度)
+CellKey = Tuple[str, int]
+
+
+class _Cell:
+    """模块内一个 (题型, 难度) 单元格：抽题池 + 题目位图"""
+    __slots__ = ("pool", "bits")
+
+    def __init__(self, pool: QuestionPool, bits: int):
+        self.pool = pool
+        self.bits = bits
+
+
+class CompiledModule:
+    """模板中的一个模块"""
+    __slots__ = ("code", "name", "knowledge_id", "count", "cells")
+
+    def __init__(self, code: str, name: str, knowledge_id: Optional[int], count: int, cells: Dict[CellKey, _Cell]):
+        self.code = code
+        self.name = name
+        self.knowledge_id = knowledge_id
+        self.count = count
+        self.cells = cells
+
+
+class CompiledTemplate:
+    """编译后的组卷模板（只读，可跨请求复用）"""
+    __slots__ = (
+        "key", "template_id", "modules", "type_targets", "difficulty_targets",
+        "total_score", "exclude_recent_days", "errors",
+    )
+
+    def __init__(
+        self,
+        key: Tuple,
+        template_id: int,
+        modules: List[CompiledModule],
+        type_targets: Optional[Dict[str, int]],
+        difficulty_targets: Optional[Dict[int, int]],
+        total_score: float,
+        exclude_recent_days: int,
+        errors: List[str]
+    ):
+        self.key = key
+        self.template_id = template_id
+        self.modules = modules
+        self.type_targets = type_targets
+        self.difficulty_targets = difficulty_targets
+        self.total_score = total_score
+        self.exclude_recent_days = exclude_recent_days
+        self.errors = errors
+
+    @property
+    def total_count(self) -> int:
+        return sum(module.count for module in self.modules)
+
+
+class AssemblyResult:
+    """一次组卷的结果"""
+    __slots__ = ("question_ids", "scores", "report")
+
+    def __init__(self, question_ids: List[int], scores: List[float], report: Dict[str, Any]):
+        self.question_ids = question_ids
+        self.scores = scores
+        self.report = report
+
+
+def _apportion(weights: Dict[Any, float], total: int) -> Dict[Any, int]:
+    """按权重把 total 分配为整数（最大余数法）"""
+    weight_sum = sum(weights.values())
+    if weight_sum <= 0:
+        return {key: 0 for key in weights}
+    quotas = {key: total * w / weight_sum for key, w in weights.items()}
+    result = {key: int(q) for key, q in quotas.items()}
+    remainder = total - sum(result.values())
+    for key in sorted(quotas, key=lambda k: quotas[k] - result[k], reverse=True)[:remainder]:
+        result[key] += 1
+    return result
+
+
+def _bitset(index: QuestionIndex, question_ids: Iterable[int]) -> int:
+    """题目ID集合 -> 位图（位号为题库索引下标）"""
+    buf = bytearray(len(index) // 8 + 1)
+    for qid in question_ids:
+        slot = index.slot_of(qid)
+        if slot is not None:
+            buf[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buf, "little")
+
+
+def compile_template(db: Session, template: PaperTemplate) -> CompiledTemplate:
+    """
+    编译组卷模板
+
+    Args:
+        db: 数据库会话（仅在题库索引/知识点树需要重建时访问）
+        template: 组卷模板
+
+    Returns:
+        CompiledTemplate: 编译结果，模块 code 不存在等问题记录在 errors 中
+    """
+    sampler = get_question_sampler(db)
+    tree = get_knowledge_tree(db)
+    index = sampler.index
+    spec = template.spec_json or {}
+
+    type_mix = spec.get("type_mix") or None
+    difficulty_mix = spec.get("difficulty_distribution") or None
+    types = tuple(t for t in QUESTION_TYPES if type_mix is None or t in type_mix)
+    difficulties = tuple(
+        d for d in DIFFICULTY_LEVELS if difficulty_mix is None or str(d) in difficulty_mix or d in difficulty_mix
+    )
+
+    errors = []
+    modules = []
+    for item in spec.get("modules", []):
+        code = item["code"]
+        count = int(item["count"])
+        node = tree.by_code(code)
+        if node is None:
+            errors.append(f"模块 {code} 不存在")
+            modules.append(CompiledModule(code, code, None, count, {}))
+            continue
+
+        kp_ids = tree.subtree_ids(node.id)
+        cells = {}
+        for question_type in types:
+            for difficulty in difficulties:
+                pool = sampler.pool(kp_ids, question_types=(question_type,), difficulties=(difficulty,))
+                if len(pool):
+                    cells[(question_type, difficulty)] = _Cell(pool, _bitset(index, pool.iter_ids()))
+        modules.append(CompiledModule(code, node.name, node.id, count, cells))
+
+    total = sum(module.count for module in modules)
+    type_targets = None
+    if type_mix is not None:
+        type_targets = _apportion({t: float(type_mix[t]) for t in types}, total)
+    difficulty_targets = None
+    if difficulty_mix is not None:
+        difficulty_targets = _apportion(
+            {d: float(difficulty_mix.get(str(d), difficulty_mix.get(d, 0))) for d in difficulties}, total
+        )
+
+    return CompiledTemplate(
+        key=_template_key(template, sampler.index, tree),
+        template_id=template.id,
+        modules=modules,
+        type_targets=type_targets,
+        difficulty_targets=difficulty_targets,
+        total_score=float(spec.get("total_score", 100.0)),
+        exclude_recent_days=int(spec.get("exclude_recent_days", 0) or 0),
+        errors=errors
+    )
+
+
+def _template_key(template: PaperTemplate, index, tree) -> Tuple:
+    return (template.updated_at, index.version, index.built_at, tree.version, tree.built_at)
+
+
+_cache: "OrderedDict[int, CompiledTemplate]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_compiled_template(db: Session, template: PaperTemplate) -> CompiledTemplate:
+    """取缓存的编译结果；模板修改、题库或知识点树版本变化后重新编译"""
+    key = _template_key(template, get_question_sampler(db).index, get_knowledge_tree(db))
+    with _lock:
+        compiled = _cache.get(template.id)
+        if compiled is not None and compiled.key == key:
+            _cache.move_to_end(template.id)
+            return compiled
+
+    compiled = compile_template(db, template)
+    with _lock:
+        _cache[template.id] = compiled
+        _cache.move_to_end(template.id)
+        while len(_cache) > settings.paper_template_cache_size:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def invalidate_compiled_template(template_id: int):
+    """模板删除后移除编译缓存"""
+    with _lock:
+        _cache.pop(template_id, None)
+
+
+class _Plan:
+    """计数层面的分配状态：各单元格计划题量与题型/难度剩余需求（负数表示超出）"""
+
+    def __init__(self, compiled: CompiledTemplate, available: List[Dict[CellKey, int]]):
+        self.compiled = compiled
+        self.available = available
+        self.counts: List[Dict[CellKey, int]] = [{} for _ in compiled.modules]
+        self.rem_types = dict(compiled.type_targets) if compiled.type_targets is not None else None
+        self.rem_difficulties = dict(compiled.difficulty_targets) if compiled.difficulty_targets is not None else None
+
+    def add(self, m: int, cell: CellKey, delta: int):
+        self.counts[m][cell] = self.counts[m].get(cell, 0) + delta
+        question_type, difficulty = cell
+        if self.rem_types is not None:
+            self.rem_types[question_type] -= delta
+        if self.rem_difficulties is not None:
+            self.rem_difficulties[difficulty] -= delta
+
+    def spare(self, m: int, cell: CellKey) -> int:
+        return self.available[m].get(cell, 0) - self.counts[m].get(cell, 0)
+
+    def score(self, m: int, cell: CellKey) -> Tuple:
+        """贪心选格：先满足的约束维数，再剩余需求占比，再剩余可用题量"""
+        question_type, difficulty = cell
+        satisfied = 0
+        demand = 0.0
+        if self.rem_types is None:
+            satisfied += 1
+        elif self.rem_types[question_type] > 0:
+            satisfied += 1
+            demand += self.rem_types[question_type] / max(self.compiled.type_targets[question_type], 1)
+        if self.rem_difficulties is None:
+            satisfied += 1
+        elif self.rem_difficulties[difficulty] > 0:
+            satisfied += 1
+            demand += self.rem_difficulties[difficulty] / max(self.compiled.difficulty_targets[difficulty], 1)
+        return (satisfied, demand, self.spare(m, cell))
+
+    def pick(self, m: int, blocked: Iterable[CellKey] = ()) -> Optional[CellKey]:
+        blocked = set(blocked)
+        best = None
+        best_score = None
+        for cell in self.available[m]:
+            if cell in blocked or self.spare(m, cell) <= 0:
+                continue
+            score = self.score(m, cell)
+            if best_score is None or score > best_score:
+                best, best_score = cell, score
+        return best
+
+    def _move_delta(self, src: CellKey, dst: CellKey) -> int:
+        """把一道题从 src 挪到 dst 后总偏差的变化量"""
+        delta = 0
+        if self.rem_types is not None and src[0] != dst[0]:
+            a, b = self.rem_types[src[0]], self.rem_types[dst[0]]
+            delta += abs(a + 1) - abs(a) + abs(b - 1) - abs(b)
+        if self.rem_difficulties is not None and src[1] != dst[1]:
+            a, b = self.rem_difficulties[src[1]], self.rem_difficulties[dst[1]]
+            delta += abs(a + 1) - abs(a) + abs(b - 1) - abs(b)
+        return delta
+
+    def repair(self, max_moves: int):
+        """局部修复：同一模块内单元格间挪题，每次取偏差下降最多的一步，直到无法改进"""
+        if self.rem_types is None and self.rem_difficulties is None:
+            return
+        for _ in range(max_moves):
+            best = None
+            best_delta = 0
+            for m, counts in enumerate(self.counts):
+                for src, n in counts.items():
+                    if n <= 0:
+                        continue
+                    for dst in self.available[m]:
+                        if dst == src or self.spare(m, dst) <= 0:
+                            continue
+                        delta = self._move_delta(src, dst)
+                        if delta < best_delta:
+                            best, best_delta = (m, src, dst), delta
+            if best is None:
+                return
+            m, src, dst = best
+            self.add(m, src, -1)
+            self.add(m, dst, 1)
+
+
+def _recent_question_ids(db: Session, category: str, days: int, now: datetime) -> List[int]:
+    """近 N 天组入过同类别管理员试卷（content_hash 为空）的题目ID，最多考察最近 _RECENT_PAPER_LIMIT 份试卷"""
+    recent_papers = select(Paper.id).where(
+        Paper.content_hash.is_(None),
+        Paper.created_at >= now - timedelta(days=days),
+        exists().where(Exam.paper_id == Paper.id, Exam.category == category)
+    ).order_by(Paper.created_at.desc(), Paper.id.desc()).limit(_RECENT_PAPER_LIMIT).subquery()
+    stmt = select(PaperQuestion.question_id).join(
+        recent_papers, recent_papers.c.id == PaperQuestion.paper_id
+    ).distinct()
+    return db.execute(stmt).scalars().all()
+
+
+def _split_score(total_score: float, count: int) -> List[float]:
+    """总分按 0.1 分粒度平均分配到每道题"""
+    if count <= 0:
+        return []
+    base, extra = divmod(int(round(total_score * 10)), count)
+    return [(base + (1 if i < extra else 0)) / 10 for i in range(count)]
+
+
+def assemble_paper(db: Session, template: PaperTemplate, now: Optional[datetime] = None) -> AssemblyResult:
+    """
+    按模板求解组卷（只读，不写数据库）
+
+    Args:
+        db: 数据库会话
+        template: 组卷模板
+        now: 当前时间（排除窗口的基准）
+
+    Returns:
+        AssemblyResult: 选中的题目、每题分值和约束满足报告
+    """
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    compiled = get_compiled_template(db, template)
+    index = get_question_sampler(db).index
+
+    excluded_ids = set()
+    excluded_bits = 0
+    if compiled.exclude_recent_days > 0:
+        excluded_ids = set(_recent_question_ids(db, template.category, compiled.exclude_recent_days, now))
+        excluded_bits = _bitset(index, excluded_ids)
+
+    # 1. 各单元格可用题量（位图按位与后计数）
+    available = [
+        {cell: (c.bits & ~excluded_bits).bit_count() for cell, c in module.cells.items()}
+        for module in compiled.modules
+    ]
+    available = [{cell: n for cell, n in cells.items() if n > 0} for cells in available]
+    plan = _Plan(compiled, available)
+
+    # 2. 贪心分配：可用题量少的模块先分
+    order = sorted(range(len(compiled.modules)), key=lambda m: sum(available[m].values()))
+    for m in order:
+        for _ in range(compiled.modules[m].count):
+            cell = plan.pick(m)
+            if cell is None:
+                break
+            plan.add(m, cell, 1)
+
+    # 3. 修复题型/难度偏差
+    plan.repair(max_moves=compiled.total_count)
+
+    # 4. 按单元格抽题；多模块共享题目导致某格抽不足时，在同模块内按当前偏差改选其他单元格
+    blocked = set(excluded_ids)
+    selected: List[List[int]] = [[] for _ in compiled.modules]
+    for m in order:
+        module = compiled.modules[m]
+        exhausted = set()
+        for cell, n in list(plan.counts[m].items()):
+            if n <= 0:
+                continue
+            ids = module.cells[cell].pool.draw(n, exclude=blocked)
+            blocked.update(ids)
+            selected[m].extend(ids)
+            if len(ids) < n:
+                plan.add(m, cell, len(ids) - n)
+                exhausted.add(cell)
+        while len(selected[m]) < module.count:
+            cell = plan.pick(m, blocked=exhausted)
+            if cell is None:
+                break
+            ids = module.cells[cell].pool.draw(1, exclude=blocked)
+            if not ids:
+                exhausted.add(cell)
+                continue
+            blocked.update(ids)
+            selected[m].extend(ids)
+            plan.add(m, cell, 1)
+
+    question_ids = [qid for ids in selected for qid in ids]
+    report = _build_report(compiled, plan, selected, index, len(excluded_ids))
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return AssemblyResult(question_ids, _split_score(compiled.total_score, len(question_ids)), report)
+
+
+def _build_report(
+    compiled: CompiledTemplate,
+    plan: _Plan,
+    selected: List[List[int]],
+    index: QuestionIndex,
+    excluded_count: int
+) -> Dict[str, Any]:
+    """约束满足报告：逐项列出目标与实际，未满足的约束写入 unmet"""
+    unmet = list(compiled.errors)
+
+    modules = []
+    for module, ids in zip(compiled.modules, selected):
+        modules.append({
+            "code": module.code,
+            "name": module.name,
+            "target": module.count,
+            "actual": len(ids),
+            "question_ids": ids
+        })
+        if len(ids) < module.count:
+            unmet.append(f"模块 {module.name} 题目不足：需要{module.count}道，实际{len(ids)}道")
+
+    all_ids = [qid for ids in selected for qid in ids]
+    type_actual: Dict[str, int] = {}
+    difficulty_actual: Dict[int, int] = {}
+    for qid in all_ids:
+        question_type = index.type_of(qid)
+        difficulty = index.difficulty_of(qid)
+        type_actual[question_type] = type_actual.get(question_type, 0) + 1
+        difficulty_actual[difficulty] = difficulty_actual.get(difficulty, 0) + 1
+
+    type_mix = None
+    if compiled.type_targets is not None:
+        type_mix = {}
+        for question_type, target in compiled.type_targets.items():
+            actual = type_actual.get(question_type, 0)
+            type_mix[question_type] = {"target": target, "actual": actual}
+            if actual != target:
+                unmet.append(f"题型 {question_type}：目标{target}道，实际{actual}道")
+
+    difficulty_distribution = None
+    if compiled.difficulty_targets is not None:
+        difficulty_distribution = {}
+        for difficulty, target in compiled.difficulty_targets.items():
+            actual = difficulty_actual.get(difficulty, 0)
+            difficulty_distribution[str(difficulty)] = {"target": target, "actual": actual}
+            if actual != target:
+                unmet.append(f"难度 {difficulty}：目标{target}道，实际{actual}道")
+
+    return {
+        "template_id": compiled.template_id,
+        "total_target": compiled.total_count,
+        "total_actual": len(all_ids),
+        "total_score": compiled.total_score,
+        "modules": modules,
+        "type_mix": type_mix,
+        "difficulty_distribution": difficulty_distribution,
+        "excluded_recent": excluded_count,
+        "satisfied": not unmet,
+        "unmet": unmet
+    }
+
+
+def build_template_exam(
+    db: Session,
+    template: PaperTemplate,
+    created_by: int,
+    publish: bool = False
+) -> Tuple[Paper, Exam, Dict[str, Any]]:
+    """
+    按模板组卷并创建试卷与考试
+
+    Args:
+        db: 数据库会话
+        template: 组卷模板
+        created_by: 创建者用户ID
+        publish: 是否直接发布（否则为草稿）
+
+    Returns:
+        Tuple[Paper, Exam, Dict[str, Any]]: 创建的试卷、考试和约束满足报告
+
+    Raises:
+        ValueError: 一道题也抽不到时抛出异常
+    """
+    result = assemble_paper(db, template)
+    if not result.question_ids:
+        raise ValueError("题库题目不足，无法按模板组卷")
+
+    now = datetime.now()
+    paper = materialize_paper(
+        db,
+        title=f"{template.name} (模板组卷 {now.strftime('%Y-%m-%d %H:%M')})",
+        question_ids=result.question_ids,
+        scores=result.scores,
+        created_by=created_by,
+        config_json={
+            "type": "template",
+            "template_id": template.id,
+            "template_name": template.name,
+            "generation_rule": "声明式模板约束求解（贪心分配 + 局部修复）",
+            "generated_at": now.isoformat(),
+            **result.report
+        }
+    )
+
+    exam = create_exam(
+        db,
+        paper,
+        title=f"{template.name} ({now.strftime('%Y-%m-%d %H:%M')})",
+        category=template.category,
+        duration_minutes=template.duration_minutes,
+        created_by=created_by,
+        status="PUBLISHED" if publish else "DRAFT"
+    )
+
+    db.commit()
+    return paper, exam, result.report
@@ -0,0 +1,198 @@
+"""
+试卷题目载荷缓存
+同一试卷的题目列表（不含答案/解析）用一条 JOIN 查询渲染一次，按 paper_id 缓存，
+答题页恢复、开始考试等路径直接复用，耗时与试卷长度无关
+
+- 载荷（PaperPayload）：只读字典元组，供需要合并已保存答案的恢复接口使用
+- 快照（snapshot）：载荷序列化后的 JSON 字节，开始考试时直接拼接进响应体，不再重复序列化
+
+缓存键为 (paper_id, 内容版本)，内容版本取自题库内存索引（版本号 + 构建时间）：
+题目增删改接口递增版本号后所有试卷重新渲染；多进程部署下随索引 TTL 一起过期
+
+种子试卷（seeded_papers）没有题目行，题目列表按规则推导；需要按学生打乱顺序的试卷，
+缓存的是未打乱的载荷，传入 user_id 时再按学生打乱（快照随之按次序列化）
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import threading
+
+from ..core.config import settings
+from ..models.paper import Paper, PaperQuestion
+from ..models.question import Question
+from .question_index import get_question_index
+from .seeded_papers import option_orders_for_user, resolve_seeded_questions, seeded_rule, shuffle_for_user, shuffle_seed
+
+PaperPayload = Tuple[Dict[str, Any], ...]
+ContentVersion = Tuple[int, float]
+
+
+class _PaperEntry:
+    """单张试卷的缓存项：载荷 + 按需生成的序列化快照 + 按学生打乱使用的种子"""
+    __slots__ = ("version", "payload", "snapshot", "shuffle_seed")
+
+    def __init__(self, version: ContentVersion, payload: PaperPayload, shuffle_seed: Optional[int] = None):
+        self.version = version
+        self.payload = payload
+        self.snapshot: Optional[bytes] = None
+        self.shuffle_seed = shuffle_seed
+
+    def payload_for(self, user_id: Optional[int]) -> PaperPayload:
+        if self.shuffle_seed is None or user_id is None:
+            return self.payload
+        return shuffle_for_user(self.payload, self.shuffle_seed, user_id)
+
+
+_cache: "OrderedDict[int, _PaperEntry]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def dumps_json(value: Any) -> bytes:
+    """与 FastAPI JSONResponse 一致的紧凑 UTF-8 序列化"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _content_version(db: Session) -> ContentVersion:
+    index = get_question_index(db)
+    return (index.version, index.built_at)
+
+
+def _payload_item(order_no: int, row) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "order_no": order_no,
+        "question": {
+            "id": row.id,
+            "type": row.type,
+            "stem": row.stem,
+            "options_json": row.options_json
+        }
+    }
+
+
+def _render_seeded_payload(db: Session, paper_id: int, rule: Dict[str, Any]) -> PaperPayload:
+    """种子试卷：按推导出的题目顺序渲染"""
+    question_ids = resolve_seeded_questions(db, paper_id, rule)
+    stmt = select(
+        Question.id,
+        Question.type,
+        Question.stem,
+        Question.options_json
+    ).where(Question.id.in_(question_ids))
+    rows = {row.id: row for row in db.execute(stmt).all()}
+    return tuple(
+        _payload_item(order_no, rows[question_id])
+        for order_no, question_id in enumerate(question_ids, start=1)
+        if question_id in rows
+    )
+
+
+def render_paper_payload(db: Session, paper_id: int, config_json: Optional[Dict[str, Any]] = None) -> PaperPayload:
+    """一条 JOIN 查询渲染试卷题目列表（按 order_no 排序，不含标准答案）；种子试卷按规则推导"""
+    rule = seeded_rule(config_json)
+    if rule is not None:
+        return _render_seeded_payload(db, paper_id, rule)
+
+    stmt = select(
+        PaperQuestion.order_no,
+        Question.id,
+        Question.type,
+        Question.stem,
+        Question.options_json
+    ).join(
+        Question, Question.id == PaperQuestion.question_id
+    ).where(
+        PaperQuestion.paper_id == paper_id
+    ).order_by(PaperQuestion.order_no)
+
+    return tuple(_payload_item(row.order_no, row) for row in db.execute(stmt).all())
+
+
+def _get_entry(db: Session, paper_id: int) -> _PaperEntry:
+    version = _content_version(db)
+    with _lock:
+        entry = _cache.get(paper_id)
+        if entry is not None and entry.version == version:
+            _cache.move_to_end(paper_id)
+            return entry
+
+    config_json = db.execute(select(Paper.config_json).where(Paper.id == paper_id)).scalar_one_or_none()
+    entry = _PaperEntry(version, render_paper_payload(db, paper_id, config_json), shuffle_seed(config_json))
+    with _lock:
+        _cache[paper_id] = entry
+        _cache.move_to_end(paper_id)
+        while len(_cache) > settings.paper_cache_size:
+            _cache.popitem(last=False)
+    return entry
+
+
+def get_paper_payload(db: Session, paper_id: int, user_id: Optional[int] = None) -> PaperPayload:
+    """
+    获取试卷题目载荷（命中缓存时不访问数据库）
+
+    Args:
+        db: 数据库会话
+        paper_id: 试卷ID
+        user_id: 作答学生ID；试卷要求按学生打乱时据此确定题目/选项顺序
+
+    Returns:
+        PaperPayload: 只读的题目列表，调用方不要修改其中的字典
+    """
+    return _get_entry(db, paper_id).payload_for(user_id)
+
+
+def get_option_orders(db: Session, paper_id: int, user_id: int) -> Optional[Dict[int, List[int]]]:
+    """
+    学生在该试卷上看到的选项顺序（交卷时把作答字母换回原选项字母）
+
+    Returns:
+        Optional[Dict[int, List[int]]]: {题目ID: 展示位置 -> 原选项下标}；试卷不按学生打乱时为 None
+    """
+    entry = _get_entry(db, paper_id)
+    if entry.shuffle_seed is None:
+        return None
+    return option_orders_for_user(entry.payload, entry.shuffle_seed, user_id)
+
+
+def get_paper_snapshot(db: Session, paper_id: int, user_id: Optional[int] = None) -> bytes:
+    """
+    获取试卷题目快照（题目列表序列化后的 JSON 数组字节，不含标准答案）
+
+    Args:
+        db: 数据库会话
+        paper_id: 试卷ID
+        user_id: 作答学生ID；按学生打乱的试卷每次单独序列化
+
+    Returns:
+        bytes: 可直接拼接进响应体的 JSON 数组
+    """
+    entry = _get_entry(db, paper_id)
+    if entry.shuffle_seed is not None and user_id is not None:
+        return dumps_json(list(entry.payload_for(user_id)))
+    snapshot = entry.snapshot
+    if snapshot is None:
+        # 并发下可能重复序列化，结果相同，无需加锁
+        snapshot = entry.snapshot = dumps_json(list(entry.payload))
+    return snapshot
+
+
+def warm_paper_snapshot(db: Session, paper_id: int) -> int:
+    """预先渲染试卷快照（发布考试时调用），返回快照字节数"""
+    return len(get_paper_snapshot(db, paper_id))
+
+
+def invalidate_paper_payload(paper_id: Optional[int] = None):
+    """使试卷载荷缓存失效（不传ID则清空）"""
+    with _lock:
+        if paper_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(paper_id, None)
+
+
+def merge_saved_answers(payload: PaperPayload, saved: Dict[int, Any]) -> List[Dict[str, Any]]:
+    """把已保存答案合并进题目载荷（浅拷贝，不修改缓存）"""
+    return [{**item, "saved_answer": saved.get(item["id"])} for item in payload]
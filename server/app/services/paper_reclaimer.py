@@ -0,0 +1,169 @@
+"""
+自动组卷试卷回收服务
+学生侧每次点击"生成练习/复习/模拟"都会新增一条 Exam（内容相同的 Paper 已共用），
+其中大量从未开考；后台线程定期按批清理，使 exams / papers / paper_questions 不随时间无限增长：
+- 考试：学生创建、没有作答、没有学习计划任务引用、创建时间早于保留期
+- 试卷：内容寻址的 AUTO 试卷（content_hash 非空）、不再被任何考试引用、最近使用时间（updated_at，
+  get_or_create_auto_paper 复用时刷新）早于保留期；删除时重新检查这两个条件，不会删掉正在被复用的试卷
+
+管理员创建的考试与手工/模板试卷（content_hash 为空）不在回收范围内
+"""
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import logging
+import threading
+
+from ..core.config import settings
+from ..models.attempt import Attempt
+from ..models.paper import Exam, Paper, PaperQuestion
+from ..models.plan import PlanItem
+from ..models.user import User
+from .paper_cache import invalidate_paper_payload
+from .seeded_papers import forget_seeded_paper
+
+logger = logging.getLogger(__name__)
+
+
+def reclaim_unused_exams(db: Session, cutoff: datetime, limit: int) -> int:
+    """删除一批无人作答的学生自建考试，返回删除条数"""
+    stmt = select(Exam.id).join(
+        User, User.id == Exam.created_by
+    ).where(
+        User.role == "STUDENT",
+        Exam.created_at < cutoff,
+        ~exists().where(Attempt.exam_id == Exam.id),
+        ~exists().where(PlanItem.exam_id == Exam.id)
+    ).order_by(Exam.id).limit(limit)
+    exam_ids = db.execute(stmt).scalars().all()
+    if not exam_ids:
+        return 0
+
+    db.execute(
+        delete(Exam).where(
+            Exam.id.in_(exam_ids),
+            ~exists().where(Attempt.exam_id == Exam.id)
+        ).execution_options(synchronize_session=False)
+    )
+    return len(exam_ids)
+
+
+def reclaim_unreferenced_papers(db: Session, cutoff: datetime, limit: int) -> int:
+    """删除一批不再被考试引用的内容寻址试卷（连同题目行），返回删除条数"""
+    stmt = select(Paper.id).where(
+        Paper.mode == "AUTO",
+        Paper.content_hash.isnot(None),
+        Paper.updated_at < cutoff,
+        ~exists().where(Exam.paper_id == Paper.id)
+    ).order_by(Paper.id).limit(limit)
+    paper_ids = db.execute(stmt).scalars().all()
+    if not paper_ids:
+        return 0
+
+    # 删除时重新检查引用与最近使用时间：查询之后被复用（已刷新 updated_at 或已提交新考试）的试卷连同题目行一起保留
+    still_unused = select(Paper.id).where(
+        Paper.id.in_(paper_ids),
+        Paper.updated_at < cutoff,
+        ~exists().where(Exam.paper_id == Paper.id)
+    )
+    db.execute(
+        delete(PaperQuestion).where(
+            PaperQuestion.paper_id.in_(still_unused)
+        ).execution_options(synchronize_session=False)
+    )
+    db.execute(
+        delete(Paper).where(
+            Paper.id.in_(paper_ids),
+            Paper.updated_at < cutoff,
+            ~exists().where(Exam.paper_id == Paper.id)
+        ).execution_options(synchronize_session=False)
+    )
+    for paper_id in paper_ids:
+        invalidate_paper_payload(paper_id)
+        forget_seeded_paper(paper_id)
+    return len(paper_ids)
+
+
+def reclaim_auto_papers(
+    db: Session,
+    now: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+    stop_event: Optional[threading.Event] = None
+) -> Dict[str, int]:
+    """
+    分批回收无用考试与试卷，每批一个事务
+
+    Args:
+        db: 数据库会话
+        now: 当前时间
+        batch_size: 每批条数（默认 settings.paper_reclaim_batch_size）
+        stop_event: 置位后在批次之间退出
+
+    Returns:
+        Dict[str, int]: {"exams": 删除考试数, "papers": 删除试卷数}
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or settings.paper_reclaim_batch_size
+    cutoff = now - timedelta(hours=settings.paper_reclaim_retention_hours)
+    totals = {"exams": 0, "papers": 0}
+
+    # 先删考试，使其试卷变为无引用，再删试卷
+    for key, reclaim in (("exams", reclaim_unused_exams), ("papers", reclaim_unreferenced_papers)):
+        while stop_event is None or not stop_event.is_set():
+            try:
+                count = reclaim(db, cutoff, batch_size)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            totals[key] += count
+            if count < batch_size:
+                break
+
+    if totals["exams"] or totals["papers"]:
+        logger.info(f"回收自动组卷记录：考试 {totals['exams']} 条，试卷 {totals['papers']} 份")
+    return totals
+
+
+_stop_event = threading.Event()
+_reclaim_thread: Optional[threading.Thread] = None
+
+
+def _reclaim_loop(interval: float):
+    from ..core.database import SessionLocal
+
+    while not _stop_event.wait(interval):
+        db = SessionLocal()
+        try:
+            reclaim_auto_papers(db, stop_event=_stop_event)
+        except Exception as e:
+            logger.error(f"回收自动组卷记录失败: {e}")
+        finally:
+            db.close()
+
+
+def start_paper_reclaimer():
+    """应用启动：启动试卷回收线程（仅 paper_reclaimer_enabled 时）"""
+    global _reclaim_thread
+    if not settings.paper_reclaimer_enabled or _reclaim_thread is not None:
+        return
+    _stop_event.clear()
+    _reclaim_thread = threading.Thread(
+        target=_reclaim_loop,
+        args=(settings.paper_reclaim_interval_seconds,),
+        name="paper-reclaimer",
+        daemon=True,
+    )
+    _reclaim_thread.start()
+
+
+def stop_paper_reclaimer():
+    """应用关闭：停止试卷回收线程"""
+    global _reclaim_thread
+    if _reclaim_thread is None:
+        return
+    _stop_event.set()
+    _reclaim_thread.join(timeout=5)
+    _reclaim_thread = None
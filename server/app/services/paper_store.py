@@ -0,0 +1,215 @@
+"""
+试卷落库服务
+所有组卷入口共用的写入路径：
+- materialize_paper: 一条 INSERT 写 Paper，题目行用一条多行 insert() 批量写入（而不是逐个 db.add 后逐条 flush）
+- materialize_papers: 批量版本，一次 flush 写入多份试卷，所有题目行合并为一条多行 INSERT
+- create_exam: 挂接考试，随调用方 commit 一起写入
+整张试卷固定 3 条语句，与题量无关，缩短生成耗时与 SQLite 写锁持有时间
+
+学生侧自动生成的练习/复习/个性化模拟试卷按内容寻址：以有序题目ID与分值的哈希作为 papers.content_hash，
+内容相同的试卷共用一行 Paper 与其 PaperQuestion，每次生成只新增一行 Exam；
+共用的 Paper 会被其他学员复用，标题与组卷配置只能描述内容（不含学员ID、掌握度等个人信息），
+创建者记为最早的管理员，学员相关的信息只记在各自的 Exam 上
+
+并发下两个请求可能同时写入同一内容，此时会出现重复行但不影响正确性，
+查找时取最早的一行，多余的行由回收任务（paper_reclaimer）清理
+
+复用已有试卷时在同一事务中刷新 papers.updated_at（最近使用时间），回收任务按该列判断保留期：
+回收删除与复用更新争用同一行，先提交的一方胜出——回收先删则复用更新不到行、改为新建试卷，
+复用先更新则该试卷不再早于保留期，不会在挂接考试提交前被删
+"""
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+
+from ..models.paper import Exam, Paper, PaperQuestion
+from ..models.user import User
+
+
+def paper_content_hash(question_ids: Sequence[int], scores: Sequence[float]) -> str:
+    """有序题目ID + 分值的 SHA-256"""
+    digest = hashlib.sha256()
+    for question_id, score in zip(question_ids, scores):
+        digest.update(f"{question_id}:{float(score):.1f};".encode("ascii"))
+    return digest.hexdigest()
+
+
+def _paper_question_rows(
+    paper_id: int,
+    question_ids: Sequence[int],
+    scores: Sequence[float],
+    now: datetime
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "paper_id": paper_id,
+            "question_id": question_id,
+            "order_no": i + 1,
+            "score": score,
+            "created_at": now,
+            "updated_at": now
+        }
+        for i, (question_id, score) in enumerate(zip(question_ids, scores))
+    ]
+
+
+def insert_paper_questions(
+    db: Session,
+    paper_id: int,
+    question_ids: Sequence[int],
+    scores: Sequence[float]
+) -> None:
+    """一条多行 INSERT 写入试卷题目（order_no 从 1 开始）"""
+    if not question_ids:
+        return
+    db.execute(insert(PaperQuestion), _paper_question_rows(paper_id, question_ids, scores, datetime.utcnow()))
+
+
+def materialize_paper(
+    db: Session,
+    title: str,
+    question_ids: Sequence[int],
+    scores: Sequence[float],
+    created_by: int,
+    config_json: Optional[Dict[str, Any]] = None,
+    content_hash: Optional[str] = None
+) -> Paper:
+    """
+    写入试卷及其题目行（不提交事务，由调用方 commit）
+
+    Args:
+        db: 数据库会话
+        title: 试卷标题
+        question_ids: 有序题目ID
+        scores: 与题目一一对应的分值
+        created_by: 创建者用户ID
+        config_json: 组卷配置
+        content_hash: 内容哈希（仅内容寻址的自动组卷试卷）
+
+    Returns:
+        Paper: 已分配ID的试卷
+    """
+    paper = Paper(
+        title=title,
+        mode="AUTO",
+        config_json=config_json,
+        total_score=float(sum(scores)),
+        created_by=created_by,
+        content_hash=content_hash
+    )
+    db.add(paper)
+    db.flush()
+    insert_paper_questions(db, paper.id, question_ids, scores)
+    return paper
+
+
+def materialize_papers(
+    db: Session,
+    papers: Sequence[Tuple[str, Sequence[int], Sequence[float], Optional[Dict[str, Any]]]],
+    created_by: int
+) -> List[Paper]:
+    """
+    批量写入多份试卷及其题目行（不提交事务，由调用方 commit）
+
+    Args:
+        db: 数据库会话
+        papers: [(标题, 有序题目ID, 分值, 组卷配置)]
+        created_by: 创建者用户ID
+
+    Returns:
+        List[Paper]: 与输入顺序一致、已分配ID的试卷
+    """
+    rows = [
+        Paper(
+            title=title,
+            mode="AUTO",
+            config_json=config_json,
+            total_score=float(sum(scores)),
+            created_by=created_by
+        )
+        for title, _, scores, config_json in papers
+    ]
+    if not rows:
+        return rows
+    db.add_all(rows)
+    db.flush()
+
+    now = datetime.utcnow()
+    question_rows = []
+    for paper, (_, question_ids, scores, _) in zip(rows, papers):
+        question_rows.extend(_paper_question_rows(paper.id, question_ids, scores, now))
+    if question_rows:
+        db.execute(insert(PaperQuestion), question_rows)
+    return rows
+
+
+def create_exam(
+    db: Session,
+    paper: Paper,
+    title: str,
+    category: str,
+    duration_minutes: int,
+    created_by: int,
+    status: str = "PUBLISHED"
+) -> Exam:
+    """为试卷创建考试（随调用方 commit 写入）"""
+    exam = Exam(
+        paper_id=paper.id,
+        title=title,
+        category=category,
+        duration_minutes=duration_minutes,
+        status=status,
+        created_by=created_by
+    )
+    db.add(exam)
+    return exam
+
+
+def get_or_create_auto_paper(
+    db: Session,
+    title: str,
+    question_ids: Sequence[int],
+    scores: Sequence[float],
+    created_by: int,
+    config_json: Optional[Dict[str, Any]] = None
+) -> Tuple[Paper, bool]:
+    """
+    按内容查找或创建自动组卷试卷（不提交事务，由调用方 commit）
+
+    Args:
+        db: 数据库会话
+        title: 新建试卷时使用的标题（不含学员信息）
+        question_ids: 有序题目ID
+        scores: 与题目一一对应的分值
+        created_by: 发起组卷的学员；仅在系统中没有管理员时作为试卷创建者
+        config_json: 新建试卷时记录的组卷配置（不含学员信息；复用时保持首次生成的配置）
+        复用时刷新试卷的 updated_at，调用方须在同一事务中挂接考试
+
+    Returns:
+        Tuple[Paper, bool]: (试卷, 是否新建)
+    """
+    content_hash = paper_content_hash(question_ids, scores)
+    stmt = select(Paper).where(
+        Paper.content_hash == content_hash,
+        Paper.mode == "AUTO"
+    ).order_by(Paper.id).limit(1)
+    paper = db.execute(stmt).scalar_one_or_none()
+    if paper is not None:
+        # 标记最近使用（持有该行写锁至调用方提交）；更新不到说明刚被回收，按新建处理
+        touched = db.execute(
+            update(Paper).where(Paper.id == paper.id).values(updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if touched:
+            return paper, False
+        db.expunge(paper)
+
+    # 共用试卷不记在某个学员名下
+    owner = db.execute(
+        select(User.id).where(User.role == "ADMIN").order_by(User.id).limit(1)
+    ).scalar_one_or_none()
+    paper = materialize_paper(db, title, question_ids, scores, owner or created_by, config_json, content_hash)
+    return paper, True
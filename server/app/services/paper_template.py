@@ -3,15 +3,21 @@
 提供结构化的组卷算法，确保诊断试卷和模拟试卷按模块配比抽题
 """
 
-from sqlalchemy import select, func, update
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import Dict, Any, List, Tuple, Optional
-import random
+from typing import Container, Dict, Any, List, Tuple, Optional
 
-from ..models.paper import Exam, Paper, PaperQuestion
-from ..models.knowledge import KnowledgePoint, QuestionKnowledgeMap
-from ..models.question import Question
+from ..models.paper import Exam, Paper
+from .knowledge_tree import KnowledgeNode, get_knowledge_tree
+from .question_sampler import get_question_sampler
+from .paper_store import create_exam, materialize_paper
+
+# 模板组卷优先抽取的客观题题型
+OBJECTIVE_TYPES = ("SINGLE", "MULTI", "JUDGE")
+
+# 行测模拟卷的模块（知识点 code），顺序即余数分配顺序
+XINGCE_MOCK_MODULES = ("XINGCE_SL", "XINGCE_PD", "XINGCE_YY", "XINGCE_ZL", "XINGCE_CS")
 
 
 def build_diagnostic_paper(
@@ -47,46 +53,32 @@ def build_diagnostic_paper(
     if not module_nodes:
         raise ValueError(f"未找到{subject}科目的模块节点")
 
-    selected_questions = []
+    sampler = get_question_sampler(db)
+    selected_questions: List[int] = []
     selected_question_ids = set()
     module_stats = []
 
     for module in module_nodes:
-        module_questions = []
-        actual_strategy = ""
-
         # 从模块节点直接抽题（包括子树中的所有题目）
         kp_tree_ids = _get_knowledge_point_tree_ids(db, module.id)
-        questions = _get_questions_by_knowledge_points(
-            db, kp_tree_ids, question_types=['SINGLE', 'MULTI', 'JUDGE'], max_difficulty=3
-        )
-
-        if len(questions) >= per_module:
-            # 模块题目充足
-            available_questions = [q for q in questions if q.id not in selected_question_ids]
-            selected = _random_sample_questions(available_questions, per_module)
-            actual_strategy = "模块直接抽题"
-        else:
+        pool = sampler.pool(kp_tree_ids, question_types=OBJECTIVE_TYPES, max_difficulty=3)
+        selected = pool.draw(per_module, exclude=selected_question_ids)
+        actual_strategy = "模块直接抽题"
+
+        if len(selected) < per_module:
             # 策略2：扩大难度范围
-            questions = _get_questions_by_knowledge_points(
-                db, kp_tree_ids, question_types=['SINGLE', 'MULTI', 'JUDGE'], max_difficulty=4
-            )
-            available_questions = [q for q in questions if q.id not in selected_question_ids]
-            selected = _random_sample_questions(available_questions, per_module)
+            pool = sampler.pool(kp_tree_ids, question_types=OBJECTIVE_TYPES, max_difficulty=4)
+            selected = pool.draw(per_module, exclude=selected_question_ids)
             actual_strategy = "扩大难度范围"
 
-        # 如果还是不够，取所有可用题目
+        # 如果还是不够，已取到的就是全部可用题目
         if len(selected) < per_module:
-            all_available = [q for q in questions if q.id not in selected_question_ids]
-            selected = _random_sample_questions(all_available, min(per_module, len(all_available)))
             actual_strategy += " (题目不足)"
 
         # 记录选中的题目
-        selected_ids = []
-        for q in selected:
-            selected_question_ids.add(q.id)
-            selected_ids.append(q.id)
-            selected_questions.append(q)
+        selected_ids = list(selected)
+        selected_question_ids.update(selected)
+        selected_questions.extend(selected)
 
         # 统计信息
         module_stats.append({
@@ -97,7 +89,7 @@ def build_diagnostic_paper(
             "actual_count": len(selected),
             "strategy": actual_strategy,
             "question_ids": selected_ids,
-            "available_questions": len([q for q in questions if q.id not in selected_question_ids])
+            "available_questions": pool.available(selected_question_ids)
         })
 
     if not selected_questions:
@@ -117,37 +109,25 @@ def build_diagnostic_paper(
         "algorithm_description": f"诊断试卷生成：基于{subject}各模块配比抽题，优先保证模块覆盖，智能降级确保题目充足"
     }
 
-    # 创建试卷
-    paper = Paper(
+    # 创建试卷（题目行一条多行 INSERT 写入）
+    paper = materialize_paper(
+        db,
         title=f"{subject}基线诊断试卷 (模板化生成 {datetime.now().strftime('%Y-%m-%d %H:%M')})",
-        mode="AUTO",
-        config_json=paper_config,
-        total_score=float(len(selected_questions) * 2.0),
-        created_by=created_by
+        question_ids=selected_questions,
+        scores=[2.0] * len(selected_questions),
+        created_by=created_by,
+        config_json=paper_config
     )
-    db.add(paper)
-    db.flush()
-
-    # 添加题目到试卷
-    for i, question in enumerate(selected_questions):
-        paper_question = PaperQuestion(
-            paper_id=paper.id,
-            question_id=question.id,
-            order_no=i + 1,
-            score=2.0
-        )
-        db.add(paper_question)
 
     # 创建考试
-    exam = Exam(
-        paper_id=paper.id,
+    exam = create_exam(
+        db,
+        paper,
         title=f"{subject}基线诊断考试 (模板化生成 {datetime.now().strftime('%Y-%m-%d %H:%M')})",
         category="DIAGNOSTIC",
         duration_minutes=30,
-        status="PUBLISHED",
         created_by=created_by
     )
-    db.add(exam)
 
     # 归档旧的诊断考试
     _archive_existing_exams(db, "DIAGNOSTIC")
@@ -156,15 +136,66 @@ def build_diagnostic_paper(
     return paper, exam
 
 
+def xingce_mock_ratio(total: int) -> Dict[str, int]:
+    """行测模拟卷默认配比：平均分配到 5 个模块，余数依次分给前几个模块（key 必须等于知识点 code）"""
+    base_count, remainder = divmod(total, len(XINGCE_MOCK_MODULES))
+    return {
+        code: base_count + (1 if i < remainder else 0)
+        for i, code in enumerate(XINGCE_MOCK_MODULES)
+    }
+
+
 def build_mock_paper(
     db: Session,
     subject: str = "XINGCE",
     total: int = 20,
     ratio: Optional[Dict[str, int]] = None,
-    created_by: int = 1
+    created_by: int = 1,
+    avoid: Optional[Container[int]] = None
 ) -> Tuple[Paper, Exam]:
     """
-    构建模拟试卷：严格按指定比例从各模块抽题
+    构建模拟试卷并创建考试（提交事务），组卷规则见 assemble_mock_paper
+
+    Args:
+        db: 数据库会话
+        subject: 科目类型 ("XINGCE" 或 "SHENLUN")
+        total: 总题目数量
+        ratio: 各模块抽题比例
+        created_by: 创建者用户ID
+        avoid: 尽量避开的题目ID（学生已作答集合）
+
+    Returns:
+        Tuple[Paper, Exam]: 创建的试卷和考试对象
+
+    Raises:
+        ValueError: 当题库不足时抛出异常
+    """
+    paper = assemble_mock_paper(db, subject=subject, total=total, ratio=ratio, created_by=created_by, avoid=avoid)
+
+    # 创建考试
+    exam = create_exam(
+        db,
+        paper,
+        title=f"{subject}模拟考试 (模板化生成 {datetime.now().strftime('%Y-%m-%d %H:%M')})",
+        category="MOCK",
+        duration_minutes=60,
+        created_by=created_by
+    )
+
+    db.commit()
+    return paper, exam
+
+
+def assemble_mock_paper(
+    db: Session,
+    subject: str = "XINGCE",
+    total: int = 20,
+    ratio: Optional[Dict[str, int]] = None,
+    created_by: int = 1,
+    avoid: Optional[Container[int]] = None
+) -> Paper:
+    """
+    组模拟试卷：严格按指定比例从各模块抽题（只写入试卷，不创建考试、不提交事务）
 
     Args:
         db: 数据库会话
@@ -173,9 +204,10 @@ def build_mock_paper(
         ratio: 各模块抽题比例，如 {"YY":4, "SL":4, "PD":4, "ZL":4, "CS":4}
                如果为None，则平均分配
         created_by: 创建者用户ID
+        avoid: 尽量避开的题目ID（学生已作答集合），各模块先抽未作答的题，不足时再从中补齐
 
     Returns:
-        Tuple[Paper, Exam]: 创建的试卷和考试对象
+        Paper: 已分配ID的试卷
 
     Raises:
         ValueError: 当题库不足时抛出异常
@@ -209,7 +241,8 @@ def build_mock_paper(
             else:
                 module_counts[module.code] = 0
 
-    selected_questions = []
+    sampler = get_question_sampler(db)
+    selected_questions: List[int] = []
     selected_question_ids = set()
     module_stats = []
     warnings = []
@@ -226,12 +259,9 @@ def build_mock_paper(
             continue
 
         leaf_kp_ids = [node.id for node in leaf_nodes]
-        questions = _get_questions_by_knowledge_points(
-            db, leaf_kp_ids, question_types=['SINGLE', 'MULTI', 'JUDGE'], max_difficulty=4
-        )
-
-        available_questions = [q for q in questions if q.id not in selected_question_ids]
-        actual_selected = _random_sample_questions(available_questions, target_count)
+        pool = sampler.pool(leaf_kp_ids, question_types=OBJECTIVE_TYPES, max_difficulty=4)
+        available_count = pool.available(selected_question_ids)
+        actual_selected = pool.draw(target_count, exclude=selected_question_ids, avoid=avoid)
 
         # 如果题目不足，记录警告
         if len(actual_selected) < target_count:
@@ -240,11 +270,9 @@ def build_mock_paper(
             )
 
         # 记录选中的题目
-        selected_ids = []
-        for q in actual_selected:
-            selected_question_ids.add(q.id)
-            selected_ids.append(q.id)
-            selected_questions.append(q)
+        selected_ids = list(actual_selected)
+        selected_question_ids.update(actual_selected)
+        selected_questions.extend(actual_selected)
 
         module_stats.append({
             "module_id": module.id,
@@ -252,7 +280,7 @@ def build_mock_paper(
             "module_code": module.code,
             "target_count": target_count,
             "actual_count": len(actual_selected),
-            "available_questions": len(available_questions),
+            "available_questions": available_count,
             "question_ids": selected_ids
         })
 
@@ -263,16 +291,13 @@ def build_mock_paper(
         warnings.append(f"总题目不足：需要{total}道，实际{total_selected}道，缺口{shortfall}道")
 
         # 从所有可用题目中补齐
-        all_questions = _get_questions_by_knowledge_points(
-            db, None, question_types=['SINGLE', 'MULTI', 'JUDGE'], max_difficulty=4
-        )
-        available_supplement = [q for q in all_questions if q.id not in selected_question_ids]
-
-        supplement_selected = _random_sample_questions(available_supplement, shortfall)
+        supplement_pool = sampler.pool(None, question_types=OBJECTIVE_TYPES, max_difficulty=4)
+        supplement_selected = supplement_pool.draw(shortfall, exclude=selected_question_ids, avoid=avoid)
+        selected_question_ids.update(supplement_selected)
         selected_questions.extend(supplement_selected)
 
         # 记录补齐信息
-        supplement_ids = [q.id for q in supplement_selected]
+        supplement_ids = list(supplement_selected)
         module_stats.append({
             "module_name": "补充题目",
             "module_code": "SUPPLEMENT",
@@ -298,43 +323,18 @@ def build_mock_paper(
         "algorithm_description": f"模拟试卷生成：基于{subject}各模块严格比例配比，确保知识点分布均衡"
     }
 
-    # 创建试卷
-    paper = Paper(
+    # 创建试卷（题目行一条多行 INSERT 写入）
+    return materialize_paper(
+        db,
         title=f"{subject}模拟考试 (模板化生成 {datetime.now().strftime('%Y-%m-%d %H:%M')})",
-        mode="AUTO",
-        config_json=paper_config,
-        total_score=float(final_total * 2.0),
-        created_by=created_by
+        question_ids=selected_questions,
+        scores=[2.0] * len(selected_questions),
+        created_by=created_by,
+        config_json=paper_config
     )
-    db.add(paper)
-    db.flush()
-
-    # 添加题目到试卷
-    for i, question in enumerate(selected_questions):
-        paper_question = PaperQuestion(
-            paper_id=paper.id,
-            question_id=question.id,
-            order_no=i + 1,
-            score=2.0
-        )
-        db.add(paper_question)
 
-    # 创建考试
-    exam = Exam(
-        paper_id=paper.id,
-        title=f"{subject}模拟考试 (模板化生成 {datetime.now().strftime('%Y-%m-%d %H:%M')})",
-        category="MOCK",
-        duration_minutes=60,
-        status="PUBLISHED",
-        created_by=created_by
-    )
-    db.add(exam)
-
-    db.commit()
-    return paper, exam
 
-
-def _get_subject_module_nodes(db: Session, subject: str) -> List[KnowledgePoint]:
+def _get_subject_module_nodes(db: Session, subject: str) -> List[KnowledgeNode]:
     """获取指定科目的模块节点"""
     # 根据subject找到对应的分类节点
     if subject == "XINGCE":
@@ -345,97 +345,23 @@ def _get_subject_module_nodes(db: Session, subject: str) -> List[KnowledgePoint]
         return []
 
     # 获取分类节点
-    stmt = select(KnowledgePoint).where(KnowledgePoint.code == category_code)
-    category_node = db.execute(stmt).scalar_one_or_none()
+    tree = get_knowledge_tree(db)
+    category_node = tree.by_code(category_code)
     if not category_node:
         return []
 
     # 获取该分类下的所有直接子节点（模块）
-    stmt = select(KnowledgePoint).where(KnowledgePoint.parent_id == category_node.id)
-    return db.execute(stmt).scalars().all()
+    return tree.children(category_node.id)
 
 
-def _get_module_leaf_nodes(db: Session, module_id: int) -> List[KnowledgePoint]:
+def _get_module_leaf_nodes(db: Session, module_id: int) -> List[KnowledgeNode]:
     """获取模块下的所有叶子节点（最底层的知识点）"""
-    all_nodes = []
-    _collect_module_nodes(db, module_id, all_nodes)
-
-    # 过滤出叶子节点（没有子节点的节点）
-    leaf_nodes = []
-    for node in all_nodes:
-        stmt = select(func.count()).select_from(KnowledgePoint).where(KnowledgePoint.parent_id == node.id)
-        child_count = db.execute(stmt).scalar()
-        if child_count == 0:
-            leaf_nodes.append(node)
-
-    return leaf_nodes
-
-
-def _collect_module_nodes(db: Session, parent_id: int, nodes: List[KnowledgePoint]):
-    """递归收集模块下的所有节点"""
-    stmt = select(KnowledgePoint).where(KnowledgePoint.parent_id == parent_id)
-    children = db.execute(stmt).scalars().all()
-
-    for child in children:
-        nodes.append(child)
-        _collect_module_nodes(db, child.id, nodes)
+    return get_knowledge_tree(db).descendant_leaves(module_id)
 
 
 def _get_knowledge_point_tree_ids(db: Session, root_kp_id: int) -> List[int]:
     """获取知识点树的所有节点ID（包括子孙节点）"""
-    ids = []
-    _collect_child_ids(db, root_kp_id, ids)
-    return ids
-
-
-def _collect_child_ids(db: Session, parent_id: int, ids: List[int]):
-    """递归收集子节点ID"""
-    ids.append(parent_id)
-    stmt = select(KnowledgePoint.id).where(KnowledgePoint.parent_id == parent_id)
-    children = db.execute(stmt).scalars().all()
-
-    for child_id in children:
-        _collect_child_ids(db, child_id, ids)
-
-
-def _get_questions_by_knowledge_points(
-    db: Session,
-    kp_ids: Optional[List[int]],
-    question_types: Optional[List[str]],
-    max_difficulty: int
-) -> List[Question]:
-    """获取指定知识点相关的题目"""
-    if kp_ids is None:
-        # 获取所有题目的情况
-        base_stmt = select(Question).where(Question.difficulty <= max_difficulty)
-        if question_types:
-            base_stmt = base_stmt.where(Question.type.in_(question_types))
-        stmt = base_stmt
-    else:
-        if not kp_ids:
-            return []
-
-        base_stmt = select(Question).join(
-            QuestionKnowledgeMap, Question.id == QuestionKnowledgeMap.question_id
-        ).where(
-            QuestionKnowledgeMap.knowledge_id.in_(kp_ids),
-            Question.difficulty <= max_difficulty
-        )
-        if question_types:
-            base_stmt = base_stmt.where(Question.type.in_(question_types))
-        stmt = base_stmt.distinct()
-
-    questions = db.execute(stmt).scalars().all()
-    # 在应用层随机排序
-    random.shuffle(questions)
-    return questions
-
-
-def _random_sample_questions(questions: List[Question], count: int) -> List[Question]:
-    """从题目列表中随机抽取指定数量的题目"""
-    if len(questions) <= count:
-        return questions
-    return random.sample(questions, count)
+    return get_knowledge_tree(db).subtree_ids(root_kp_id) or [root_kp_id]
 
 
 def build_xingce_diagnostic_exam(
@@ -470,19 +396,16 @@ def build_xingce_diagnostic_exam(
     # 行测五模块code
     xingce_modules = ["XINGCE_CS", "XINGCE_YY", "XINGCE_SL", "XINGCE_PD", "XINGCE_ZL"]
 
-    selected_questions = []
+    sampler = get_question_sampler(db)
+    selected_questions: List[int] = []
     selected_question_ids = set()
     module_stats = []
     warnings = []
 
     for module_code in xingce_modules:
-        module_questions = []
-        actual_count = 0
-        strategy_used = ""
 
         # 获取模块节点
-        stmt = select(KnowledgePoint).where(KnowledgePoint.code == module_code)
-        module_node = db.execute(stmt).scalar_one_or_none()
+        module_node = get_knowledge_tree(db).by_code(module_code)
 
         if not module_node:
             warnings.append(f"模块 {module_code} 不存在")
@@ -492,43 +415,23 @@ def build_xingce_diagnostic_exam(
         module_tree_ids = _get_knowledge_point_tree_ids(db, module_node.id)
 
         # 策略1：从模块抽题，优先客观题，控制难度
-        questions = _get_questions_by_knowledge_points(
-            db, module_tree_ids,
-            question_types=['SINGLE', 'MULTI', 'JUDGE'],
-            max_difficulty=max_difficulty
-        )
-
-        if len(questions) >= per_module:
-            # 模块题目充足
-            available_questions = [q for q in questions if q.id not in selected_question_ids]
-            selected = _random_sample_questions(available_questions, per_module)
-            actual_count = len(selected)
-            strategy_used = f"模块直接抽题 (难度<={max_difficulty})"
-        else:
-            # 策略2：扩大难度范围
-            questions = _get_questions_by_knowledge_points(
-                db, module_tree_ids,
-                question_types=['SINGLE', 'MULTI', 'JUDGE'],
-                max_difficulty=4  # 扩大到难度4
-            )
-            available_questions = [q for q in questions if q.id not in selected_question_ids]
-            selected = _random_sample_questions(available_questions, per_module)
-            actual_count = len(selected)
+        pool = sampler.pool(module_tree_ids, question_types=OBJECTIVE_TYPES, max_difficulty=max_difficulty)
+        selected = pool.draw(per_module, exclude=selected_question_ids)
+        strategy_used = f"模块直接抽题 (难度<={max_difficulty})"
+
+        if len(selected) < per_module:
+            # 策略2：扩大难度范围（扩大到难度4）
+            pool = sampler.pool(module_tree_ids, question_types=OBJECTIVE_TYPES, max_difficulty=4)
+            selected = pool.draw(per_module, exclude=selected_question_ids)
             strategy_used = f"扩大难度范围 (难度<=4)"
 
         # 如果还是不够，策略3：包含所有题型
         if len(selected) < per_module:
-            questions = _get_questions_by_knowledge_points(
-                db, module_tree_ids,
-                question_types=None,  # 所有题型
-                max_difficulty=4
-            )
-            available_questions = [q for q in questions if q.id not in selected_question_ids]
+            pool = sampler.pool(module_tree_ids, question_types=None, max_difficulty=4)
             additional_needed = per_module - len(selected)
-            additional_selected = _random_sample_questions(available_questions, additional_needed)
-            selected.extend(additional_selected)
-            actual_count = len(selected)
+            selected.extend(pool.draw(additional_needed, exclude=selected_question_ids.union(selected)))
             strategy_used += f" + 包含主观题"
+        actual_count = len(selected)
 
         # 如果还不够，记录警告并取所有可用题目
         if len(selected) < per_module:
@@ -537,9 +440,8 @@ def build_xingce_diagnostic_exam(
             )
 
         # 记录选中的题目
-        for q in selected:
-            selected_question_ids.add(q.id)
-            selected_questions.append(q)
+        selected_question_ids.update(selected)
+        selected_questions.extend(selected)
 
         # 统计信息
         module_stats.append({
@@ -548,7 +450,7 @@ def build_xingce_diagnostic_exam(
             "target_count": per_module,
             "actual_count": actual_count,
             "strategy": strategy_used,
-            "available_questions": len([q for q in questions if q.id not in selected_question_ids])
+            "available_questions": pool.available(selected_question_ids)
         })
 
     if not selected_questions:
@@ -568,37 +470,25 @@ def build_xingce_diagnostic_exam(
         "algorithm_description": "行测诊断试卷生成：基于CS/YY/SL/PD/ZL五模块均衡覆盖，确保知识点分布均衡"
     }
 
-    # 创建试卷
-    paper = Paper(
+    # 创建试卷（题目行一条多行 INSERT 写入）
+    paper = materialize_paper(
+        db,
         title=f"行测诊断试卷 (五模块均衡 {datetime.now().strftime('%Y-%m-%d %H:%M')})",
-        mode="AUTO",
-        config_json=paper_config,
-        total_score=float(len(selected_questions) * 2.0),
-        created_by=created_by
+        question_ids=selected_questions,
+        scores=[2.0] * len(selected_questions),
+        created_by=created_by,
+        config_json=paper_config
     )
-    db.add(paper)
-    db.flush()
-
-    # 添加题目到试卷
-    for i, question in enumerate(selected_questions):
-        paper_question = PaperQuestion(
-            paper_id=paper.id,
-            question_id=question.id,
-            order_no=i + 1,
-            score=2.0
-        )
-        db.add(paper_question)
 
     # 创建考试
-    exam = Exam(
-        paper_id=paper.id,
+    exam = create_exam(
+        db,
+        paper,
         title=f"行测诊断考试 (五模块均衡 {datetime.now().strftime('%Y-%m-%d %H:%M')})",
         category="DIAGNOSTIC",
         duration_minutes=45,  # 行测诊断考试时长
-        status="PUBLISHED",
         created_by=created_by
     )
-    db.add(exam)
 
     # 归档旧的诊断考试
     _archive_existing_exams(db, "DIAGNOSTIC")
@@ -608,10 +498,11 @@ def build_xingce_diagnostic_exam(
 
 
 def _archive_existing_exams(db: Session, category: str):
-    """将现有的已发布考试归档"""
+    """将现有的已发布考试归档（指定学员的考试不受影响）"""
     stmt = update(Exam).where(
         Exam.category == category,
-        Exam.status == "PUBLISHED"
+        Exam.status == "PUBLISHED",
+        Exam.assigned_user_id.is_(None)
     ).values(status="ARCHIVED")
 
     db.execute(stmt)
@@ -0,0 +1,118 @@
+"""
+活跃学习计划响应缓存
+学习计划页每次刷新都要读取全部计划项并按日期分组；计划内容只在少数写路径上变化，
+这里把 GET /plans/active 的完整响应序列化后按 (plan_id, 计划版本) 缓存，
+命中时只需一条按学员查询活跃计划 (id, version) 的查询
+
+learning_plans.version 在以下写路径递增（plan_version_bump）：
+- 计划项状态更新、开始任务关联考试
+- 交卷自动完成计划任务
+- 增量重排与夜间刷新；全量重排（及目标变化后的夜间刷新）生成新计划（新 plan_id）
+- 修改计划所属目标（响应中包含目标信息）
+版本号存在数据库中，多进程部署下各进程的缓存同样按版本失效
+"""
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import Update
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import threading
+
+from ..core.config import settings
+from ..models.plan import Goal, LearningPlan, PlanItem
+from .paper_cache import dumps_json
+
+# plan_id -> (version, body)
+_cache: "OrderedDict[int, Tuple[int, bytes]]" = OrderedDict()
+_lock = threading.Lock()
+
+_NO_PLAN = b"null"
+
+
+def plan_version_bump(*criteria) -> Update:
+    """递增满足条件的学习计划版本号（返回语句，同步/异步会话均可执行）"""
+    return update(LearningPlan).where(*criteria).values(
+        version=LearningPlan.version + 1
+    ).execution_options(synchronize_session=False)
+
+
+def render_active_plan(db: Session, plan: LearningPlan) -> bytes:
+    """读取计划项与目标，按日期分组后序列化"""
+    stmt = select(
+        PlanItem.id,
+        PlanItem.date,
+        PlanItem.type,
+        PlanItem.title,
+        PlanItem.knowledge_id,
+        PlanItem.expected_minutes,
+        PlanItem.status,
+        PlanItem.completed_at,
+        PlanItem.exam_id,
+        PlanItem.reason_json
+    ).where(PlanItem.plan_id == plan.id).order_by(PlanItem.date, PlanItem.id)
+
+    items_by_date: Dict[str, List[Dict[str, Any]]] = {}
+    for row in db.execute(stmt).all():
+        items_by_date.setdefault(row.date.isoformat(), []).append({
+            "id": row.id,
+            "type": row.type,
+            "title": row.title,
+            "knowledge_id": row.knowledge_id,
+            "expected_minutes": row.expected_minutes,
+            "status": row.status,
+            "completed_at": row.completed_at.isoformat() if row.completed_at else None,
+            "exam_id": row.exam_id,
+            "reason": row.reason_json or {}
+        })
+
+    goal = db.get(Goal, plan.goal_id) if plan.goal_id else None
+    return dumps_json({
+        "plan_id": plan.id,
+        "start_date": plan.start_date.isoformat(),
+        "end_date": plan.end_date.isoformat(),
+        "strategy_version": plan.strategy_version,
+        "items_by_date": items_by_date,
+        "goal": {
+            "exam_date": goal.exam_date.isoformat() if goal else None,
+            "target_score": float(goal.target_score) if goal and goal.target_score is not None else None,
+            "daily_minutes": goal.daily_minutes if goal else None
+        }
+    })
+
+
+def get_active_plan_snapshot(db: Session, user_id: int) -> bytes:
+    """
+    获取学员当前活跃计划的响应体（命中缓存时只查询计划版本）
+
+    Args:
+        db: 数据库会话
+        user_id: 学员ID
+
+    Returns:
+        bytes: JSON 响应体；没有活跃计划时为 null
+    """
+    stmt = select(LearningPlan.id, LearningPlan.version).where(
+        LearningPlan.user_id == user_id,
+        LearningPlan.is_active == True
+    ).order_by(LearningPlan.created_at.desc()).limit(1)
+    row = db.execute(stmt).first()
+    if row is None:
+        return _NO_PLAN
+
+    plan_id, version = row
+    with _lock:
+        cached = _cache.get(plan_id)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(plan_id)
+            return cached[1]
+
+    # 以渲染时同一事务内读到的版本作为缓存键
+    plan = db.get(LearningPlan, plan_id)
+    body = render_active_plan(db, plan)
+    with _lock:
+        _cache[plan_id] = (plan.version, body)
+        _cache.move_to_end(plan_id)
+        while len(_cache) > settings.plan_cache_size:
+            _cache.popitem(last=False)
+    return body
@@ -0,0 +1,379 @@
+"""
+学习计划每日排程
+输入按优先级排好的知识点与按日期分桶的到期错题，输出每日计划项字段（不访问数据库）：
+- greedy（v1.0）：按优先级顺序逐个知识点取 min(预估时长, 当日剩余)，超出部分截断；复习每题固定 15 分钟且当天排不下即丢弃
+- knapsack（v2.0）：每天在 Goal.daily_minutes 预算内最大化所选任务的总优先级
+
+knapsack 排程：
+- 时长以 5 分钟为单位；候选为尚未学习的知识点（LEARN）、已学过的知识点的巩固练习（PRACTICE，
+  每个知识点每天最多一次、全计划最多 _PRACTICE_MAX_SESSIONS 次，价值按次数衰减）、
+  当天及之前到期但还没排上的错题（REVIEW，逾期越久价值越高）
+- 每类任务的时长上限为当日预算的 plan_mix_max_share[类型]（每日配比约束）；
+  同一类型内部是 0/1 背包，三类结果在总预算内做一次 max-plus 合并
+- 同一时长的候选只保留价值最高的 上限/时长 个（更多也放不下），每天的 DP 规模只取决于预算，与知识点数无关
+
+每天独立求解（前一天选中的 LEARN 从候选中移除），一年的计划在几十毫秒内完成，
+基准见 app/scripts/benchmark_plan_scheduler.py
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Mapping, NamedTuple, Sequence, Tuple
+import heapq
+
+from ..core.config import settings
+
+STRATEGY_GREEDY = "greedy"
+STRATEGY_KNAPSACK = "knapsack"
+# 写入 learning_plans.strategy_version
+STRATEGY_VERSIONS = {STRATEGY_GREEDY: "v1.0", STRATEGY_KNAPSACK: "v2.0"}
+
+# 每道到期错题安排的复习时长(分钟)
+REVIEW_MINUTES = 15
+# 一次巩固练习的时长(分钟)，对应开始任务时生成的 10 题练习
+PRACTICE_MINUTES = 20
+
+# 排程时间粒度(分钟)
+_SLOT_MINUTES = 5
+# 巩固练习价值 = 知识点优先级 × 衰减^已安排次数
+_PRACTICE_DECAY = 0.5
+_PRACTICE_MAX_SESSIONS = 3
+# 复习价值 = (基础价值 + 知识点优先级) × (1 + 逾期天数 × 逾期加成)
+_REVIEW_BASE_VALUE = 1.0
+_REVIEW_OVERDUE_BONUS = 0.1
+
+
+class DueReview(NamedTuple):
+    """一道到期复习的错题（计划项字段，时长由排程时按当日剩余决定）"""
+    knowledge_id: int
+    title: str
+    reason_json: Dict[str, Any]
+
+
+def _learn_reason(kp: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "mastery": kp["mastery"],
+        "weight": kp["weight"],
+        "priority": kp["priority"],
+        "explanation": f"掌握度{kp['mastery']:.1%}，权重{kp['weight']}，优先级{kp['priority']:.2f}"
+    }
+
+
+def schedule_greedy(
+    knowledge: Sequence[Mapping[str, Any]],
+    reviews_by_date: Mapping[date, Sequence[DueReview]],
+    start_date: date,
+    days: int,
+    daily_minutes: int
+) -> List[Dict[str, Any]]:
+    """
+    逐日贪心填充（v1.0）
+
+    Args:
+        knowledge: 按优先级从高到低排列的知识点（id/name/priority/mastery/weight/estimated_minutes）
+        reviews_by_date: {复习日期: 到期错题}
+        start_date: 计划开始日期
+        days: 计划天数
+        daily_minutes: 每日学习时长
+
+    Returns:
+        List[Dict[str, Any]]: 按日期排列的计划项字段
+    """
+    items = []
+    knowledge_index = 0
+
+    for day in range(days):
+        current_date = start_date + timedelta(days=day)
+        remaining_minutes = daily_minutes
+
+        # 优先安排到期复习的错题
+        review_items = []
+        for review in reviews_by_date.get(current_date, ()):
+            review_items.append({
+                "date": current_date,
+                "type": "REVIEW",
+                "title": review.title,
+                "knowledge_id": review.knowledge_id,
+                "expected_minutes": min(REVIEW_MINUTES, remaining_minutes),
+                "reason_json": review.reason_json
+            })
+            remaining_minutes -= REVIEW_MINUTES
+            if remaining_minutes <= 0:
+                break
+
+        # 生成学习任务 - 从剩余时间中安排薄弱知识点学习
+        while remaining_minutes > 0 and knowledge_index < len(knowledge):
+            kp = knowledge[knowledge_index]
+            learn_minutes = min(kp["estimated_minutes"], remaining_minutes)
+
+            items.append({
+                "date": current_date,
+                "type": "LEARN",
+                "knowledge_id": kp["id"],
+                "title": f"学习：{kp['name']}",
+                "expected_minutes": learn_minutes,
+                "reason_json": _learn_reason(kp)
+            })
+
+            remaining_minutes -= learn_minutes
+            knowledge_index += 1
+
+        # 添加复习任务
+        items.extend(review_items)
+
+    return items
+
+
+def _slots(minutes: int) -> int:
+    return max(1, -(-int(minutes) // _SLOT_MINUTES))
+
+
+def _knapsack(weights: Sequence[int], values: Sequence[float], capacity: int) -> Tuple[List[float], List[bytearray]]:
+    """0/1 背包：best[c] 为总时长不超过 c 时的最大价值，taken[i][c] 记录容量 c 下是否选中第 i 项"""
+    best = [0.0] * (capacity + 1)
+    taken = []
+    for weight, value in zip(weights, values):
+        row = bytearray(capacity + 1)
+        for c in range(capacity, weight - 1, -1):
+            candidate = best[c - weight] + value
+            if candidate > best[c]:
+                best[c] = candidate
+                row[c] = 1
+        taken.append(row)
+    return best, taken
+
+
+def _picked(weights: Sequence[int], taken: Sequence[bytearray], capacity: int) -> List[int]:
+    chosen = []
+    for i in range(len(taken) - 1, -1, -1):
+        if taken[i][capacity]:
+            chosen.append(i)
+            capacity -= weights[i]
+    chosen.reverse()
+    return chosen
+
+
+def _prune(candidates: List[Tuple[int, float, Any]], capacity: int) -> List[Tuple[int, float, Any]]:
+    """同一时长只保留价值最高的 capacity // 时长 个候选（其余在任何可行解中都可被替换）"""
+    by_weight: Dict[int, List[Tuple[int, float, Any]]] = defaultdict(list)
+    for candidate in candidates:
+        if 0 < candidate[0] <= capacity and candidate[1] > 0:
+            by_weight[candidate[0]].append(candidate)
+    kept = []
+    for weight, group in by_weight.items():
+        limit = capacity // weight
+        kept.extend(group if len(group) <= limit else heapq.nlargest(limit, group, key=lambda c: c[1]))
+    return kept
+
+
+class _TypeSolution(NamedTuple):
+    candidates: List[Tuple[int, float, Any]]
+    best: List[float]
+    taken: List[bytearray]
+
+
+def _solve_type(candidates: List[Tuple[int, float, Any]], capacity: int) -> _TypeSolution:
+    candidates = _prune(candidates, capacity)
+    best, taken = _knapsack([c[0] for c in candidates], [c[1] for c in candidates], capacity)
+    return _TypeSolution(candidates, best, taken)
+
+
+def _steps(best: Sequence[float]) -> List[int]:
+    """best 数组取值上升的容量（单调数组在其余容量上不会优于前一个上升点）"""
+    return [c for c in range(len(best)) if c == 0 or best[c] > best[c - 1]]
+
+
+def _merge(left: Sequence[float], right: Sequence[float], capacity: int) -> Tuple[List[float], List[int]]:
+    """
+    max-plus 合并两个单调不减的 best 数组，right 在超出自身长度的容量上取末项
+
+    Returns:
+        Tuple[List[float], List[int]]: (merged[c], 取得 merged[c] 时分给 left 的容量)
+    """
+    steps = _steps(left)
+    last = len(right) - 1
+    merged, split = [], []
+    for c in range(capacity + 1):
+        best_value, best_x = -1.0, 0
+        for x in steps:
+            if x > c:
+                break
+            value = left[x] + right[min(c - x, last)]
+            if value > best_value:
+                best_value, best_x = value, x
+        merged.append(best_value)
+        split.append(best_x)
+    return merged, split
+
+
+def _solve_day(groups: Sequence[Tuple[List[Tuple[int, float, Any]], int]], capacity: int) -> List[List[Any]]:
+    """
+    求解一天：各类型独立做 0/1 背包，再在总预算内合并
+
+    Args:
+        groups: [(候选 [(时长单位, 价值, 负载)], 该类型容量上限)]，固定为 LEARN / PRACTICE / REVIEW 三类
+        capacity: 当日总容量
+
+    Returns:
+        List[List[Any]]: 各类型选中候选的负载
+    """
+    solutions = [_solve_type(candidates, min(cap, capacity)) for candidates, cap in groups]
+    learn, practice, review = solutions
+    # 先合并 PRACTICE 与 REVIEW，再与 LEARN 合并；best 数组单调不减，剩余容量全部交给后一类
+    rest, practice_split = _merge(practice.best, review.best, capacity)
+    a = max(
+        (x for x in _steps(learn.best) if x <= capacity),
+        key=lambda x: learn.best[x] + rest[capacity - x]
+    )
+    b = practice_split[capacity - a]
+    r = min(len(review.best) - 1, capacity - a - b)
+    best_split = (a, b, r)
+
+    return [
+        [solution.candidates[i][2] for i in _picked([c[0] for c in solution.candidates], solution.taken, cap)]
+        for solution, cap in zip(solutions, best_split)
+    ]
+
+
+def schedule_knapsack(
+    knowledge: Sequence[Mapping[str, Any]],
+    reviews_by_date: Mapping[date, Sequence[DueReview]],
+    start_date: date,
+    days: int,
+    daily_minutes: int,
+    practiced_ids: Sequence[int] = ()
+) -> List[Dict[str, Any]]:
+    """
+    按日背包排程（v2.0）
+
+    Args:
+        knowledge: 知识点（id/name/priority/mastery/weight/estimated_minutes），顺序只影响同价值时的取舍
+        reviews_by_date: {复习日期: 到期错题}
+        start_date: 计划开始日期
+        days: 计划天数
+        daily_minutes: 每日学习时长
+        practiced_ids: 计划开始前已学过（可直接安排巩固练习）的知识点
+
+    Returns:
+        List[Dict[str, Any]]: 按日期排列的计划项字段，每天依次为 LEARN / PRACTICE / REVIEW
+    """
+    capacity = max(0, int(daily_minutes)) // _SLOT_MINUTES
+    share = settings.plan_mix_max_share
+    caps = {kind: int(capacity * share.get(kind, 1.0)) for kind in ("LEARN", "PRACTICE", "REVIEW")}
+    by_id = {kp["id"]: kp for kp in knowledge}
+
+    # 未学习的知识点按时长分组、组内按优先级降序：LEARN 的价值不随日期变化，每天只取各组前 上限/时长 个
+    unlearned: Dict[int, List[Tuple[int, float, Any]]] = defaultdict(list)
+    for kp in knowledge:
+        if kp["priority"] > 0 and caps["LEARN"] > 0:
+            weight = min(_slots(kp["estimated_minutes"]), caps["LEARN"])
+            unlearned[weight].append((weight, kp["priority"], kp))
+    for group in unlearned.values():
+        group.sort(key=lambda c: c[1], reverse=True)
+    sessions: Dict[int, int] = {kp_id: 0 for kp_id in practiced_ids if kp_id in by_id}
+    pending_reviews: List[Tuple[date, DueReview]] = []
+    practice_slots = _slots(PRACTICE_MINUTES)
+    review_slots = _slots(REVIEW_MINUTES)
+
+    items = []
+    for day in range(days):
+        current_date = start_date + timedelta(days=day)
+        pending_reviews.extend((current_date, review) for review in reviews_by_date.get(current_date, ()))
+
+        learn_candidates = [
+            candidate
+            for weight, group in unlearned.items()
+            for candidate in group[:caps["LEARN"] // weight]
+        ]
+        practice_candidates = [
+            (practice_slots, by_id[kp_id]["priority"] * _PRACTICE_DECAY ** count, kp_id)
+            for kp_id, count in sessions.items()
+            if count < _PRACTICE_MAX_SESSIONS
+        ]
+        review_candidates = [
+            (
+                review_slots,
+                (_REVIEW_BASE_VALUE + by_id.get(review.knowledge_id, {}).get("priority", 0.0))
+                * (1 + (current_date - due_date).days * _REVIEW_OVERDUE_BONUS),
+                i
+            )
+            for i, (due_date, review) in enumerate(pending_reviews)
+        ]
+
+        learned, practiced, reviewed = _solve_day(
+            [
+                (learn_candidates, caps["LEARN"]),
+                (practice_candidates, caps["PRACTICE"]),
+                (review_candidates, caps["REVIEW"]),
+            ],
+            capacity
+        )
+
+        learned_ids = set()
+        for kp in learned:
+            learned_ids.add(kp["id"])
+            items.append({
+                "date": current_date,
+                "type": "LEARN",
+                "knowledge_id": kp["id"],
+                "title": f"学习：{kp['name']}",
+                "expected_minutes": min(max(int(kp["estimated_minutes"]), _SLOT_MINUTES), caps["LEARN"] * _SLOT_MINUTES),
+                "reason_json": _learn_reason(kp)
+            })
+        for kp_id in practiced:
+            kp = by_id[kp_id]
+            sessions[kp_id] += 1
+            items.append({
+                "date": current_date,
+                "type": "PRACTICE",
+                "knowledge_id": kp_id,
+                "title": f"练习：{kp['name']}",
+                "expected_minutes": PRACTICE_MINUTES,
+                "reason_json": {
+                    "type": "practice",
+                    "session": sessions[kp_id],
+                    "mastery": kp["mastery"],
+                    "priority": kp["priority"],
+                    "explanation": f"巩固练习第{sessions[kp_id]}次，掌握度{kp['mastery']:.1%}"
+                }
+            })
+        for i in reviewed:
+            _, review = pending_reviews[i]
+            items.append({
+                "date": current_date,
+                "type": "REVIEW",
+                "title": review.title,
+                "knowledge_id": review.knowledge_id,
+                "expected_minutes": REVIEW_MINUTES,
+                "reason_json": review.reason_json
+            })
+
+        if learned_ids:
+            for weight, group in unlearned.items():
+                unlearned[weight] = [c for c in group if c[2]["id"] not in learned_ids]
+            # 学过的知识点从下一天起可以安排巩固练习
+            for kp_id in learned_ids:
+                sessions.setdefault(kp_id, 0)
+        if reviewed:
+            done = set(reviewed)
+            pending_reviews = [entry for i, entry in enumerate(pending_reviews) if i not in done]
+
+    return items
+
+
+def schedule_plan(
+    knowledge: Sequence[Mapping[str, Any]],
+    reviews_by_date: Mapping[date, Sequence[DueReview]],
+    start_date: date,
+    days: int,
+    daily_minutes: int,
+    practiced_ids: Sequence[int] = ()
+) -> List[Dict[str, Any]]:
+    """按 settings.plan_scheduler 选择排程方式（knowledge 需按优先级从高到低排列）"""
+    if settings.plan_scheduler == STRATEGY_GREEDY:
+        return schedule_greedy(knowledge, reviews_by_date, start_date, days, daily_minutes)
+    return schedule_knapsack(knowledge, reviews_by_date, start_date, days, daily_minutes, practiced_ids)
+
+
+def strategy_version() -> str:
+    return STRATEGY_VERSIONS.get(settings.plan_scheduler, STRATEGY_VERSIONS[STRATEGY_KNAPSACK])
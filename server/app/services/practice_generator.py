@@ -0,0 +1,156 @@
+"""
+专项练习组卷
+专项练习（/practice/generate）与学习计划中的练习任务（/plans/items/{id}/start）共用这里的组卷逻辑：
+按掌握度定目标难度，开启种子试卷时只记录组卷规则，否则按难度分桶抽题并复用内容相同的 AUTO 试卷
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Container, List, Tuple
+
+from ..core.config import settings
+from ..models.paper import Exam
+from ..models.progress import UserKnowledgeState
+from .paper_store import get_or_create_auto_paper
+from .question_sampler import Excluded, QuestionSampler, get_question_sampler
+from .seeded_papers import build_practice_rule, create_seeded_paper
+from .seen_questions import load_seen_questions
+
+
+def pick_practice_questions(
+    sampler: QuestionSampler,
+    knowledge_id: int,
+    target_diff: int,
+    need: int,
+    seen: Container[int]
+) -> List[int]:
+    """
+    按难度分桶抽取专项练习题目：优先目标难度，不足则逐级降低
+
+    Args:
+        sampler: 题库抽题器
+        knowledge_id: 知识点ID
+        target_diff: 目标难度
+        need: 需要的题目数量
+        seen: 学生已作答过的题目ID集合
+
+    Returns:
+        List[int]: 抽中的题目ID，可能少于 need
+    """
+    picked: List[int] = []
+    # 先在各难度中只抽未作答的题，仍不足再放开已作答的题
+    for blocked in (seen, ()):
+        diff = target_diff
+        while len(picked) < need and diff >= 1:
+            pool = sampler.pool([knowledge_id], difficulties=(diff,))
+            picked.extend(pool.draw(need - len(picked), exclude=Excluded(picked, blocked)))
+            diff -= 1
+    return picked
+
+
+def practice_target_difficulty(mastery: float, mode: str) -> int:
+    """
+    掌握度 -> 目标难度（可解释规则）
+    mastery < 0.3 -> 2；0.3 <= mastery < 0.6 -> 3；mastery >= 0.6 -> 4；非 ADAPTIVE 模式固定为 3
+    """
+    if mode != "ADAPTIVE":
+        return 3
+    if mastery < 0.3:
+        return 2
+    if mastery < 0.6:
+        return 3
+    return 4
+
+
+def generate_practice_exam(
+    db: Session,
+    user_id: int,
+    knowledge_id: int,
+    count: int = 10,
+    mode: str = "ADAPTIVE"
+) -> Tuple[Exam, int]:
+    """
+    生成专项练习考试（提交事务）
+
+    Args:
+        db: 数据库会话
+        user_id: 学员ID
+        knowledge_id: 知识点ID
+        count: 题目数量
+        mode: ADAPTIVE（按掌握度定难度）| FIXED
+
+    Returns:
+        Tuple[Exam, int]: 新建的考试及实际题数
+
+    Raises:
+        ValueError: 知识点暂无题目或无法抽题
+    """
+    count = max(1, int(count))
+    mode = (mode or "ADAPTIVE").upper()
+
+    # 获取符合知识点的题目（不限制难度，取自内存题库索引）
+    sampler = get_question_sampler(db)
+    candidates = sampler.pool([knowledge_id])
+    if len(candidates) == 0:
+        raise ValueError("所选知识点暂无题目")
+
+    # 已作答过的题目降权：同难度下优先抽没做过的
+    seen = load_seen_questions(db, user_id)
+
+    state_stmt = select(UserKnowledgeState.mastery).where(
+        UserKnowledgeState.user_id == user_id,
+        UserKnowledgeState.knowledge_id == knowledge_id
+    )
+    mastery = db.execute(state_stmt).scalar_one_or_none()
+    mastery = float(mastery) if mastery is not None else 0.0
+    target = practice_target_difficulty(mastery, mode)
+
+    config_json = {
+        "knowledge_id": knowledge_id,
+        "count": count,
+        "mode": mode,
+        "mastery": mastery,
+        "target_diff": target
+    }
+    if settings.seeded_papers_enabled:
+        # 种子试卷：只记录组卷规则与随机种子，题目在首次访问时推导，不写题目行
+        rule = build_practice_rule(sampler, knowledge_id, target, count, avoid=seen)
+        paper, selected = create_seeded_paper(
+            db,
+            title=f"PRACTICE_KP_{knowledge_id}_{user_id}",
+            rule=rule,
+            created_by=user_id,
+            config_json=config_json
+        )
+    else:
+        selected = pick_practice_questions(sampler, knowledge_id, target, count, seen)
+        # 仍不足时从该知识点全部题目中补充
+        if len(selected) < count:
+            selected.extend(candidates.draw(count - len(selected), exclude=selected, avoid=seen))
+
+        if not selected:
+            raise ValueError("无法为该知识点抽题")
+
+        # 创建或复用 Paper (AUTO)：相同题目与分值的试卷共用一行
+        paper, _ = get_or_create_auto_paper(
+            db,
+            title=f"PRACTICE_KP_{knowledge_id}",
+            question_ids=selected,
+            scores=[2.0] * len(selected),
+            created_by=user_id,
+            # 共用试卷不记录学员掌握度
+            config_json={key: value for key, value in config_json.items() if key != "mastery"}
+        )
+
+    exam = Exam(
+        paper_id=paper.id,
+        title=f"专项练习 - 知识点 {knowledge_id}",
+        category="PRACTICE",
+        duration_minutes=0,
+        status="PUBLISHED",
+        created_by=user_id
+    )
+    db.add(exam)
+    db.commit()
+    db.refresh(exam)
+    return exam, len(selected)
@@ -0,0 +1,223 @@
+"""
+学习进度批量写入服务
+提交考试后，用少量集合语句写入错题本计数/下次复习时间和知识点掌握度（EMA），
+替代逐题 SELECT + ORM 逐个修改的写法
+
+依赖唯一键：
+- wrong_questions (user_id, question_id)
+- user_knowledge_state (user_id, knowledge_id)
+
+SQLite 使用 INSERT ... ON CONFLICT DO UPDATE，MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE，
+其他方言退化为“一次查询已有行 + 批量更新/插入”
+"""
+
+from sqlalchemy import select, case, update, bindparam
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from ..core.config import settings
+from ..models.progress import UserKnowledgeState, WrongQuestion
+
+# 掌握度指数移动平均的学习率：new = alpha * 本次正确率 + (1 - alpha) * 旧掌握度
+MASTERY_EMA_ALPHA = 0.3
+
+
+def _dialect_name(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+def _review_times(now: datetime) -> List[datetime]:
+    """按错题次数对应的复习间隔（settings.review_intervals，单位天）预先算出复习时间"""
+    return [now + timedelta(days=days) for days in settings.review_intervals]
+
+
+def next_review_at(wrong_count: int, now: Optional[datetime] = None) -> datetime:
+    """计算下次复习时间（简单遗忘曲线：错得越多，间隔越长）"""
+    now = now or datetime.utcnow()
+    intervals = settings.review_intervals
+    days = intervals[min(max(wrong_count, 1) - 1, len(intervals) - 1)]
+    return now + timedelta(days=days)
+
+
+def _next_review_case(count_expr, now: datetime):
+    """生成 CASE 表达式：根据（累加后的）错题次数选择复习时间"""
+    times = _review_times(now)
+    whens = [(count_expr <= i + 1, times[i]) for i in range(len(times) - 1)]
+    return case(*whens, else_=times[-1])
+
+
+def upsert_wrong_questions(
+    db: Session,
+    user_id: int,
+    question_ids: Iterable[int],
+    now: Optional[datetime] = None
+) -> int:
+    """
+    批量记录错题：已存在则 wrong_count + 1 并按新次数推迟复习时间，否则新建
+
+    Returns:
+        int: 写入的错题数
+    """
+    ids = sorted(set(question_ids))
+    if not ids:
+        return 0
+    now = now or datetime.utcnow()
+    first_review = next_review_at(1, now)
+    rows = [
+        {
+            "user_id": user_id,
+            "question_id": qid,
+            "wrong_count": 1,
+            "last_wrong_at": now,
+            "next_review_at": first_review,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for qid in ids
+    ]
+    table = WrongQuestion.__table__
+    dialect = _dialect_name(db)
+
+    if dialect == "sqlite":
+        stmt = sqlite_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.question_id],
+            set_={
+                "wrong_count": table.c.wrong_count + 1,
+                "last_wrong_at": stmt.excluded.last_wrong_at,
+                "next_review_at": _next_review_case(table.c.wrong_count + 1, now),
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt)
+    elif dialect == "mysql":
+        stmt = mysql_insert(table).values(rows)
+        # MySQL 按顺序求值赋值列表，next_review_at 必须在 wrong_count 自增之前计算
+        stmt = stmt.on_duplicate_key_update([
+            ("next_review_at", _next_review_case(table.c.wrong_count + 1, now)),
+            ("wrong_count", table.c.wrong_count + 1),
+            ("last_wrong_at", stmt.inserted.last_wrong_at),
+            ("updated_at", stmt.inserted.updated_at),
+        ])
+        db.execute(stmt)
+    else:
+        existing_stmt = select(WrongQuestion.question_id).where(
+            WrongQuestion.user_id == user_id,
+            WrongQuestion.question_id.in_(ids)
+        )
+        existing = set(db.execute(existing_stmt).scalars().all())
+        if existing:
+            db.execute(
+                update(WrongQuestion).where(
+                    WrongQuestion.user_id == user_id,
+                    WrongQuestion.question_id.in_(existing)
+                ).values(
+                    next_review_at=_next_review_case(WrongQuestion.wrong_count + 1, now),
+                    wrong_count=WrongQuestion.wrong_count + 1,
+                    last_wrong_at=now,
+                    updated_at=now,
+                )
+            )
+        new_rows = [r for r in rows if r["question_id"] not in existing]
+        if new_rows:
+            db.execute(table.insert(), new_rows)
+
+    return len(ids)
+
+
+def upsert_knowledge_mastery(
+    db: Session,
+    user_id: int,
+    knowledge_stats: Dict[int, Dict[str, int]],
+    now: Optional[datetime] = None
+) -> int:
+    """
+    批量更新知识点掌握度
+
+    Args:
+        knowledge_stats: {knowledge_id: {"correct": 答对数, "total": 作答数}}
+
+    掌握度来源：本次作答正确率 correct / total；
+    已有记录按 EMA 平滑（alpha = MASTERY_EMA_ALPHA），新记录直接取本次正确率
+
+    Returns:
+        int: 写入的知识点数
+    """
+    if not knowledge_stats:
+        return 0
+    now = now or datetime.utcnow()
+    rows = []
+    for knowledge_id, stats in sorted(knowledge_stats.items()):
+        total = stats.get("total", 0)
+        mastery = stats.get("correct", 0) / total if total > 0 else 0.0
+        rows.append({
+            "user_id": user_id,
+            "knowledge_id": knowledge_id,
+            "mastery": round(mastery, 2),
+            "created_at": now,
+            "updated_at": now,
+        })
+    table = UserKnowledgeState.__table__
+    alpha = MASTERY_EMA_ALPHA
+    dialect = _dialect_name(db)
+
+    if dialect == "sqlite":
+        stmt = sqlite_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.knowledge_id],
+            set_={
+                "mastery": alpha * stmt.excluded.mastery + (1 - alpha) * table.c.mastery,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt)
+    elif dialect == "mysql":
+        stmt = mysql_insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            mastery=alpha * stmt.inserted.mastery + (1 - alpha) * table.c.mastery,
+            updated_at=stmt.inserted.updated_at,
+        )
+        db.execute(stmt)
+    else:
+        existing_stmt = select(UserKnowledgeState.knowledge_id, UserKnowledgeState.mastery).where(
+            UserKnowledgeState.user_id == user_id,
+            UserKnowledgeState.knowledge_id.in_([r["knowledge_id"] for r in rows])
+        )
+        existing = {kid: float(m) for kid, m in db.execute(existing_stmt).all()}
+        update_rows = [
+            {
+                "b_knowledge_id": r["knowledge_id"],
+                "b_mastery": round(alpha * r["mastery"] + (1 - alpha) * existing[r["knowledge_id"]], 2),
+                "b_updated_at": now,
+            }
+            for r in rows if r["knowledge_id"] in existing
+        ]
+        if update_rows:
+            db.execute(
+                update(table).where(
+                    table.c.user_id == user_id,
+                    table.c.knowledge_id == bindparam("b_knowledge_id")
+                ).values(mastery=bindparam("b_mastery"), updated_at=bindparam("b_updated_at")),
+                update_rows
+            )
+        new_rows = [r for r in rows if r["knowledge_id"] not in existing]
+        if new_rows:
+            db.execute(table.insert(), new_rows)
+
+    return len(rows)
+
+
+def apply_attempt_progress(
+    db: Session,
+    user_id: int,
+    wrong_question_ids: Iterable[int],
+    knowledge_stats: Dict[int, Dict[str, int]],
+    now: Optional[datetime] = None
+):
+    """提交考试后的进度写入：错题本 + 知识点掌握度（不提交事务，由调用方 commit）"""
+    now = now or datetime.utcnow()
+    upsert_wrong_questions(db, user_id, wrong_question_ids, now)
+    upsert_knowledge_mastery(db, user_id, knowledge_stats, now)
@@ -0,0 +1,194 @@
+"""
+题库内存索引服务
+进程内只读的题目索引：题型、难度、标准化答案键（判分器）和知识点ID按紧凑数组存放，
+按题目ID O(1) 查找；命中缓存时不访问数据库
+
+失效方式：题目增删改接口调用 bump_question_version() 递增版本号，
+下一次读取时发现版本不一致即整体重建；多进程部署下另有 TTL 兜底
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+
+from ..core.config import settings
+from ..models.question import Question
+from ..models.knowledge import QuestionKnowledgeMap
+from .grading import QuestionGrader, compile_grader
+from .index_rebuild import RebuildFlag
+
+# 题型编码（数组中以 1 字节存储）
+QUESTION_TYPES: Tuple[str, ...] = ("SINGLE", "MULTI", "JUDGE", "FILL", "SHORT")
+_TYPE_CODES = {t: i for i, t in enumerate(QUESTION_TYPES)}
+_UNKNOWN_TYPE = 255
+
+
+class QuestionIndex:
+    """
+    不可变题目索引
+    - slot: 题目在各数组中的下标，_slots 负责 question_id -> slot
+    - 知识点采用 CSR 布局：_kp_offsets[slot] .. _kp_offsets[slot + 1] 为该题在 _kp_ids 中的区间
+    """
+    __slots__ = (
+        "version", "built_at", "_slots", "_ids", "_types", "_difficulties",
+        "_kp_offsets", "_kp_ids", "_graders", "_by_knowledge",
+    )
+
+    def __init__(self, version: int, question_rows: Iterable, kp_rows: Iterable[Tuple[int, int]]):
+        self.version = version
+        self.built_at = time.monotonic()
+
+        kp_by_question: Dict[int, List[int]] = {}
+        by_knowledge: Dict[int, List[int]] = {}
+        for question_id, knowledge_id in kp_rows:
+            kp_by_question.setdefault(question_id, []).append(knowledge_id)
+            by_knowledge.setdefault(knowledge_id, []).append(question_id)
+
+        self._slots: Dict[int, int] = {}
+        self._ids = array("i")
+        self._types = array("B")
+        self._difficulties = array("B")
+        self._kp_offsets = array("i", [0])
+        self._kp_ids = array("i")
+        graders: List[QuestionGrader] = []
+
+        for row in question_rows:
+            self._slots[row.id] = len(self._ids)
+            self._ids.append(row.id)
+            self._types.append(_TYPE_CODES.get(row.type, _UNKNOWN_TYPE))
+            self._difficulties.append(row.difficulty or 0)
+            self._kp_ids.extend(kp_by_question.get(row.id, ()))
+            self._kp_offsets.append(len(self._kp_ids))
+            graders.append(compile_grader(row.id, row.type, row.answer_json, row.updated_at))
+
+        self._graders: Tuple[QuestionGrader, ...] = tuple(graders)
+        self._by_knowledge: Dict[int, Tuple[int, ...]] = {
+            kid: tuple(qids) for kid, qids in by_knowledge.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, question_id: int) -> bool:
+        return question_id in self._slots
+
+    def question_ids(self) -> array:
+        """全部题目ID（只读视图请勿修改）"""
+        return self._ids
+
+    def slot_of(self, question_id: int) -> Optional[int]:
+        """题目在索引数组中的下标（可用作位图的位号）"""
+        return self._slots.get(question_id)
+
+    def type_of(self, question_id: int) -> Optional[str]:
+        slot = self._slots.get(question_id)
+        if slot is None:
+            return None
+        code = self._types[slot]
+        return QUESTION_TYPES[code] if code != _UNKNOWN_TYPE else None
+
+    def difficulty_of(self, question_id: int) -> Optional[int]:
+        slot = self._slots.get(question_id)
+        return self._difficulties[slot] if slot is not None else None
+
+    def knowledge_ids(self, question_id: int) -> Tuple[int, ...]:
+        """题目关联的知识点ID"""
+        slot = self._slots.get(question_id)
+        if slot is None:
+            return ()
+        return tuple(self._kp_ids[self._kp_offsets[slot]:self._kp_offsets[slot + 1]])
+
+    def question_ids_for_knowledge(self, knowledge_id: int) -> Tuple[int, ...]:
+        """知识点直接关联的题目ID"""
+        return self._by_knowledge.get(knowledge_id, ())
+
+    def grader(self, question_id: int) -> Optional[QuestionGrader]:
+        slot = self._slots.get(question_id)
+        return self._graders[slot] if slot is not None else None
+
+    def graders(self, question_ids: Iterable[int]) -> Dict[int, QuestionGrader]:
+        """批量取判分器（不存在的题目跳过）"""
+        result = {}
+        for qid in question_ids:
+            slot = self._slots.get(qid)
+            if slot is not None:
+                result[qid] = self._graders[slot]
+        return result
+
+
+_version = 0
+_index: Optional[QuestionIndex] = None
+_lock = threading.Lock()
+_rebuild = RebuildFlag()
+
+
+def current_question_version() -> int:
+    """当前题库版本号"""
+    return _version
+
+
+def bump_question_version() -> int:
+    """题目增删改后调用：递增版本号，使内存索引及依赖它的缓存失效"""
+    global _version
+    with _lock:
+        _version += 1
+        return _version
+
+
+def _is_fresh(index: Optional[QuestionIndex]) -> bool:
+    if index is None or index.version != _version:
+        return False
+    ttl = settings.question_index_ttl_seconds
+    return ttl <= 0 or time.monotonic() - index.built_at < ttl
+
+
+def build_question_index(db: Session, version: int) -> QuestionIndex:
+    """从数据库构建索引（两条查询：题目列 + 题目-知识点映射）"""
+    question_stmt = select(
+        Question.id, Question.type, Question.difficulty, Question.answer_json, Question.updated_at
+    ).order_by(Question.id)
+    kp_stmt = select(QuestionKnowledgeMap.question_id, QuestionKnowledgeMap.knowledge_id)
+    return QuestionIndex(version, db.execute(question_stmt).all(), db.execute(kp_stmt).all())
+
+
+def get_question_index(db: Session) -> QuestionIndex:
+    """
+    获取进程内题目索引（热路径不访问数据库）
+
+    Args:
+        db: 数据库会话，仅在索引失效需要重建时使用
+
+    Returns:
+        QuestionIndex: 当前版本的只读索引
+    """
+    index = _index
+    if _is_fresh(index):
+        return index
+    # 单飞重建：已有请求在重建时沿用旧索引，冷启动时等待重建完成（见 index_rebuild）
+    if not _rebuild.try_acquire():
+        if index is not None:
+            return index
+        if _rebuild.wait() and _is_fresh(_index):
+            return _index
+        return _rebuild_index(db)
+    try:
+        return _rebuild_index(db)
+    finally:
+        _rebuild.release()
+
+
+def _rebuild_index(db: Session) -> QuestionIndex:
+    # 重建查询不能持锁：异步接口经 run_sync 调用时查询会让出事件循环，
+    # 同线程上的其他协程再来取锁会把整个事件循环阻塞住，只在替换时加锁
+    global _index
+    version = _version
+    index = build_question_index(db, version)
+    with _lock:
+        if _is_fresh(_index):
+            return _index
+        if version == _version:
+            _index = index
+        return index
@@ -0,0 +1,236 @@
+"""
+分桶抽题服务
+基于内存题库索引，按 (知识点, 题型, 难度) 把题目ID分桶存入紧凑数组；
+组卷时把符合条件的桶拼成一个虚拟序列，按随机位置无放回抽取，
+只需 O(k) 次随机数与二分定位，不再整表加载 Question 再打乱
+
+组卷可传入 avoid（如学生已作答集合）做降权：先在避开这些题的前提下抽取，不足时再允许从中补齐
+
+一道题关联多个知识点时会出现在多个桶中，抽中后按其在本次候选桶中的出现次数做接受-拒绝，
+保证每道题被抽中的概率均等；候选接近耗尽时退化为对剩余位置整体洗牌
+
+失效方式：跟随题库索引（question_index）版本，索引重建后下一次取用时重新分桶
+"""
+
+from sqlalchemy.orm import Session
+from array import array
+from bisect import bisect_right
+from typing import Collection, Container, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+import random
+import threading
+
+from .question_index import QuestionIndex, get_question_index
+
+# (题型, 难度) -> 题目ID数组
+_Buckets = Dict[Tuple[Optional[str], int], array]
+
+
+class Excluded:
+    """多个排除集合的并集（只做成员判断，不复制），可作为 draw 的 exclude 参数"""
+    __slots__ = ("_parts",)
+
+    def __init__(self, *parts: Container[int]):
+        self._parts = parts
+
+    def __contains__(self, question_id: int) -> bool:
+        return any(question_id in part for part in self._parts)
+
+
+class QuestionPool:
+    """
+    一次抽题的候选集合：若干个桶首尾相接组成的虚拟序列
+    - _offsets[i] 为第 i 个桶在虚拟序列中的起始位置，_offsets[-1] 为总长度
+    """
+    __slots__ = ("_index", "_buckets", "_offsets", "_kp_ids")
+
+    def __init__(self, index: QuestionIndex, buckets: List[array], kp_ids: Optional[FrozenSet[int]]):
+        self._index = index
+        self._buckets = [bucket for bucket in buckets if len(bucket)]
+        self._offsets = [0]
+        for bucket in self._buckets:
+            self._offsets.append(self._offsets[-1] + len(bucket))
+        self._kp_ids = kp_ids
+
+    def __len__(self) -> int:
+        """虚拟序列长度（多知识点题目会重复计数）"""
+        return self._offsets[-1]
+
+    def _at(self, pos: int) -> int:
+        i = bisect_right(self._offsets, pos) - 1
+        return self._buckets[i][pos - self._offsets[i]]
+
+    def _multiplicity(self, question_id: int) -> int:
+        """题目在本候选集合中出现的次数（题型、难度相同，只取决于命中的知识点数）"""
+        if self._kp_ids is None:
+            return 1
+        return sum(1 for kp_id in self._index.knowledge_ids(question_id) if kp_id in self._kp_ids) or 1
+
+    def draw(
+        self,
+        count: int,
+        exclude: Container[int] = (),
+        avoid: Optional[Container[int]] = None
+    ) -> List[int]:
+        """
+        无放回随机抽取题目ID
+
+        Args:
+            count: 抽取数量
+            exclude: 需要排除的题目ID（如本卷已选题目）
+            avoid: 尽量避开的题目ID（如学生已作答集合），只在其余候选不足时使用
+
+        Returns:
+            List[int]: 抽中的题目ID，候选不足时返回全部可用题目
+        """
+        if isinstance(exclude, (list, tuple)):
+            exclude = set(exclude)
+        if not avoid:
+            return self._draw(count, exclude)
+        picked = self._draw(count, Excluded(exclude, avoid))
+        if len(picked) < count:
+            picked.extend(self._draw(count - len(picked), Excluded(exclude, set(picked))))
+        return picked
+
+    def _draw(self, count: int, exclude: Container[int]) -> List[int]:
+        total = len(self)
+        picked: List[int] = []
+        if count <= 0 or total == 0:
+            return picked
+        seen = set()
+        tried = set()
+
+        while len(picked) < count and len(tried) < total:
+            if len(tried) * 2 >= total:
+                # 候选接近耗尽，拒绝率过高：剩余位置整体洗牌后顺序取
+                rest = [pos for pos in range(total) if pos not in tried]
+                random.shuffle(rest)
+                for pos in rest:
+                    qid = self._at(pos)
+                    if qid not in seen and qid not in exclude:
+                        seen.add(qid)
+                        picked.append(qid)
+                        if len(picked) >= count:
+                            break
+                break
+
+            pos = random.randrange(total)
+            if pos in tried:
+                continue
+            tried.add(pos)
+            qid = self._at(pos)
+            if qid in seen or qid in exclude:
+                continue
+            multiplicity = self._multiplicity(qid)
+            if multiplicity > 1 and random.random() * multiplicity >= 1:
+                # 多次出现的题目按 1/m 接受，未接受的位置允许其他副本再次命中
+                tried.discard(pos)
+                continue
+            seen.add(qid)
+            picked.append(qid)
+
+        return picked
+
+    def iter_ids(self) -> Iterable[int]:
+        """遍历候选题目ID（多知识点题目会重复出现）"""
+        for bucket in self._buckets:
+            yield from bucket
+
+    def available(self, exclude: Collection[int] = ()) -> int:
+        """去重后的可用题目数（统计用，需要遍历候选）"""
+        ids = set()
+        for bucket in self._buckets:
+            ids.update(bucket)
+        if exclude:
+            ids.difference_update(exclude)
+        return len(ids)
+
+
+class QuestionSampler:
+    """按 (知识点, 题型, 难度) 分桶的题目ID索引，跟随某一版本的 QuestionIndex"""
+    __slots__ = ("index", "_by_knowledge", "_all")
+
+    def __init__(self, index: QuestionIndex):
+        self.index = index
+        by_knowledge: Dict[int, Dict[Tuple[Optional[str], int], List[int]]] = {}
+        all_buckets: Dict[Tuple[Optional[str], int], List[int]] = {}
+
+        for qid in index.question_ids():
+            key = (index.type_of(qid), index.difficulty_of(qid))
+            all_buckets.setdefault(key, []).append(qid)
+            for kp_id in index.knowledge_ids(qid):
+                by_knowledge.setdefault(kp_id, {}).setdefault(key, []).append(qid)
+
+        self._all: _Buckets = {key: array("i", ids) for key, ids in all_buckets.items()}
+        self._by_knowledge: Dict[int, _Buckets] = {
+            kp_id: {key: array("i", ids) for key, ids in buckets.items()}
+            for kp_id, buckets in by_knowledge.items()
+        }
+
+    def pool(
+        self,
+        kp_ids: Optional[Iterable[int]],
+        question_types: Optional[Sequence[str]] = None,
+        max_difficulty: Optional[int] = None,
+        difficulties: Optional[Collection[int]] = None
+    ) -> QuestionPool:
+        """
+        按条件组合候选桶
+
+        Args:
+            kp_ids: 知识点ID列表；None 表示全题库
+            question_types: 题型过滤；None 表示不限
+            max_difficulty: 最大难度（含）
+            difficulties: 指定难度集合
+
+        Returns:
+            QuestionPool: 候选集合
+        """
+        def accept(key: Tuple[Optional[str], int]) -> bool:
+            question_type, difficulty = key
+            if question_types is not None and question_type not in question_types:
+                return False
+            if max_difficulty is not None and not 1 <= difficulty <= max_difficulty:
+                return False
+            if difficulties is not None and difficulty not in difficulties:
+                return False
+            return True
+
+        if kp_ids is None:
+            buckets = [bucket for key, bucket in self._all.items() if accept(key)]
+            return QuestionPool(self.index, buckets, None)
+
+        kp_set = frozenset(kp_ids)
+        buckets = [
+            bucket
+            for kp_id in sorted(kp_set)
+            for key, bucket in self._by_knowledge.get(kp_id, {}).items()
+            if accept(key)
+        ]
+        return QuestionPool(self.index, buckets, kp_set)
+
+
+_sampler: Optional[QuestionSampler] = None
+_lock = threading.Lock()
+
+
+def get_question_sampler(db: Session) -> QuestionSampler:
+    """
+    获取与当前题库索引同版本的分桶抽题器
+
+    Args:
+        db: 数据库会话，仅在题库索引失效需要重建时使用
+
+    Returns:
+        QuestionSampler: 只读抽题器
+    """
+    global _sampler
+    index = get_question_index(db)
+    sampler = _sampler
+    if sampler is not None and sampler.index is index:
+        return sampler
+    # 分桶在锁外构建，只在替换时加锁（与 get_question_index 一致）
+    sampler = QuestionSampler(index)
+    with _lock:
+        if _sampler is None or _sampler.index is not index:
+            _sampler = sampler
+        return _sampler
@@ -1,53 +1,99 @@
-from sqlalchemy import select
+"""
+学习计划推荐服务
+按知识点优先级与到期错题生成每日计划项（排程方式见 plan_scheduler），支持两种写入方式：
+- 全量：停用旧计划，新建计划及全部计划项
+- 增量：与当前活跃计划今天及以后的计划项比对，只改动变化的行；
+  已完成/已跳过的任务与历史日期保持不动，完成统计在重排后保持连续
+"""
+
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
-from datetime import date, timedelta
-from typing import Dict, Any
-import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 from ..models.plan import Goal, LearningPlan, PlanItem
-from ..models.knowledge import KnowledgePoint
+from ..models.knowledge import KnowledgePoint, QuestionKnowledgeMap
 from ..models.progress import UserKnowledgeState, WrongQuestion
+from ..models.question import Question
+from .plan_cache import plan_version_bump
+from .plan_scheduler import DueReview, schedule_plan, strategy_version
 
+# 计划项在增量比对中的身份：(日期, 类型, 知识点, 标题)
+_ItemKey = Tuple[date, str, Optional[int], Optional[str]]
 
-def generate_learning_plan(db: Session, user_id: int, days: int) -> dict:
+def bucket_due_reviews(
+    db: Session,
+    user_ids: Sequence[int],
+    start_date: date,
+    days: int
+) -> Dict[int, Dict[date, List[DueReview]]]:
     """
-    生成学习计划的核心算法
+    一次遍历把计划期内到期的错题按 (学员, 复习日期) 分桶
+
+    题干与题目的首个知识点各用一条查询预取，查询条数与错题数、天数无关；
+    同一天内按题目ID排序，没有关联知识点的题目不安排复习
 
     Args:
         db: 数据库会话
-        user_id: 用户ID
+        user_ids: 学员ID
+        start_date: 计划开始日期
         days: 计划天数
 
     Returns:
-        dict: 包含计划信息的字典
+        Dict[int, Dict[date, List[DueReview]]]: {学员ID: {复习日期: 错题}}
     """
-    # 1. 获取用户当前目标
-    stmt = select(Goal).where(Goal.user_id == user_id).order_by(Goal.created_at.desc())
-    goal = db.execute(stmt).scalar_one_or_none()
+    start = datetime.combine(start_date, datetime.min.time())
+    stmt = select(
+        WrongQuestion.user_id,
+        WrongQuestion.question_id,
+        WrongQuestion.wrong_count,
+        WrongQuestion.last_wrong_at,
+        WrongQuestion.next_review_at
+    ).where(
+        WrongQuestion.user_id.in_(list(user_ids)),
+        WrongQuestion.next_review_at >= start,
+        WrongQuestion.next_review_at < start + timedelta(days=days)
+    ).order_by(WrongQuestion.user_id, WrongQuestion.question_id)
+    wrong_questions = db.execute(stmt).all()
+    if not wrong_questions:
+        return {}
 
-    if not goal:
-        raise ValueError("请先设置学习目标")
+    question_ids = list({row.question_id for row in wrong_questions})
+    stems = dict(db.execute(select(Question.id, Question.stem).where(Question.id.in_(question_ids))).all())
+    first_kp: Dict[int, int] = {}
+    kp_stmt = select(QuestionKnowledgeMap.question_id, QuestionKnowledgeMap.knowledge_id).where(
+        QuestionKnowledgeMap.question_id.in_(question_ids)
+    ).order_by(QuestionKnowledgeMap.id)
+    for question_id, knowledge_id in db.execute(kp_stmt).all():
+        first_kp.setdefault(question_id, knowledge_id)
 
-    # 2. 计算计划时间范围
-    start_date = date.today()
-    end_date = start_date + timedelta(days=days - 1)
+    buckets: Dict[int, Dict[date, List[DueReview]]] = {}
+    for row in wrong_questions:
+        kp_id = first_kp.get(row.question_id)
+        stem = stems.get(row.question_id)
+        if kp_id is None or stem is None:
+            continue
+        buckets.setdefault(row.user_id, {}).setdefault(row.next_review_at.date(), []).append(DueReview(
+            knowledge_id=kp_id,
+            title=f"复习错题：{stem[:20]}...",
+            reason_json={
+                "type": "review",
+                "wrong_count": row.wrong_count,
+                "last_wrong": row.last_wrong_at.isoformat()
+            }
+        ))
+    return buckets
 
-    # 2.5. 将用户的所有旧计划设置为inactive
-    from sqlalchemy import update
-    db.execute(
-        update(LearningPlan).where(
-            LearningPlan.user_id == user_id,
-            LearningPlan.is_active == True
-        ).values(is_active=False)
-    )
 
-    # 3. 获取所有知识点及其权重
+def _build_schedule(db: Session, user_id: int, goal: Goal, start_date: date, days: int) -> List[Dict[str, Any]]:
+    """计算每日计划项（只读），返回按日期排列的计划项字段字典"""
+    # 获取所有知识点及其权重
     stmt = select(KnowledgePoint)
     knowledge_points = db.execute(stmt).scalars().all()
     if not knowledge_points:
         raise ValueError("暂无知识点数据，无法生成计划")
 
-    # 4. 获取用户的掌握度数据
+    # 获取用户的掌握度数据
     mastery_data = {}
     stmt = select(UserKnowledgeState).where(UserKnowledgeState.user_id == user_id)
     user_states = db.execute(stmt).scalars().all()
@@ -55,15 +101,10 @@ def generate_learning_plan(db: Session, user_id: int, days: int) -> dict:
     for state in user_states:
         mastery_data[state.knowledge_id] = float(state.mastery)
 
-    # 5. 获取到期复习的错题
-    review_deadline = start_date + timedelta(days=days)
-    stmt = select(WrongQuestion).where(
-        WrongQuestion.user_id == user_id,
-        WrongQuestion.next_review_at <= review_deadline
-    )
-    review_questions = db.execute(stmt).scalars().all()
+    # 到期复习的错题按日期分桶（一次遍历，题干与知识点已预取）
+    reviews_by_date = bucket_due_reviews(db, [user_id], start_date, days).get(user_id, {})
 
-    # 6. 计算知识点优先级并排序
+    # 计算知识点优先级并排序
     # 优先级计算：(1 - 掌握度) * 权重
     # 掌握度越低、权重越高的知识点优先级越高
     knowledge_priority = []
@@ -82,96 +123,201 @@ def generate_learning_plan(db: Session, user_id: int, days: int) -> dict:
     # 按优先级从高到低排序
     knowledge_priority.sort(key=lambda x: x["priority"], reverse=True)
 
-    # 7. 创建学习计划
+    # 计划开始前已有掌握度的知识点可以直接安排巩固练习
+    practiced_ids = [kp_id for kp_id, mastery in mastery_data.items() if mastery > 0]
+
+    # 生成每日计划项
+    return schedule_plan(knowledge_priority, reviews_by_date, start_date, days, goal.daily_minutes, practiced_ids)
+
+
+def _item_key(item: Dict[str, Any]) -> _ItemKey:
+    return item["date"], item["type"], item["knowledge_id"], item["title"]
+
+
+def _active_plan(db: Session, user_id: int) -> Optional[LearningPlan]:
+    stmt = select(LearningPlan).where(
+        LearningPlan.user_id == user_id,
+        LearningPlan.is_active == True
+    ).order_by(LearningPlan.created_at.desc(), LearningPlan.id.desc()).limit(1)
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def _write_full_plan(
+    db: Session,
+    user_id: int,
+    goal: Goal,
+    start_date: date,
+    end_date: date,
+    schedule: List[Dict[str, Any]]
+) -> LearningPlan:
+    """停用旧计划，新建计划并写入全部计划项"""
+    db.execute(
+        update(LearningPlan).where(
+            LearningPlan.user_id == user_id,
+            LearningPlan.is_active == True
+        ).values(is_active=False)
+    )
+
     plan = LearningPlan(
         user_id=user_id,
         goal_id=goal.id,
         start_date=start_date,
         end_date=end_date,
-        strategy_version="v1.0",
+        strategy_version=strategy_version(),
         is_active=True
     )
-
     db.add(plan)
     db.flush()  # 获取plan.id
 
-    # 8. 生成每日计划项
-    plan_items = []
-    daily_minutes = goal.daily_minutes
-    knowledge_index = 0
-
-    for day in range(days):
-        current_date = start_date + timedelta(days=day)
-        remaining_minutes = daily_minutes
-
-        # 优先安排到期复习的错题
-        review_items = []
-        for wrong_q in review_questions:
-            if wrong_q.next_review_at.date() == current_date:
-                # 查找题目对应的知识点
-                question = wrong_q.question
-                if question and question.knowledge_points:
-                    kp_id = question.knowledge_points[0].knowledge_id
-                    review_items.append({
-                        "type": "REVIEW",
-                        "title": f"复习错题：{question.stem[:20]}...",
-                        "knowledge_id": kp_id,
-                        "expected_minutes": min(15, remaining_minutes),  # 复习每题15分钟
-                        "reason": {
-                            "type": "review",
-                            "wrong_count": wrong_q.wrong_count,
-                            "last_wrong": wrong_q.last_wrong_at.isoformat()
-                        }
-                    })
-                    remaining_minutes -= 15
-                    if remaining_minutes <= 0:
-                        break
-
-        # 生成学习任务 - 从剩余时间中安排薄弱知识点学习
-        while remaining_minutes > 0 and knowledge_index < len(knowledge_priority):
-            kp = knowledge_priority[knowledge_index]
-            learn_minutes = min(kp["estimated_minutes"], remaining_minutes)
-
-            plan_items.append(PlanItem(
-                plan_id=plan.id,
-                date=current_date,
-                type="LEARN",
-                knowledge_id=kp["id"],
-                title=f"学习：{kp['name']}",
-                expected_minutes=learn_minutes,
-                status="TODO",
-                reason_json=json.dumps({
-                    "mastery": kp["mastery"],
-                    "weight": kp["weight"],
-                    "priority": kp["priority"],
-                    "explanation": f"掌握度{kp['mastery']:.1%}，权重{kp['weight']}，优先级{kp['priority']:.2f}"
-                })
-            ))
-
-            remaining_minutes -= learn_minutes
-            knowledge_index += 1
-
-        # 添加复习任务
-        for review_item in review_items:
-            plan_items.append(PlanItem(
-                plan_id=plan.id,
-                date=current_date,
-                type=review_item["type"],
-                knowledge_id=review_item["knowledge_id"],
-                title=review_item["title"],
-                expected_minutes=review_item["expected_minutes"],
-                status="TODO",
-                reason_json=json.dumps(review_item["reason"])
-            ))
-
     # 批量插入计划项
-    if plan_items:
-        db.add_all(plan_items)
+    if schedule:
+        db.add_all([PlanItem(plan_id=plan.id, status="TODO", **item) for item in schedule])
+    return plan
+
+
+class _PlanMerge(NamedTuple):
+    """新日程与活跃计划的比对结果"""
+    inserted: List[PlanItem]   # 待插入的计划项
+    updated: int               # 已原地更新的计划项数
+    stale_ids: List[int]       # 待删除的计划项ID
+    extended: bool             # 结束日期是否延长（已写入 plan.end_date）
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.stale_ids or self.extended)
+
+    def counts(self) -> Dict[str, int]:
+        return {"inserted": len(self.inserted), "updated": self.updated, "deleted": len(self.stale_ids)}
+
+
+def _merge_incremental_plan(
+    plan: LearningPlan,
+    end_date: date,
+    schedule: List[Dict[str, Any]],
+    items: Sequence[PlanItem]
+) -> _PlanMerge:
+    """
+    比对新日程与计划项：原地更新变化的 TODO 任务、延长结束日期，返回待插入与待删除的计划项
+    （删除、插入与版本递增由调用方执行，批量刷新按块合并为一条语句）
+
+    Args:
+        items: 该计划 start_date 及以后的计划项（按ID排序）
+    """
+    existing: Dict[_ItemKey, List[PlanItem]] = {}
+    for item in items:
+        existing.setdefault(
+            (item.date, item.type, item.knowledge_id, item.title), []
+        ).append(item)
+
+    inserted = []
+    updated = 0
+    for fields in schedule:
+        matches = existing.get(_item_key(fields))
+        if not matches:
+            inserted.append(PlanItem(plan_id=plan.id, status="TODO", **fields))
+            continue
+        item = matches.pop(0)
+        if item.status != "TODO":
+            continue
+        if item.expected_minutes != fields["expected_minutes"] or item.reason_json != fields["reason_json"]:
+            item.expected_minutes = fields["expected_minutes"]
+            item.reason_json = fields["reason_json"]
+            updated += 1
+
+    stale_ids = [
+        item.id
+        for items in existing.values()
+        for item in items
+        if item.status == "TODO" and item.exam_id is None
+    ]
+    extended = end_date > plan.end_date
+    if extended:
+        plan.end_date = end_date
+    return _PlanMerge(inserted, updated, stale_ids, extended)
+
+
+def _apply_incremental_plan(
+    db: Session,
+    plan: LearningPlan,
+    start_date: date,
+    end_date: date,
+    schedule: List[Dict[str, Any]]
+) -> Dict[str, int]:
+    """
+    把新计算的日程合并进活跃计划（不提交事务）
+
+    只比对 start_date 及以后的计划项：
+    - 与新日程相同的任务保持不动（已完成/已跳过的任务无论新日程如何都不改动）
+    - 仍为 TODO 且时长/依据变化的任务原地更新
+    - 新日程中不再需要的 TODO 任务删除，已关联考试（已开始）的保留
+    - 新增的任务插入
+    有改动（含结束日期延长）时递增计划版本
+
+    Returns:
+        Dict[str, int]: 各类改动的行数
+    """
+    stmt = select(PlanItem).where(
+        PlanItem.plan_id == plan.id,
+        PlanItem.date >= start_date
+    ).order_by(PlanItem.id)
+    merge = _merge_incremental_plan(plan, end_date, schedule, db.execute(stmt).scalars().all())
+
+    if merge.stale_ids:
+        db.execute(delete(PlanItem).where(PlanItem.id.in_(merge.stale_ids)).execution_options(synchronize_session=False))
+    if merge.inserted:
+        db.add_all(merge.inserted)
+    # 没有任何改动时不递增版本，/plans/active 的缓存与 ETag 保持有效
+    if merge.changed:
+        db.execute(plan_version_bump(LearningPlan.id == plan.id))
+    return merge.counts()
+
+
+def generate_learning_plan(db: Session, user_id: int, days: int, incremental: bool = False) -> dict:
+    """
+    生成学习计划的核心算法
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        days: 计划天数
+        incremental: 增量重排；当前活跃计划与目标一致时只改动变化的计划项，否则仍按全量生成
+
+    Returns:
+        dict: 包含计划信息的字典
+    """
+    # 1. 获取用户当前目标
+    stmt = select(Goal).where(Goal.user_id == user_id).order_by(Goal.created_at.desc())
+    goal = db.execute(stmt).scalar_one_or_none()
+
+    if not goal:
+        raise ValueError("请先设置学习目标")
+
+    # 2. 计算计划时间范围
+    start_date = date.today()
+    end_date = start_date + timedelta(days=days - 1)
+
+    # 3. 计算日程
+    schedule = _build_schedule(db, user_id, goal, start_date, days)
+
+    # 4. 增量重排：在活跃计划上原地合并
+    plan = _active_plan(db, user_id) if incremental else None
+    if plan is not None and plan.goal_id == goal.id:
+        changes = _apply_incremental_plan(db, plan, start_date, end_date, schedule)
+        return {
+            "plan_id": plan.id,
+            "message": f"已增量更新{days}天学习计划",
+            "start_date": plan.start_date.isoformat(),
+            "end_date": plan.end_date.isoformat(),
+            "total_items": len(schedule),
+            "changes": changes
+        }
 
+    # 5. 全量：新建计划
+    plan = _write_full_plan(db, user_id, goal, start_date, end_date, schedule)
     return {
         "plan_id": plan.id,
         "message": f"已生成{days}天学习计划",
         "start_date": start_date.isoformat(),
         "end_date": end_date.isoformat(),
-        "total_items": len(plan_items)
+        "total_items": len(schedule)
     }
@@ -0,0 +1,348 @@
+"""
+种子试卷（延迟物化）
+专项练习的题目本就来自一次随机抽取，逐题写入 paper_questions 只是记录抽取结果；
+开启 seeded_papers_enabled 后，练习试卷在 papers.config_json["seeded"] 中只记录组卷规则与随机种子：
+- 题目列表在首次访问时按规则确定性地重新推导，并按 paper_id 缓存在进程内
+- 判分按规则中的统一分值，不需要题目行
+- 首次开考（exam_runtime）或管理员"固化"试卷时把推导结果写入 paper_questions，此后按题目行读取；
+  从未开考的练习不写题目行，已开考的作答不受之后题库修改影响
+
+确定性：
+- 候选题目按ID排序后用 random.Random(seed) 抽取，与进程、抽题器分桶顺序无关
+- 只考虑组卷时已存在的题目（ID 不超过 max_question_id），之后新增题目不影响已生成的试卷
+- 组卷时需要避开的已作答题目取其与候选的交集记入规则（不超过该知识点题量），学生之后的作答不影响推导
+- 题目被删除或修改难度/知识点后推导结果可能变化，因此在首次开考时固化，作答与判分只依赖题目行
+
+每个学生看到的题目顺序与选项顺序按 (seed, user_id) 打乱，不额外存储；
+选项连同自身的字母标签一起移动，标准答案不变。前端按展示位置标注 A/B/C...，
+交卷时按同一排列把作答字母换回原选项字母（restore_option_letters）再判分
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Container, Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import random
+import threading
+
+from ..core.config import settings
+from ..models.paper import Paper
+from .paper_store import insert_paper_questions
+from .question_sampler import QuestionSampler, get_question_sampler
+
+SEEDED_KEY = "seeded"
+RULE_PRACTICE = "practice"
+
+_derived: "OrderedDict[int, Tuple[int, ...]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def seeded_rule(config_json: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """返回尚未固化的种子规则；普通试卷或已固化的试卷返回 None"""
+    rule = (config_json or {}).get(SEEDED_KEY)
+    if not rule or rule.get("frozen_at"):
+        return None
+    return rule
+
+
+def shuffle_seed(config_json: Optional[Dict[str, Any]]) -> Optional[int]:
+    """按学生打乱题目/选项顺序使用的种子（固化后仍然生效）；不打乱时返回 None"""
+    rule = (config_json or {}).get(SEEDED_KEY)
+    if not rule or not rule.get("shuffle"):
+        return None
+    return rule["seed"]
+
+
+def _candidates(sampler: QuestionSampler, kp_id: int, difficulty: Optional[int], max_question_id: int) -> List[int]:
+    difficulties = None if difficulty is None else (difficulty,)
+    ids = {qid for qid in sampler.pool([kp_id], difficulties=difficulties).iter_ids() if qid <= max_question_id}
+    return sorted(ids)
+
+
+def _derive_practice(sampler: QuestionSampler, rule: Dict[str, Any]) -> List[int]:
+    """专项练习：目标难度逐级降低，先只抽未作答的题，仍不足再放开；最后从全部候选补齐"""
+    rng = random.Random(rule["seed"])
+    kp_id = rule["knowledge_id"]
+    count = rule["count"]
+    max_question_id = rule["max_question_id"]
+    avoid = set(rule.get("avoid") or ())
+    picked: List[int] = []
+    picked_set = set()
+
+    def take(candidates: List[int], blocked: Container[int]):
+        available = [qid for qid in candidates if qid not in picked_set and qid not in blocked]
+        for qid in rng.sample(available, min(count - len(picked), len(available))):
+            picked.append(qid)
+            picked_set.add(qid)
+
+    for blocked in (avoid, ()):
+        diff = rule["target_diff"]
+        while len(picked) < count and diff >= 1:
+            take(_candidates(sampler, kp_id, diff, max_question_id), blocked)
+            diff -= 1
+    for blocked in (avoid, ()):
+        if len(picked) < count:
+            take(_candidates(sampler, kp_id, None, max_question_id), blocked)
+    return picked
+
+
+_DERIVERS = {
+    RULE_PRACTICE: _derive_practice,
+}
+
+
+def derive_question_ids(sampler: QuestionSampler, rule: Dict[str, Any]) -> List[int]:
+    """
+    按规则推导试卷题目（纯函数：相同规则与题库得到相同结果）
+
+    Args:
+        sampler: 分桶抽题器
+        rule: 种子规则
+
+    Returns:
+        List[int]: 有序题目ID
+
+    Raises:
+        ValueError: 规则类型未知
+    """
+    derive = _DERIVERS.get(rule.get("rule"))
+    if derive is None:
+        raise ValueError(f"未知的组卷规则: {rule.get('rule')}")
+    return derive(sampler, rule)
+
+
+def build_practice_rule(
+    sampler: QuestionSampler,
+    knowledge_id: int,
+    target_diff: int,
+    count: int,
+    avoid: Optional[Container[int]] = None,
+    score: float = 2.0
+) -> Dict[str, Any]:
+    """
+    生成专项练习的种子规则
+
+    Args:
+        sampler: 分桶抽题器
+        knowledge_id: 知识点ID
+        target_diff: 目标难度
+        count: 题目数量
+        avoid: 尽量避开的题目（学生已作答集合），只记录其与候选的交集
+        score: 每题分值
+
+    Returns:
+        Dict[str, Any]: 规则（size 为推导出的实际题数前由 create_seeded_paper 填入）
+    """
+    candidate_ids = set(sampler.pool([knowledge_id]).iter_ids())
+    return {
+        "rule": RULE_PRACTICE,
+        "seed": random.getrandbits(31),
+        "knowledge_id": knowledge_id,
+        "target_diff": target_diff,
+        "count": count,
+        "score": score,
+        "max_question_id": max(candidate_ids, default=0),
+        "avoid": sorted(qid for qid in candidate_ids if avoid is not None and qid in avoid),
+        "shuffle": settings.seeded_paper_shuffle
+    }
+
+
+def _remember(paper_id: int, question_ids: Sequence[int]) -> Tuple[int, ...]:
+    question_ids = tuple(question_ids)
+    with _lock:
+        _derived[paper_id] = question_ids
+        _derived.move_to_end(paper_id)
+        while len(_derived) > settings.paper_cache_size:
+            _derived.popitem(last=False)
+    return question_ids
+
+
+def resolve_seeded_questions(db: Session, paper_id: int, rule: Dict[str, Any]) -> Tuple[int, ...]:
+    """
+    获取种子试卷的题目列表（首次访问时推导并缓存；开考前的结果只用于展示，开考时固化）
+
+    Args:
+        db: 数据库会话，仅在抽题器需要重建时使用
+        paper_id: 试卷ID
+        rule: 种子规则
+
+    Returns:
+        Tuple[int, ...]: 有序题目ID
+    """
+    with _lock:
+        question_ids = _derived.get(paper_id)
+        if question_ids is not None:
+            _derived.move_to_end(paper_id)
+            return question_ids
+    return _remember(paper_id, derive_question_ids(get_question_sampler(db), rule))
+
+
+def create_seeded_paper(
+    db: Session,
+    title: str,
+    rule: Dict[str, Any],
+    created_by: int,
+    config_json: Optional[Dict[str, Any]] = None
+) -> Tuple[Paper, Tuple[int, ...]]:
+    """
+    写入种子试卷（只写 Paper 一行，不提交事务，由调用方 commit）
+
+    content_hash 取规则的哈希：与题目内容哈希不会相同，因此不参与内容寻址复用，
+    但不再被考试引用后同样由 paper_reclaimer 回收
+
+    Args:
+        db: 数据库会话
+        title: 试卷标题
+        rule: build_*_rule 生成的规则
+        created_by: 创建者用户ID
+        config_json: 其余组卷配置
+
+    Returns:
+        Tuple[Paper, Tuple[int, ...]]: (已分配ID的试卷, 推导出的题目ID)
+
+    Raises:
+        ValueError: 按规则抽不到题目
+    """
+    question_ids = derive_question_ids(get_question_sampler(db), rule)
+    if not question_ids:
+        raise ValueError("按组卷规则抽不到题目")
+    rule = {**rule, "size": len(question_ids)}
+    encoded = json.dumps(rule, sort_keys=True, separators=(",", ":")).encode("ascii")
+
+    paper = Paper(
+        title=title,
+        mode="AUTO",
+        config_json={**(config_json or {}), SEEDED_KEY: rule},
+        total_score=float(rule["score"]) * len(question_ids),
+        created_by=created_by,
+        content_hash=hashlib.sha256(b"seeded:" + encoded).hexdigest()
+    )
+    db.add(paper)
+    db.flush()
+    return paper, _remember(paper.id, question_ids)
+
+
+def seeded_scores(db: Session, paper_ids: Iterable[int]) -> Dict[int, float]:
+    """未固化的种子试卷 -> 每题分值（判分用；其余试卷按题目行取分）"""
+    paper_ids = list(paper_ids)
+    if not paper_ids:
+        return {}
+    stmt = select(Paper.id, Paper.config_json).where(Paper.id.in_(paper_ids))
+    scores = {}
+    for paper_id, config_json in db.execute(stmt).all():
+        rule = seeded_rule(config_json)
+        if rule is not None:
+            scores[paper_id] = float(rule["score"])
+    return scores
+
+
+def freeze_seeded_paper(db: Session, paper: Paper) -> int:
+    """
+    固化种子试卷：把推导结果写入 paper_questions（不提交事务，由调用方 commit）
+
+    Args:
+        db: 数据库会话
+        paper: 试卷
+
+    Returns:
+        int: 写入的题目数
+
+    Raises:
+        ValueError: 不是种子试卷或已经固化
+    """
+    rule = seeded_rule(paper.config_json)
+    if rule is None:
+        raise ValueError("试卷不是种子试卷或已固化")
+    question_ids = resolve_seeded_questions(db, paper.id, rule)
+    insert_paper_questions(db, paper.id, question_ids, [float(rule["score"])] * len(question_ids))
+    paper.config_json = {
+        **paper.config_json,
+        SEEDED_KEY: {**rule, "frozen_at": datetime.utcnow().isoformat()}
+    }
+    forget_seeded_paper(paper.id)
+    return len(question_ids)
+
+
+def forget_seeded_paper(paper_id: int):
+    """丢弃缓存的推导结果（试卷固化或被回收后调用）"""
+    with _lock:
+        _derived.pop(paper_id, None)
+
+
+def _shuffle_orders(
+    payload: Sequence[Dict[str, Any]],
+    seed: int,
+    user_id: int
+) -> Tuple[List[int], Dict[int, List[int]]]:
+    """
+    按 (seed, user_id) 生成题目顺序与各题选项顺序
+
+    Returns:
+        Tuple[List[int], Dict[int, List[int]]]: (展示顺序对应的原题下标, {题目ID: 展示位置 -> 原选项下标})
+    """
+    rng = random.Random(f"{seed}:{user_id}")
+    order = list(range(len(payload)))
+    rng.shuffle(order)
+    option_orders: Dict[int, List[int]] = {}
+    for i in order:
+        options = payload[i]["question"].get("options_json")
+        if isinstance(options, list) and len(options) > 1:
+            option_order = list(range(len(options)))
+            rng.shuffle(option_order)
+            option_orders[payload[i]["id"]] = option_order
+    return order, option_orders
+
+
+def shuffle_for_user(payload: Sequence[Dict[str, Any]], seed: int, user_id: int) -> Tuple[Dict[str, Any], ...]:
+    """
+    按 (seed, user_id) 打乱题目顺序与选项顺序（浅拷贝，不修改缓存的载荷）
+
+    Args:
+        payload: 试卷题目载荷
+        seed: 试卷种子
+        user_id: 学生ID
+
+    Returns:
+        Tuple[Dict[str, Any], ...]: 打乱后的载荷，order_no 按新顺序重新编号
+    """
+    order, option_orders = _shuffle_orders(payload, seed, user_id)
+    shuffled = []
+    for order_no, i in enumerate(order, start=1):
+        item = payload[i]
+        question = item["question"]
+        option_order = option_orders.get(item["id"])
+        if option_order is not None:
+            options = question["options_json"]
+            question = {**question, "options_json": [options[j] for j in option_order]}
+        shuffled.append({**item, "order_no": order_no, "question": question})
+    return tuple(shuffled)
+
+
+def option_orders_for_user(payload: Sequence[Dict[str, Any]], seed: int, user_id: int) -> Dict[int, List[int]]:
+    """学生看到的各题选项顺序：{题目ID: 展示位置 -> 原选项下标}（与 shuffle_for_user 一致）"""
+    return _shuffle_orders(payload, seed, user_id)[1]
+
+
+def restore_option_letters(option_order: Sequence[int], answer: Any) -> Any:
+    """
+    把按展示位置标注的选项字母（前端按位置显示 A/B/C...）换回原选项字母，标准答案按原字母判分
+
+    Args:
+        option_order: 展示位置 -> 原选项下标
+        answer: 单选为字母，多选为字母列表；不是选项字母的值原样保留
+
+    Returns:
+        Any: 原选项字母表示的作答
+    """
+    def restore(value: Any) -> Any:
+        letter = str(value).strip().upper()
+        if len(letter) == 1 and 0 <= ord(letter) - 65 < len(option_order):
+            return chr(65 + option_order[ord(letter) - 65])
+        return value
+
+    if isinstance(answer, list):
+        return sorted(restore(value) for value in answer)
+    return restore(answer)
@@ -0,0 +1,213 @@
+"""
+用户已作答题目集合
+练习/模拟组卷需要避开学生做过的题；在 SQL 里做就是对该学生全部 answers 历史的 NOT IN。
+这里为每个用户维护一个紧凑的已作答集合（user_seen_questions 一行），交卷时合并写入，组卷时整块读出，
+抽题器逐个候选做 O(1) 成员判断
+
+编码（roaring 风格分块位图）：题目ID按高 16 位分块，每块视稀疏程度选择容器
+- 数组容器：有序 uint16 数组，块内不超过 4096 个ID（每个ID 2 字节）
+- 位图容器：8KB 位图，块内超过 4096 个ID 时转换（此后每个ID 约 1 bit）
+作答几万道题的学生也只占几十 KB；序列化为 [块数] + 每块 [高位, 容器类型, 基数, 载荷]
+
+历史数据：用户第一次用到时按其已交卷作答回填一次，之后只做增量合并
+"""
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, undefer
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, Mapping, Union
+import struct
+import sys
+
+from ..models.attempt import Answer, Attempt
+from ..models.progress import UserSeenQuestions
+
+_ARRAY_MAX = 4096
+_BITMAP_BYTES = 1 << 13
+
+_KIND_ARRAY = 0
+_KIND_BITMAP = 1
+
+_HEADER = struct.Struct("<I")
+_CONTAINER = struct.Struct("<HBI")
+
+_Container = Union[array, bytearray]
+
+
+def _to_bitmap(values: array) -> bytearray:
+    bitmap = bytearray(_BITMAP_BYTES)
+    for low in values:
+        bitmap[low >> 3] |= 1 << (low & 7)
+    return bitmap
+
+
+class SeenSet:
+    """题目ID集合（分块位图）；支持 in / add / 迭代 / 序列化"""
+    __slots__ = ("_containers", "_count")
+
+    def __init__(self):
+        self._containers: Dict[int, _Container] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, question_id: int) -> bool:
+        container = self._containers.get(question_id >> 16)
+        if container is None:
+            return False
+        low = question_id & 0xFFFF
+        if type(container) is bytearray:
+            return bool(container[low >> 3] >> (low & 7) & 1)
+        i = bisect_left(container, low)
+        return i < len(container) and container[i] == low
+
+    def add(self, question_id: int) -> bool:
+        """加入一个题目ID，返回是否为新ID"""
+        high, low = question_id >> 16, question_id & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            container = self._containers[high] = array("H")
+
+        if type(container) is bytearray:
+            bit = 1 << (low & 7)
+            if container[low >> 3] & bit:
+                return False
+            container[low >> 3] |= bit
+        else:
+            i = bisect_left(container, low)
+            if i < len(container) and container[i] == low:
+                return False
+            container.insert(i, low)
+            if len(container) > _ARRAY_MAX:
+                self._containers[high] = _to_bitmap(container)
+        self._count += 1
+        return True
+
+    def update(self, question_ids: Iterable[int]) -> int:
+        """批量加入，返回新增个数"""
+        return sum(1 for question_id in question_ids if self.add(question_id))
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self._containers):
+            base = high << 16
+            container = self._containers[high]
+            if type(container) is bytearray:
+                for byte_no, byte in enumerate(container):
+                    while byte:
+                        bit = byte & -byte
+                        yield base | (byte_no << 3) | (bit.bit_length() - 1)
+                        byte ^= bit
+            else:
+                for low in container:
+                    yield base | low
+
+    def to_bytes(self) -> bytes:
+        parts = [_HEADER.pack(len(self._containers))]
+        for high in sorted(self._containers):
+            container = self._containers[high]
+            if type(container) is bytearray:
+                cardinality = int.from_bytes(container, "little").bit_count()
+                parts.append(_CONTAINER.pack(high, _KIND_BITMAP, cardinality))
+                parts.append(bytes(container))
+            else:
+                parts.append(_CONTAINER.pack(high, _KIND_ARRAY, len(container)))
+                if sys.byteorder == "big":
+                    container = array("H", container)
+                    container.byteswap()
+                parts.append(container.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SeenSet":
+        seen = cls()
+        if not data:
+            return seen
+        (n_containers,) = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        for _ in range(n_containers):
+            high, kind, cardinality = _CONTAINER.unpack_from(data, offset)
+            offset += _CONTAINER.size
+            if kind == _KIND_BITMAP:
+                seen._containers[high] = bytearray(data[offset:offset + _BITMAP_BYTES])
+                offset += _BITMAP_BYTES
+            else:
+                container = array("H")
+                container.frombytes(data[offset:offset + cardinality * 2])
+                if sys.byteorder == "big":
+                    container.byteswap()
+                seen._containers[high] = container
+                offset += cardinality * 2
+            seen._count += cardinality
+        return seen
+
+
+def _answered_question_ids(db: Session, user_id: int) -> Iterable[int]:
+    stmt = select(Answer.question_id).join(
+        Attempt, Attempt.id == Answer.attempt_id
+    ).where(
+        Attempt.user_id == user_id,
+        Attempt.status == "SUBMITTED"
+    ).distinct()
+    return db.execute(stmt).scalars()
+
+
+def _backfill(db: Session, user_id: int) -> bytes:
+    """按已交卷作答回填（每个用户只发生一次），返回编码后的集合"""
+    seen = SeenSet()
+    seen.update(_answered_question_ids(db, user_id))
+    data = seen.to_bytes()
+    try:
+        with db.begin_nested():
+            db.add(UserSeenQuestions(user_id=user_id, seen_count=len(seen), bitmap=data))
+    except IntegrityError:
+        # 并发请求已回填，内容相同
+        pass
+    return data
+
+
+def load_seen_questions(db: Session, user_id: int) -> SeenSet:
+    """
+    读取用户已作答题目集合（不提交事务；首次使用时回填的行随调用方 commit 写入）
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+
+    Returns:
+        SeenSet: 已作答题目集合，可直接作为 QuestionPool.draw 的 avoid 参数
+    """
+    stmt = select(UserSeenQuestions.bitmap).where(UserSeenQuestions.user_id == user_id)
+    data = db.execute(stmt).scalar_one_or_none()
+    if data is None:
+        data = _backfill(db, user_id)
+    return SeenSet.from_bytes(data)
+
+
+def record_seen_questions(db: Session, question_ids_by_user: Mapping[int, Iterable[int]]) -> None:
+    """
+    交卷后把作答题目合并进各用户的已作答集合（不提交事务，由调用方 commit）
+
+    Args:
+        db: 数据库会话
+        question_ids_by_user: {user_id: 本次作答的题目ID}
+    """
+    if not question_ids_by_user:
+        return
+    stmt = select(UserSeenQuestions).where(
+        UserSeenQuestions.user_id.in_(list(question_ids_by_user))
+    ).options(undefer(UserSeenQuestions.bitmap)).with_for_update()
+    rows = {row.user_id: row for row in db.execute(stmt).scalars().all()}
+
+    for user_id, question_ids in question_ids_by_user.items():
+        row = rows.get(user_id)
+        if row is None:
+            # 回填已包含本次作答（同一事务内已标记为 SUBMITTED）
+            _backfill(db, user_id)
+            continue
+        seen = SeenSet.from_bytes(row.bitmap)
+        if seen.update(question_ids):
+            row.bitmap = seen.to_bytes()
+            row.seen_count = len(seen)